@@ -1,16 +1,166 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     MONGODB_URI: str
     MONGODB_DB_NAME: str
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 0
+    MONGODB_MAX_IDLE_TIME_MS: int = 60_000
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = 5_000
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = 5_000
     LLM_API_KEY: str
     LLM_MODEL: str = "llama-3.2-11b-vision-preview"
+    # Point at another OpenAI-compatible endpoint, e.g. a local fake provider
+    LLM_BASE_URL: Optional[str] = None
     LOG_FILE: str = "app/logs/api_logs.jsonl"
+    # Roll the log file over when it reaches LOG_MAX_BYTES or at LOG_ROTATE_WHEN
+    LOG_MAX_BYTES: int = 50 * 1024 * 1024
+    LOG_ROTATE_WHEN: str = "midnight"
+    LOG_BACKUP_COUNT: int = 7
+    LOG_CONSOLE_ENABLED: bool = True
+    # Fraction of successful requests logged; errors and slow requests
+    # are always logged
+    LOG_SUCCESS_SAMPLE_RATE: float = 1.0
+    LOG_SLOW_REQUEST_MS: int = 1000
+    # Request traces, attached to the request log line and optionally
+    # written as OTLP/JSON lines for an OpenTelemetry collector
+    TRACE_EXPORT_FILE: Optional[str] = None
+    TRACE_MAX_SPANS: int = 256
+    TRACE_SERVICE_NAME: str = "vlm-api"
     SECRET_KEY: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     ALGORITHM: str = "HS256"
 
+    # Outbound HTTP connection pool (Groq + image fetches)
+    HTTP_MAX_CONNECTIONS: int = 200
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 50
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_READ_TIMEOUT: float = 60.0
+    HTTP_POOL_TIMEOUT: float = 10.0
+    HTTP2_ENABLED: bool = True
+
+    # VLM provider resilience
+    VLM_ATTEMPT_TIMEOUT: float = 30.0
+    VLM_MAX_ATTEMPTS: int = 3
+    VLM_RETRY_BACKOFF: float = 0.5
+    VLM_RETRY_MAX_DELAY: float = 10.0
+    # Send a second request when the first is slower than the recent p95
+    VLM_HEDGE_ENABLED: bool = False
+    VLM_HEDGE_PERCENTILE: float = 0.95
+    VLM_HEDGE_MIN_SAMPLES: int = 20
+    VLM_HEDGE_MIN_DELAY: float = 1.0
+    VLM_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    VLM_CIRCUIT_RESET_SECONDS: float = 30.0
+    # Adaptive (AIMD) limit on concurrent VLM calls; callers over it queue
+    # by priority for at most the given wait, or get a 503
+    VLM_LIMIT_INITIAL: int = 8
+    VLM_LIMIT_MIN: int = 1
+    VLM_LIMIT_MAX: int = 64
+    VLM_LIMIT_BACKOFF: float = 0.7
+    # Successful calls slower than this also count as congestion
+    VLM_LIMIT_SLOW_CALL_SECONDS: float = 15.0
+    VLM_QUEUE_MAX: int = 500
+    VLM_QUEUE_TIMEOUT: float = 10.0
+    VLM_BATCH_QUEUE_TIMEOUT: float = 60.0
+    # Model routing: ask the fast model first and escalate to the strong
+    # one when its answer is invalid, incomplete or not confident enough.
+    # Streams always use the single MODEL.
+    VLM_ROUTING_ENABLED: bool = False
+    VLM_FAST_MODEL: str = "llama-3.2-11b-vision-preview"
+    VLM_STRONG_MODEL: str = "llama-3.2-90b-vision-preview"
+    VLM_ESCALATION_CONFIDENCE: float = 0.8
+    VLM_FAST_ATTEMPT_TIMEOUT: float = 15.0
+    VLM_STRONG_ATTEMPT_TIMEOUT: float = 30.0
+
+    # Per-user limits: a token bucket of requests, and a budget of VLM
+    # tokens per UTC day. The memory backend counts per worker process;
+    # "sqlite" shares the counts between workers on one host.
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_SQLITE_PATH: str = "app/logs/rate_limits.sqlite3"
+    RATE_LIMIT_REQUESTS_PER_SECOND: float = 1.0
+    # A batch costs one request per item; a full bucket admits a batch
+    # larger than the burst and refills from below zero
+    RATE_LIMIT_BURST: int = 10
+    # Unset disables the token budget
+    RATE_LIMIT_DAILY_TOKENS: Optional[int] = 500_000
+
+    # Default prompt version (see app.services.prompt_builder); requests
+    # may ask for another one
+    PROMPT_VERSION: str = "v2"
+
+    # VLM result cache
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MAX_ENTRIES: int = 1024
+    RESULT_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+
+    # Image downloads from user supplied URLs
+    IMAGE_MAX_BYTES: int = 10 * 1024 * 1024
+    # Whole download, redirects included, so a slow body cannot hold on
+    IMAGE_FETCH_TIMEOUT: float = 15.0
+    # Private, loopback and link-local hosts are refused unless enabled
+    IMAGE_ALLOW_PRIVATE_HOSTS: bool = False
+
+    # Image preprocessing before the VLM call
+    IMAGE_PREPROCESS_ENABLED: bool = True
+    IMAGE_MAX_EDGE: int = 1120
+    IMAGE_FORMAT: str = "JPEG"
+    IMAGE_QUALITY: int = 85
+    IMAGE_PROCESS_WORKERS: int = 2
+    IMAGE_TOKEN_TILE_SIZE: int = 560
+    IMAGE_TOKEN_MAX_TILES: int = 4
+    IMAGE_TOKENS_PER_TILE: int = 1601
+
+    # Perceptual hash near-duplicate reuse. Opt-in: it only suits
+    # re-uploads of the same photo, and a match must also have the same
+    # original dimensions. The distance is in bits of a 2304-bit hash.
+    PHASH_ENABLED: bool = False
+    PHASH_MAX_DISTANCE: int = 16
+
+    # Asynchronous analysis jobs
+    JOB_WORKER_CONCURRENCY: int = 4
+    JOB_QUEUE_MAX_SIZE: int = 1000
+    JOB_STALE_AFTER_SECONDS: int = 600
+    # Jobs hit by an outage or overload go back to pending and are retried
+    # after the provider's Retry-After, at most this many times
+    JOB_MAX_RETRIES: int = 5
+    JOB_RETRY_MIN_DELAY: float = 1.0
+    # Expire jobs still pending after this long (unset keeps them forever)
+    PENDING_JOB_TTL_SECONDS: Optional[int] = None
+
+    # Batch analysis
+    BATCH_MAX_ITEMS: int = 500
+    BATCH_CONCURRENCY: int = 8
+    BATCH_INSERT_CHUNK_SIZE: int = 50
+
+    # Write-behind persistence of analysis records
+    WRITE_BEHIND_ENABLED: bool = False
+    WRITE_BEHIND_MAX_QUEUE: int = 10_000
+    WRITE_BEHIND_BATCH_SIZE: int = 100
+    WRITE_BEHIND_FLUSH_INTERVAL: float = 0.5
+    WRITE_BEHIND_MAX_RETRIES: int = 5
+    WRITE_BEHIND_RETRY_BACKOFF: float = 0.2
+    WRITE_BEHIND_SPILL_FILE: str = "app/logs/write_behind_spill.jsonl"
+    # How long a request waits for room in a full buffer before writing its
+    # records itself
+    WRITE_BEHIND_SUBMIT_TIMEOUT: float = 1.0
+
+    # Authentication caches
+    TOKEN_CACHE_MAX_ENTRIES: int = 10_000
+    USER_CACHE_MAX_ENTRIES: int = 10_000
+    USER_CACHE_TTL_SECONDS: int = 300
+
+    # Password hashing
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    # Hashes allowed in flight at once; extra logins wait instead of
+    # piling up behind the pool
+    PASSWORD_HASH_CONCURRENCY: int = 4
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
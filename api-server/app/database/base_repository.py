@@ -1,36 +1,115 @@
-from typing import Any, Dict, Optional
+import logging
+from typing import Any, Dict, List, Optional, Tuple
 
-from app.config.settings import settings
 from app.models.image_analysis import ImageAnalysis
 from app.models.user import User
+from app.database.mongo_client import get_client, get_database
+from app.utils.tracing import span
 from beanie import init_beanie
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import IndexModel
+
+logger = logging.getLogger(__name__)
+
+# Options that make two index definitions with the same name incompatible
+INDEX_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
 
 
 async def init_db():
-    client = AsyncIOMotorClient(settings.MONGODB_URI)
-    database = client.vlm_nutrition_db
+    database = get_client().vlm_nutrition_db
     await init_beanie(database=database, document_models=[User, ImageAnalysis])
 
 
 class BaseRepository:
-    def __init__(self, collection_name: str):
+    # Indexes reconciled at startup by `ensure_indexes`
+    indexes: List[IndexModel] = []
+
+    # (filter, sort) pairs of the queries that must be served by an index
+    hot_queries: List[Tuple[Dict[str, Any], Optional[List[Tuple[str, int]]]]] = []
+
+    def __init__(
+        self, collection_name: str, database: Optional[AsyncIOMotorDatabase] = None
+    ):
         self.collection_name = collection_name
-        self.collection: AsyncIOMotorCollection = AsyncIOMotorClient(
-            settings.MONGODB_URI
-        )[settings.MONGODB_DB_NAME][collection_name]
+        self._database = database
+        self._client = None
+        self._collection: Optional[AsyncIOMotorCollection] = None
+
+    @property
+    def collection(self) -> AsyncIOMotorCollection:
+        # Repositories outlive the client (a closed one cannot be reused),
+        # so the handle follows whichever client is current
+        if self._database is not None:
+            return self._database[self.collection_name]
+        client = get_client()
+        if self._client is not client:
+            self._client = client
+            self._collection = get_database()[self.collection_name]
+        return self._collection
+
+    def span(self, operation: str, **attributes):
+        return span(f"mongo.{operation}", collection=self.collection_name, **attributes)
 
     async def insert_one(self, document: Dict[str, Any]) -> Optional[str]:
-        result = await self.collection.insert_one(document)
+        with self.span("insert_one"):
+            result = await self.collection.insert_one(document)
         return str(result.inserted_id)
 
+    async def insert_many(
+        self, documents: List[Dict[str, Any]], ordered: bool = False
+    ) -> List[str]:
+        with self.span("insert_many", documents=len(documents)):
+            result = await self.collection.insert_many(documents, ordered=ordered)
+        return [str(inserted_id) for inserted_id in result.inserted_ids]
+
     async def find_one(self, filter: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        return await self.collection.find_one(filter)
+        with self.span("find_one"):
+            return await self.collection.find_one(filter)
 
     async def update_one(self, filter: Dict[str, Any], update: Dict[str, Any]) -> int:
-        result = await self.collection.update_one(filter, update)
+        with self.span("update_one"):
+            result = await self.collection.update_one(filter, update)
         return result.modified_count
 
     async def delete_one(self, filter: Dict[str, Any]) -> int:
-        result = await self.collection.delete_one(filter)
+        with self.span("delete_one"):
+            result = await self.collection.delete_one(filter)
         return result.deleted_count
+
+    async def ensure_indexes(self) -> List[str]:
+        """
+        Idempotently creates the declared indexes. An existing index with the
+        same name but different keys or options is dropped and rebuilt.
+        """
+        declared = self.get_indexes()
+        if not declared:
+            return []
+
+        existing = await self.collection.index_information()
+        for index in declared:
+            document = index.document
+            current = existing.get(document["name"])
+            if current is not None and not _same_index(current, document):
+                logger.info(
+                    f"[Indexes] Rebuilding {self.collection_name}.{document['name']}"
+                )
+                await self.collection.drop_index(document["name"])
+
+        return await self.collection.create_indexes(declared)
+
+    def get_indexes(self) -> List[IndexModel]:
+        return list(self.indexes)
+
+    async def explain(
+        self, filter: Dict[str, Any], sort: Optional[List[Tuple[str, int]]] = None
+    ) -> Dict[str, Any]:
+        cursor = self.collection.find(filter)
+        if sort:
+            cursor = cursor.sort(sort)
+        return await cursor.explain()
+
+
+def _same_index(current: Dict[str, Any], document: Dict[str, Any]) -> bool:
+    if list(current["key"]) != list(document["key"].items()):
+        return False
+    return all(current.get(option) == document.get(option) for option in INDEX_OPTIONS)
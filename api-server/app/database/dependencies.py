@@ -0,0 +1,22 @@
+from functools import lru_cache
+
+from app.database.image_analysis_repository import ImageAnalysisRepository
+from app.database.rollup_repository import RollupRepository
+from app.database.user_repository import UserRepository
+
+
+# Repositories are thin wrappers around collections of the shared Motor
+# client, so one instance of each is reused for every request.
+@lru_cache
+def get_user_repository() -> UserRepository:
+    return UserRepository()
+
+
+@lru_cache
+def get_image_analysis_repository() -> ImageAnalysisRepository:
+    return ImageAnalysisRepository()
+
+
+@lru_cache
+def get_rollup_repository() -> RollupRepository:
+    return RollupRepository()
@@ -1,31 +1,196 @@
+import logging
+
+from app.config.settings import settings
 from app.database.base_repository import BaseRepository
 from app.models.image_analysis import ImageAnalysisCreate
+from bson import ObjectId
 from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
+
+logger = logging.getLogger(__name__)
 
 
 class ImageAnalysisRepository(BaseRepository):
+    indexes = [
+        IndexModel(
+            [("user_uuid", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="user_uuid_created_at",
+        ),
+        IndexModel(
+            [("request_id", ASCENDING)],
+            name="request_id_unique",
+            unique=True,
+            partialFilterExpression={"request_id": {"$exists": True}},
+        ),
+        IndexModel(
+            [
+                ("cache_key", ASCENDING),
+                ("status", ASCENDING),
+                ("created_at", DESCENDING),
+            ],
+            name="cache_key_status_created_at",
+        ),
+        IndexModel(
+            [("status", ASCENDING), ("created_at", ASCENDING)],
+            name="status_created_at",
+        ),
+    ]
+    hot_queries = [
+        (
+            {"user_uuid": "user-uuid", "created_at": {"$gte": datetime(1970, 1, 1)}},
+            [("created_at", DESCENDING), ("_id", DESCENDING)],
+        ),
+        ({"request_id": "request-id"}, None),
+        (
+            {
+                "cache_key": "cache-key",
+                "status": "completed",
+                "created_at": {"$gte": datetime(1970, 1, 1)},
+            },
+            [("created_at", DESCENDING)],
+        ),
+        ({"status": "pending"}, [("created_at", ASCENDING)]),
+    ]
+
     def __init__(self):
         super().__init__("nutrition_analysis")
 
+    def get_indexes(self):
+        indexes = list(self.indexes)
+        if settings.PENDING_JOB_TTL_SECONDS:
+            # Abandoned jobs expire; completed analyses are never touched
+            indexes.append(
+                IndexModel(
+                    [("created_at", ASCENDING)],
+                    name="pending_job_ttl",
+                    expireAfterSeconds=settings.PENDING_JOB_TTL_SECONDS,
+                    partialFilterExpression={"status": "pending"},
+                )
+            )
+        return indexes
+
     async def create_analysis(self, analysis: ImageAnalysisCreate):
         analysis_dict = analysis.model_dump()
         analysis_dict["status"] = "pending"
         analysis_dict["created_at"] = datetime.now()
 
         result = await self.insert_one(analysis_dict)
-        return await self.find_one({"_id": result.inserted_id})
+        return await self.find_one({"_id": ObjectId(result)})
 
     async def update_result(self, analysis_id: str, result: dict):
-        update_result = await self.update_one(
-            {"_id": analysis_id},
+        modified_count = await self.update_one(
+            {"_id": ObjectId(analysis_id)},
             {
                 "$set": {
-                    "result": result,
+                    **result,
                     "status": "completed",
                     "completed_at": datetime.now(),
                 }
             },
         )
 
-        print(f"Analysis with ID {analysis_id} updated successfully.")
-        return update_result.modified_count
+        logger.debug(f"Analysis with ID {analysis_id} updated successfully.")
+        return modified_count
+
+    async def mark_failed(self, analysis_id: str, error: str):
+        return await self.update_one(
+            {"_id": ObjectId(analysis_id)},
+            {
+                "$set": {
+                    "status": "failed",
+                    "error": error,
+                    "completed_at": datetime.now(),
+                }
+            },
+        )
+
+    async def claim_pending(self, analysis_id: str):
+        # Atomic pending -> processing transition so a job is only run once,
+        # even when several workers recover the same backlog.
+        with self.span("find_one_and_update"):
+            return await self.collection.find_one_and_update(
+                {"_id": ObjectId(analysis_id), "status": "pending"},
+                {"$set": {"status": "processing", "started_at": datetime.now()}},
+                return_document=ReturnDocument.AFTER,
+            )
+
+    async def release(self, analysis_id: str, error: Optional[str] = None):
+        # A job handed back after a transient failure counts as a retry
+        update: Dict[str, Any] = {"$set": {"status": "pending"}}
+        if error is not None:
+            update["$set"]["error"] = error
+            update["$inc"] = {"retries": 1}
+        return await self.update_one(
+            {"_id": ObjectId(analysis_id), "status": "processing"}, update
+        )
+
+    async def recover_pending(self, stale_before: datetime):
+        # Jobs stuck in "processing" were owned by a worker that died
+        await self.collection.update_many(
+            {"status": "processing", "started_at": {"$lt": stale_before}},
+            {"$set": {"status": "pending"}},
+        )
+        cursor = self.collection.find(
+            {"status": "pending"}, projection={"_id": 1}, sort=[("created_at", 1)]
+        )
+        return [str(doc["_id"]) async for doc in cursor]
+
+    async def find_by_id(self, analysis_id: str):
+        if not ObjectId.is_valid(analysis_id):
+            return None
+        return await self.find_one({"_id": ObjectId(analysis_id)})
+
+    def find_by_user(
+        self,
+        user_uuid: str,
+        start: datetime,
+        end: datetime,
+        after: Optional[Tuple[datetime, ObjectId]] = None,
+        limit: int = 100,
+        projection: Optional[Dict[str, int]] = None,
+    ):
+        """
+        Newest-first page of a user's analyses in [start, end), continuing
+        after the `(created_at, _id)` keyset of the previous page.
+        """
+        filter = {"user_uuid": user_uuid, "created_at": {"$gte": start, "$lt": end}}
+        if after is not None:
+            created_at, document_id = after
+            filter["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": document_id}},
+            ]
+
+        return (
+            self.collection.find(filter, projection=projection)
+            .sort([("created_at", DESCENDING), ("_id", DESCENDING)])
+            .limit(limit)
+        )
+
+    def iter_phashes(self):
+        return self.collection.find(
+            {
+                "status": "completed",
+                "phash": {"$ne": None},
+                "cache_key": {"$ne": None},
+            },
+            projection={
+                "_id": 0,
+                "phash": 1,
+                "cache_key": 1,
+                "image_preprocessing.original_size": 1,
+            },
+        )
+
+    async def find_cached_result(self, cache_key: str, since: datetime):
+        with self.span("find_one", query="cached_result"):
+            return await self.collection.find_one(
+                {
+                    "cache_key": cache_key,
+                    "status": "completed",
+                    "created_at": {"$gte": since},
+                },
+                projection={"nutrition_info": 1, "vlm_response_time": 1},
+                sort=[("created_at", -1)],
+            )
@@ -0,0 +1,94 @@
+"""
+Index reconciliation for every repository.
+
+`ensure_indexes` runs in the lifespan hook. Running this module checks that
+the hot queries are served by an index:
+
+    python -m app.database.indexes --explain
+"""
+
+import argparse
+import asyncio
+import logging
+from typing import Any, Dict, List
+
+from app.database.dependencies import (
+    get_image_analysis_repository,
+    get_rollup_repository,
+    get_user_repository,
+)
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+def get_repositories():
+    return [
+        get_user_repository(),
+        get_image_analysis_repository(),
+        get_rollup_repository(),
+    ]
+
+
+async def ensure_indexes():
+    for repo in get_repositories():
+        try:
+            names = await repo.ensure_indexes()
+            logger.info(f"[Indexes] {repo.collection_name}: {', '.join(names)}")
+        except OperationFailure as e:
+            # e.g. duplicate emails already stored; keep serving without it
+            logger.error(f"[Indexes] Failed on {repo.collection_name}: {e}")
+
+
+def plan_stages(plan: Dict[str, Any]) -> List[str]:
+    stages = [plan.get("stage")]
+    for child in ("inputStage", "queryPlan"):
+        if child in plan:
+            stages += plan_stages(plan[child])
+    for child in plan.get("inputStages", []):
+        stages += plan_stages(child)
+    return [stage for stage in stages if stage]
+
+
+async def explain_hot_queries() -> List[Dict[str, Any]]:
+    """Winning plan stages of every declared hot query."""
+    reports = []
+    for repo in get_repositories():
+        for filter, sort in repo.hot_queries:
+            explanation = await repo.explain(filter, sort)
+            stages = plan_stages(explanation["queryPlanner"]["winningPlan"])
+            reports.append(
+                {
+                    "collection": repo.collection_name,
+                    "filter": filter,
+                    "sort": sort,
+                    "stages": stages,
+                    "collscan": "COLLSCAN" in stages,
+                }
+            )
+    return reports
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--explain", action="store_true")
+    args = parser.parse_args()
+
+    await ensure_indexes()
+    if not args.explain:
+        return
+
+    reports = await explain_hot_queries()
+    for report in reports:
+        status = "COLLSCAN" if report["collscan"] else "ok"
+        print(
+            f"[{status}] {report['collection']} {report['filter']} "
+            f"sort={report['sort']} -> {' > '.join(report['stages'])}"
+        )
+    if any(report["collscan"] for report in reports):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,117 @@
+from typing import Optional
+
+from app.config.settings import settings
+from app.services.metrics import MONGO_LATENCY
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import monitoring
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool utilisation, fed by pymongo CMAP events."""
+
+    def __init__(self):
+        self.open_connections = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.pools_cleared = 0
+
+    def snapshot(self):
+        return {
+            "max_pool_size": settings.MONGODB_MAX_POOL_SIZE,
+            "open_connections": self.open_connections,
+            "checked_out": self.checked_out,
+            "max_checked_out": self.max_checked_out,
+            "checkouts": self.checkouts,
+            "checkout_failures": self.checkout_failures,
+            "pools_cleared": self.pools_cleared,
+            "utilisation": round(
+                self.checked_out / max(settings.MONGODB_MAX_POOL_SIZE, 1), 3
+            ),
+        }
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self.pools_cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.open_connections -= 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        self.checkouts += 1
+        self.checked_out += 1
+        self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def connection_checked_in(self, event):
+        self.checked_out -= 1
+
+
+class CommandTimer(monitoring.CommandListener):
+    """Feeds MongoDB command latency into the metrics registry."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_LATENCY.labels(command=event.command_name, outcome="ok").observe(
+            event.duration_micros / 1_000_000
+        )
+
+    def failed(self, event):
+        MONGO_LATENCY.labels(command=event.command_name, outcome="error").observe(
+            event.duration_micros / 1_000_000
+        )
+
+
+pool_stats = PoolStats()
+command_timer = CommandTimer()
+
+_client: Optional[AsyncIOMotorClient] = None
+
+
+def get_client() -> AsyncIOMotorClient:
+    """The process-wide Motor client; every repository shares its pool."""
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(
+            settings.MONGODB_URI,
+            maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+            maxIdleTimeMS=settings.MONGODB_MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+            serverSelectionTimeoutMS=settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            event_listeners=[pool_stats, command_timer],
+        )
+    return _client
+
+
+def get_database() -> AsyncIOMotorDatabase:
+    return get_client()[settings.MONGODB_DB_NAME]
+
+
+def close_client():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
@@ -0,0 +1,215 @@
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.database.base_repository import BaseRepository
+from pymongo import ASCENDING, IndexModel, UpdateOne
+
+# Nutrients summed per user, day and meal type. Paths are relative to
+# `nutrition_info` as returned by the VLM.
+ROLLUP_FIELDS = {
+    "calories": "total_calories",
+    "total_fat": "nutrients.total_fat.amount",
+    "carbohydrates": "nutrients.carbohydrates.amount",
+    "protein": "nutrients.protein.amount",
+    "sodium": "nutrients.sodium.amount",
+}
+
+
+def _number(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def rollup_values(nutrition_info: Dict[str, Any]) -> Dict[str, float]:
+    values = {}
+    for field, path in ROLLUP_FIELDS.items():
+        value = nutrition_info
+        for part in path.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        values[field] = _number(value)
+    return values
+
+
+class RollupRepository(BaseRepository):
+    indexes = [
+        IndexModel(
+            [("user_uuid", ASCENDING), ("day", ASCENDING), ("meal_type", ASCENDING)],
+            name="user_uuid_day_meal_type_unique",
+            unique=True,
+        )
+    ]
+    hot_queries = [
+        ({"user_uuid": "user-uuid", "day": {"$gte": "1970-01-01"}}, None),
+    ]
+
+    def __init__(self):
+        super().__init__("nutrition_daily_rollups")
+
+    def build_increment(self, record: Dict[str, Any]) -> UpdateOne:
+        increments = {
+            f"totals.{field}": value
+            for field, value in rollup_values(
+                record.get("nutrition_info") or {}
+            ).items()
+        }
+        increments["count"] = 1
+        return UpdateOne(
+            {
+                "user_uuid": record["user_uuid"],
+                "day": record["created_at"].date().isoformat(),
+                "meal_type": record.get("meal_type") or "unknown",
+            },
+            {"$inc": increments},
+            upsert=True,
+        )
+
+    async def increment(self, record: Dict[str, Any]):
+        await self.increment_many([record])
+
+    async def increment_many(self, records: List[Dict[str, Any]]):
+        if records:
+            with self.span("bulk_write", documents=len(records)):
+                await self.collection.bulk_write(
+                    [self.build_increment(record) for record in records],
+                    ordered=False,
+                )
+
+    def find_range(self, user_uuid: str, start: date, end: date):
+        return self.collection.find(
+            {
+                "user_uuid": user_uuid,
+                "day": {"$gte": start.isoformat(), "$lte": end.isoformat()},
+            },
+            projection={"_id": 0, "user_uuid": 0},
+        ).sort([("day", ASCENDING)])
+
+    @property
+    def rebuild_collection(self):
+        return self.collection.database[f"{self.collection_name}_rebuild"]
+
+    async def rebuild_from(self, source, user_uuid: Optional[str] = None):
+        """
+        Rebuilds the rollups from `source` into a staging collection, then
+        swaps them in, so readers never see them half-built.
+        """
+        staging = self.rebuild_collection
+        await staging.drop()
+        # `$merge` needs a unique index on its `on` fields
+        await staging.create_indexes(self.indexes)
+        with self.span("rebuild"):
+            await source.aggregate(
+                self.backfill_pipeline(user_uuid, into=staging.name)
+            ).to_list(None)
+
+        if user_uuid is None:
+            database = self.collection.database
+            await database.client.admin.command(
+                "renameCollection",
+                f"{database.name}.{staging.name}",
+                to=f"{database.name}.{self.collection_name}",
+                dropTarget=True,
+            )
+            return
+
+        # One user's rollups cannot be renamed in, so replace them key by
+        # key and drop the ones the rebuild no longer produced
+        keys = await staging.find(
+            {}, projection={"_id": 0, "day": 1, "meal_type": 1}
+        ).to_list(None)
+        await staging.aggregate(
+            [{"$project": {"_id": 0}}, self._merge_stage(self.collection_name)]
+        ).to_list(None)
+        stale = {"user_uuid": user_uuid}
+        if keys:
+            stale["$nor"] = keys
+        await self.collection.delete_many(stale)
+        await staging.drop()
+
+    async def recompute_days(self, source, days: Iterable[Tuple[str, str]]):
+        """Replaces the rollups of the given (user_uuid, day) pairs."""
+        days = sorted(set(days))
+        if days:
+            await source.aggregate(self.backfill_pipeline(days=days)).to_list(None)
+
+    def _merge_stage(self, into: str) -> Dict[str, Any]:
+        return {
+            "$merge": {
+                "into": into,
+                "on": ["user_uuid", "day", "meal_type"],
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }
+        }
+
+    def backfill_pipeline(
+        self,
+        user_uuid: str = None,
+        into: str = None,
+        days: Iterable[Tuple[str, str]] = None,
+    ) -> List[Dict[str, Any]]:
+        match = {"status": "completed", "nutrition_info": {"$type": "object"}}
+        if user_uuid:
+            match["user_uuid"] = user_uuid
+        if days is not None:
+            match["$or"] = [
+                {
+                    "user_uuid": day_user,
+                    "created_at": {
+                        "$gte": datetime.fromisoformat(day),
+                        "$lt": datetime.fromisoformat(day) + timedelta(days=1),
+                    },
+                }
+                for day_user, day in days
+            ]
+
+        def amount(path: str):
+            return {
+                "$convert": {
+                    "input": f"$nutrition_info.{path}",
+                    "to": "double",
+                    "onError": 0,
+                    "onNull": 0,
+                }
+            }
+
+        return [
+            {"$match": match},
+            {
+                "$group": {
+                    "_id": {
+                        "user_uuid": "$user_uuid",
+                        "day": {
+                            "$dateToString": {
+                                "format": "%Y-%m-%d",
+                                "date": "$created_at",
+                            }
+                        },
+                        "meal_type": {
+                            "$cond": [
+                                {"$eq": [{"$ifNull": ["$meal_type", ""]}, ""]},
+                                "unknown",
+                                "$meal_type",
+                            ]
+                        },
+                    },
+                    "count": {"$sum": 1},
+                    **{
+                        field: {"$sum": amount(path)}
+                        for field, path in ROLLUP_FIELDS.items()
+                    },
+                }
+            },
+            {
+                "$project": {
+                    "_id": 0,
+                    "user_uuid": "$_id.user_uuid",
+                    "day": "$_id.day",
+                    "meal_type": "$_id.meal_type",
+                    "count": 1,
+                    "totals": {field: f"${field}" for field in ROLLUP_FIELDS},
+                }
+            },
+            self._merge_stage(into or self.collection_name),
+        ]
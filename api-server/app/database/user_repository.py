@@ -1,19 +1,31 @@
 from datetime import datetime
 
 from app.database.base_repository import BaseRepository
+from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
 from app.models.user import User, UserCreate
-from app.utils.get_password_hash import get_password_hash
+from app.services.auth_cache import invalidate_user
+from app.services.password_service import hash_password
 
 
 class UserRepository(BaseRepository):
+    indexes = [IndexModel([("email", ASCENDING)], name="email_unique", unique=True)]
+    hot_queries = [({"email": "user@example.com"}, None)]
+
     def __init__(self):
         super().__init__("User")
 
     async def create_user(self, user: UserCreate):
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await hash_password(user.password)
         user_dict = user.model_dump(exclude={"password"})
         user_dict["password"] = hashed_password
         user_dict["created_at"] = datetime.now()
 
         result = await self.insert_one(user_dict)
-        return await self.find_one({"_id": result})
+        return await self.find_one({"_id": ObjectId(result)})
+
+    async def update_user(self, email: str, fields: dict) -> int:
+        """All profile writes go through here so cached copies are dropped."""
+        modified = await self.update_one({"email": email}, {"$set": fields})
+        invalidate_user(email)
+        return modified
@@ -1,12 +1,25 @@
-import json
 import logging
 import os
-from datetime import datetime
-from typing import Callable
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+import uuid
+from typing import Callable, List, Tuple
 
+import orjson
 from app.config.settings import settings
+from app.utils import tracing
 from fastapi import FastAPI, Request
 
+LOGGER_NAME = "fastapi"
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+# (logger name, queue handler, listener) for every queue-backed logger
+_listeners: List[Tuple[str, QueueHandler, QueueListener]] = []
+
 
 class JSONFormatter(logging.Formatter):
     def format(self, record):
@@ -17,61 +30,186 @@ class JSONFormatter(logging.Formatter):
             "module": record.module,
             "process": record.process,
             "thread": record.thread,
-            "extra": record.__dict__.get("extra", {}),
+            "extra": {
+                key: value
+                for key, value in record.__dict__.items()
+                if key not in RESERVED_ATTRS
+            },
             "function": record.funcName,
             "line": record.lineno,
         }
-        return json.dumps(data)
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(data, default=str).decode()
+
+
+class OTLPFormatter(logging.Formatter):
+    def format(self, record):
+        return orjson.dumps(
+            record.trace.to_otlp(settings.TRACE_SERVICE_NAME), default=str
+        ).decode()
+
+
+class RotatingJSONLFileHandler(TimedRotatingFileHandler):
+    """Rotates on a schedule and whenever the file grows past `max_bytes`."""
+
+    def __init__(self, filename: str, max_bytes: int, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record):
+        if super().shouldRollover(record):
+            return True
+        if self.max_bytes > 0 and self.stream is not None:
+            return self.stream.tell() >= self.max_bytes
+        return False
+
+
+class DeferredQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Only resolve the message here; JSON encoding and I/O happen on the
+        # listener thread instead of the event loop
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def rotating_file_handler(filename: str) -> RotatingJSONLFileHandler:
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    return RotatingJSONLFileHandler(
+        filename,
+        max_bytes=settings.LOG_MAX_BYTES,
+        when=settings.LOG_ROTATE_WHEN,
+        backupCount=settings.LOG_BACKUP_COUNT,
+        encoding="utf-8",
+    )
+
+
+def attach_queue(logger_name: str, handlers: List[logging.Handler]):
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    logger = logging.getLogger(logger_name)
+    logger.addHandler(queue_handler)
+    logger.setLevel(logging.INFO)
+    # The JSON handlers are the only output, don't also print via root
+    logger.propagate = False
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append((logger_name, queue_handler, listener))
+
+
+def start_logging():
+    """Routes request logs through a queue drained by a background writer thread."""
+    if _listeners:
+        return
+
+    handlers = [rotating_file_handler(settings.LOG_FILE)]
+    if settings.LOG_CONSOLE_ENABLED:
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(JSONFormatter())
+    attach_queue(LOGGER_NAME, handlers)
+
+    if settings.TRACE_EXPORT_FILE:
+        trace_handler = rotating_file_handler(settings.TRACE_EXPORT_FILE)
+        trace_handler.setFormatter(OTLPFormatter())
+        attach_queue(tracing.EXPORT_LOGGER_NAME, [trace_handler])
+
+
+def stop_logging():
+    """Flushes queued records and stops the writer threads."""
+    while _listeners:
+        logger_name, queue_handler, listener = _listeners.pop()
+        logging.getLogger(logger_name).removeHandler(queue_handler)
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
 
 
 class LoggingMiddleware:
     def __init__(self, app: FastAPI):
         self.app = app
-        self.logger = logging.getLogger("fastapi")
+        self.logger = logging.getLogger(LOGGER_NAME)
         self.setup_logging()
 
     def setup_logging(self):
-        os.makedirs(os.path.dirname(settings.LOG_FILE), exist_ok=True)
-        file_handler = logging.FileHandler(settings.LOG_FILE)
-        file_handler.setFormatter(JSONFormatter())
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(JSONFormatter())
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
-        self.logger.setLevel(logging.INFO)
+        start_logging()
+
+    def request_fields(self, request: Request) -> dict:
+        # Read straight from the ASGI scope; `request.url` would build and
+        # parse a full URL on every request
+        client = request.scope.get("client")
+        return {
+            "method": request.scope["method"],
+            "path": request.scope["path"],
+            "client_ip": client[0] if client else None,
+        }
+
+    def should_log(self, status_code: int, response_time_ms: int) -> bool:
+        if status_code >= 400 or response_time_ms >= settings.LOG_SLOW_REQUEST_MS:
+            return True
+        return random.random() < settings.LOG_SUCCESS_SAMPLE_RATE
+
+    def route_name(self, scope: dict) -> str:
+        route = scope.get("route")
+        return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
 
     async def __call__(self, scope: dict, receive: Callable, send: Callable):
         if scope["type"] != "http":
             return await self.app(scope, receive, send)
 
         request = Request(scope)
-        request.state.start_time = datetime.now()
+        request_id = str(uuid.uuid4())
+        request.state.request_id = request_id
+        start_time = time.perf_counter()
+        status_code = 500
 
         async def send_with_logging(message):
+            nonlocal status_code
             if message["type"] == "http.response.start":
-                request.state.response = message
+                status_code = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-request-id", request_id.encode()),
+                ]
             await send(message)
 
-        try:
-            response = await self.app(scope, receive, send_with_logging)
-            extra_data = {
-                "method": request.method,
-                "path": request.url.path,
-                "response_time_ms": int(
-                    (datetime.now() - request.state.start_time).total_seconds() * 1000
-                ),
-                "client_ip": request.client.host,
-                "user_id": getattr(request.state, "user_id", None),
-                "request_id": getattr(request.state, "request_id", None),
-            }
-            self.logger.info("Request processed", extra=extra_data)
-            return response
-        except Exception as e:
-            extra_data = {
-                "method": request.method,
-                "path": request.url.path,
-                "client_ip": request.client.host,
-                "error": str(e),
-            }
+        error = None
+        with tracing.trace(
+            "http.request",
+            request_id=request_id,
+            traceparent=request.headers.get("traceparent"),
+            max_spans=settings.TRACE_MAX_SPANS,
+        ) as trace:
+            try:
+                response = await self.app(scope, receive, send_with_logging)
+            except Exception as e:
+                # Re-raised below, once the root span is closed and logged
+                error = e
+                trace.root.error = type(e).__name__
+            trace.root.name = self.route_name(scope)
+            trace.root.set_attribute("http.status_code", status_code)
+
+        tracing.export(trace)
+        response_time_ms = int((time.perf_counter() - start_time) * 1000)
+        extra_data = {
+            **self.request_fields(request),
+            "status_code": status_code,
+            "response_time_ms": response_time_ms,
+            "user_id": getattr(request.state, "user_id", None),
+            "request_id": request_id,
+            "trace_id": trace.trace_id,
+        }
+        if trace.dropped_spans:
+            extra_data["dropped_spans"] = trace.dropped_spans
+        if error is not None:
+            extra_data["spans"] = trace.summary()
+            extra_data["error"] = str(error)
             self.logger.error("Request failed", extra=extra_data)
-            raise
+            raise error
+
+        if self.should_log(status_code, response_time_ms):
+            extra_data["spans"] = trace.summary()
+            self.logger.info("Request processed", extra=extra_data)
+        return response
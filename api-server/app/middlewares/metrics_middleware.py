@@ -0,0 +1,43 @@
+import time
+from typing import Callable
+
+from app.services.metrics import REQUEST_LATENCY, REQUESTS_IN_FLIGHT, record_error
+from fastapi import FastAPI
+
+
+class MetricsMiddleware:
+    def __init__(self, app: FastAPI):
+        self.app = app
+
+    def route_label(self, scope: dict) -> str:
+        # The route template keeps label cardinality bounded, raw paths
+        # would create a series per job id or day
+        route = scope.get("route")
+        return getattr(route, "path", "unmatched")
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start_time = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            return await self.app(scope, receive, send_with_status)
+        except Exception as e:
+            record_error("request", e)
+            raise
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            REQUEST_LATENCY.labels(
+                method=scope["method"],
+                route=self.route_label(scope),
+                status=str(status_code),
+            ).observe(time.perf_counter() - start_time)
@@ -1,3 +1,5 @@
+from typing import List, Optional
+
 from pydantic import BaseModel
 from beanie import Document
 
@@ -8,7 +10,12 @@ class ImageAnalysisBase(BaseModel):
 
 
 class ImageAnalysisCreate(ImageAnalysisBase):
-    pass
+    food_name: str = ""
+    meal_type: str = ""
+    tags: List[str] = []
+    request_id: Optional[str] = None
+    allow_similar: bool = True
+    prompt_version: Optional[str] = None
 
 
 class ImageAnalysis(Document):
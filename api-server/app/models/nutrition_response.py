@@ -0,0 +1,121 @@
+import re
+from typing import Annotated, Any, Dict, List, Optional
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field
+
+NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def to_number(value: Any) -> Any:
+    # Labels are read as text, so amounts often come back as "12g", "5%"
+    # or "<1"; keep the leading number
+    if isinstance(value, str):
+        match = NUMBER.search(value.replace(",", ""))
+        return float(match.group()) if match else None
+    return value
+
+
+def to_text(value: Any) -> Any:
+    return "" if value is None else value
+
+
+def to_list(value: Any) -> Any:
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(",") if item.strip()]
+    return value
+
+
+Number = Annotated[Optional[float], BeforeValidator(to_number)]
+Text = Annotated[str, BeforeValidator(to_text)]
+TextList = Annotated[Optional[List[str]], BeforeValidator(to_list)]
+
+# Field markers read by `prompt_builder` when it derives the response
+# template from these models: never ask for the field, or only show it
+# where the template example sets it
+NOT_IN_PROMPT = {"prompt": False}
+PROMPT_WHEN_SET = {"prompt": "when_set"}
+
+
+class Nutrient(BaseModel):
+    """One nutrient, shaped like `NutrientSchema` but keyed by name."""
+
+    model_config = ConfigDict(extra="allow")
+
+    amount: Number = 0.0
+    unit: Text = ""
+    daily_value_percentage: Number = None
+    # Fixed per nutrient, so not worth the prompt tokens
+    group: Optional[str] = Field(None, json_schema_extra=NOT_IN_PROMPT)
+    category: Optional[str] = Field(None, json_schema_extra=NOT_IN_PROMPT)
+    sub_nutrients: Optional[Dict[str, "Nutrient"]] = Field(
+        None, json_schema_extra=PROMPT_WHEN_SET
+    )
+
+
+class Vitamin(Nutrient):
+    vitamin_type: Text = ""
+
+
+class Nutrients(BaseModel):
+    # Unlisted nutrients (potassium, ...) are kept as returned
+    model_config = ConfigDict(extra="allow")
+
+    total_fat: Nutrient = Nutrient(
+        unit="g",
+        sub_nutrients={
+            "saturated_fat": Nutrient(unit="g"),
+            "trans_fat": Nutrient(unit="g"),
+        },
+    )
+    cholesterol: Nutrient = Nutrient(unit="mg")
+    carbohydrates: Nutrient = Nutrient(
+        unit="g",
+        sub_nutrients={
+            "dietary_fiber": Nutrient(unit="g"),
+            "total_sugar": Nutrient(unit="g"),
+            "added_sugar": Nutrient(unit="g"),
+        },
+    )
+    protein: Nutrient = Nutrient(unit="g")
+    sodium: Nutrient = Nutrient(unit="mg")
+    calcium: Nutrient = Nutrient(unit="mg")
+    iron: Nutrient = Nutrient(unit="mg")
+    vitamins: List[Vitamin] = []
+
+
+class ServingSize(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    amount: Number = None
+    unit: Text = ""
+    type: Optional[str] = None
+
+
+class ProductDetails(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    serving_size: ServingSize = ServingSize()
+
+
+class Metadata(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    confidence_score: Number = None
+    error_status: Optional[bool] = None
+
+
+class NutritionInfo(BaseModel):
+    """
+    Validated VLM response, and the source of the response template in
+    the compact prompts. Missing fields are filled with the defaults the
+    prompt asks for and extra fields (health insights, ...) are kept.
+    """
+
+    model_config = ConfigDict(extra="allow")
+
+    metadata: Metadata = Metadata()
+    product_details: ProductDetails = ProductDetails()
+    total_calories: Number = 0
+    nutrients: Nutrients = Nutrients()
+    ingredients: TextList = None
+    allergens: TextList = None
@@ -1,20 +1,20 @@
 import uuid
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 from datetime import timedelta
+from app.config.settings import settings
 from app.utils.object_to_str import object_id_to_str
-from app.services import auth_service
+from app.services import auth_service, password_service
+from app.database.dependencies import get_user_repository
 from app.database.user_repository import UserRepository
 from app.models.user import UserCreate
 
 router = APIRouter(tags=["auth"])
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 
 class Token(BaseModel):
-    # access_token: str
-    # token_type: str
+    access_token: str
+    token_type: str
     user: dict
 
 
@@ -30,29 +30,48 @@ class RegisterPayload(BaseModel):
 
 
 @router.post("/login", response_model=Token)
-async def login(payload: LoginPayload):
-    user_repo = UserRepository()
+async def login(
+    payload: LoginPayload,
+    user_repo: UserRepository = Depends(get_user_repository),
+):
     user = await user_repo.find_one({"email": payload.email})
 
-    if not user or not auth_service.verify_password(payload.password, user["password"]):
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await password_service.verify_password(
+            payload.password, user["password"]
+        )
+    if not valid:
         raise HTTPException(
             status_code=401,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # access_token_expires = timedelta(minutes=30)
-    # access_token = auth_service.create_access_token(
-    #     data={"sub": user["email"]},
-    #     expires_delta=access_token_expires,
-    # )
+    if new_hash:
+        # Stored hash used a different bcrypt cost, upgrade it transparently
+        await user_repo.update_user(user["email"], {"password": new_hash})
+
+    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = auth_service.create_access_token(
+        data={"sub": user["email"]},
+        expires_delta=access_token_expires,
+    )
 
-    return {"user": object_id_to_str(user)}
+    # Warm the cache so the first authenticated request skips Mongo
+    user = auth_service.cache_user(user)
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "user": object_id_to_str(user),
+    }
 
 
 @router.post("/register")
-async def register(payload: RegisterPayload):
-    user_repo = UserRepository()
+async def register(
+    payload: RegisterPayload,
+    user_repo: UserRepository = Depends(get_user_repository),
+):
     user = await user_repo.find_one({"email": payload.email})
 
     if user:
@@ -76,7 +95,5 @@ async def register(payload: RegisterPayload):
 
 
 @router.get("/users/me")
-async def read_users_me(token: str = Depends(oauth2_scheme)):
-    user_repo = UserRepository()
-    user = await user_repo.find_one({"email": token})
-    return user
+async def read_users_me(user: dict = Depends(auth_service.get_current_user)):
+    return object_id_to_str(user)
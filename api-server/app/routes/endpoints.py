@@ -29,6 +29,81 @@ def get_endpoints(app: FastAPI = Depends(get_app)):
             "tags": ["image"],
             "payload": {"image_url": "string"},
         },
+        {
+            "path": "/analyze/stream",
+            "method": "POST",
+            "description": "Analyze an image, streaming sections as Server-Sent Events",
+            "tags": ["image"],
+            "payload": {"image_url": "string"},
+        },
+        {
+            "path": "/analyze?async=true",
+            "method": "POST",
+            "description": "Queue an image analysis job and return its id",
+            "tags": ["image"],
+            "payload": {"image_url": "string"},
+        },
+        {
+            "path": "/analyze/batch",
+            "method": "POST",
+            "description": "Analyze a JSON array of /analyze payloads, streaming NDJSON results",
+            "tags": ["image"],
+            "payload": {"image_url": "string"},
+        },
+        {
+            "path": "/analyze/{job_id}",
+            "method": "GET",
+            "description": "Poll the status of an analysis job",
+            "tags": ["image"],
+            "payload": {},
+        },
+        {
+            "path": "/nutrition/logs/{day}",
+            "method": "GET",
+            "description": "A user's analyses for one day, cursor paginated",
+            "tags": ["nutrition"],
+            "payload": {"user_uuid": "string", "cursor": "string", "limit": "int"},
+        },
+        {
+            "path": "/nutrition/history",
+            "method": "GET",
+            "description": "A user's analyses over a date range, cursor paginated",
+            "tags": ["nutrition"],
+            "payload": {
+                "user_uuid": "string",
+                "start": "date",
+                "end": "date",
+                "cursor": "string",
+                "limit": "int",
+                "include_ingredients": "bool",
+            },
+        },
+        {
+            "path": "/stats",
+            "method": "GET",
+            "description": "Daily or weekly nutrient totals from pre-aggregated rollups",
+            "tags": ["stats"],
+            "payload": {
+                "user_uuid": "string",
+                "start": "date",
+                "end": "date",
+                "group_by": "day | week",
+            },
+        },
+        {
+            "path": "/health",
+            "method": "GET",
+            "description": "Service health and MongoDB connection pool utilisation",
+            "tags": ["health"],
+            "payload": {},
+        },
+        {
+            "path": "/metrics",
+            "method": "GET",
+            "description": "Prometheus metrics (served at the root, not under /api)",
+            "tags": ["metrics"],
+            "payload": {},
+        },
         {
             "path": "/token",
             "method": "POST",
@@ -0,0 +1,14 @@
+from app.database.mongo_client import pool_stats
+from app.services.write_behind import write_behind
+from fastapi import APIRouter
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/health")
+async def health():
+    return {
+        "status": "ok",
+        "mongo_pool": pool_stats.snapshot(),
+        "write_behind": write_behind.metrics(),
+    }
@@ -1,12 +1,32 @@
+import asyncio
 import json
-from fastapi import APIRouter, HTTPException, Request
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
-from pydantic import BaseModel
-from app.services import vlm_service
+from pydantic import BaseModel, field_validator
+from app.config.settings import settings
+from app.services import auth_service, rate_limiter, vlm_service
 from datetime import datetime
 import uuid
+from app.database.dependencies import get_image_analysis_repository
 from app.database.image_analysis_repository import ImageAnalysisRepository
+from app.models.image_analysis import ImageAnalysisCreate
+from app.services.analysis_service import (
+    analysis_result_fields,
+    parse_response,
+    run_analysis,
+    save_analyses,
+)
+from app.services.job_queue import job_queue
+from app.services.prompt_builder import PROMPTS
+from app.services.response_parser import parse_nutrition
+from app.services.vlm_resilience import PRIORITY_BATCH, ProviderUnavailableError
+import math
 import traceback
+from app.utils.json_stream import JSONSectionStream
+from app.utils.object_to_str import object_id_to_str
+from app.utils.tracing import current_request_id
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
@@ -18,70 +38,301 @@ class AnalysisRequest(BaseModel):
     meal_type: str
     tags: list
     image_url: str
+    # Set to False to always run the VLM instead of reusing the analysis
+    # of a perceptually near-identical image
+    allow_similar: bool = True
+    # Prompt version to use instead of the default, e.g. for A/B tests
+    prompt_version: Optional[str] = None
+
+    @field_validator("prompt_version")
+    @classmethod
+    def known_prompt_version(cls, value: Optional[str]):
+        if value is not None and value not in PROMPTS:
+            raise ValueError(f"Unknown prompt version, expected one of {list(PROMPTS)}")
+        return value
+
+
+def build_analysis_record(payload: AnalysisRequest, request_id: str, result: dict):
+    return {
+        "user_uuid": payload.user_uuid,
+        "food_name": payload.food_name,
+        "meal_type": payload.meal_type,
+        "request_id": request_id,
+        "tags": payload.tags,
+        "image_url": payload.image_url,
+        **result,
+        "created_at": datetime.now(),
+        "status": "completed",
+    }
+
+
+def provider_unavailable_content(
+    request_id: str, error: ProviderUnavailableError, partial_text: str = ""
+):
+    """
+    Error body for a degraded provider. Carries whatever result is at
+    hand: the streamed text so far, or the closest prior analysis.
+    """
+    partial = None
+    cache = None
+    try:
+        if "{" in partial_text:
+            # A stream cut short by the outage is partial by definition
+            partial = parse_nutrition(partial_text, allow_truncated=True)
+        elif error.fallback is not None:
+            partial = parse_nutrition(error.fallback["response"])
+            cache = error.fallback.get("cache")
+    except ValueError:
+        pass
+
+    return {
+        "request_id": request_id,
+        "detail": "Nutrition analysis is temporarily unavailable",
+        "retry_after": math.ceil(error.retry_after),
+        "partial_result": partial,
+        "cache": cache,
+    }
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
 
 @router.post("/analyze")
 async def analyze_image(
     request: Request,
     payload: AnalysisRequest,
+    run_async: bool = Query(False, alias="async"),
+    analysis_repo: ImageAnalysisRepository = Depends(get_image_analysis_repository),
+    user: dict = Depends(auth_service.get_current_user),
+):
+    auth_service.ensure_user_uuid(user, payload.user_uuid)
+    await rate_limiter.enforce(user["uuid"])
+    # Same id as the request log line and trace
+    request_id = current_request_id() or str(uuid.uuid4())
+
+    if run_async:
+        return await enqueue_analysis(payload, request_id, analysis_repo)
+
+    try:
+        result, llm_response = await run_analysis(
+            payload.image_url,
+            payload.allow_similar,
+            prompt_version=payload.prompt_version,
+        )
+        await rate_limiter.charge_tokens(user["uuid"], llm_response)
+
+        # Store result in database
+        record = build_analysis_record(payload, request_id, result)
+        await save_analyses([dict(record)])
+
+        record.pop("cache_key")
+        return {**record, "cache": llm_response.get("cache")}
+
+    except ProviderUnavailableError as e:
+        content = provider_unavailable_content(request_id, e)
+        return JSONResponse(
+            status_code=503,
+            content=content,
+            headers={"Retry-After": str(content["retry_after"])},
+        )
+    except Exception:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+async def enqueue_analysis(
+    payload: AnalysisRequest,
+    request_id: str,
+    analysis_repo: ImageAnalysisRepository,
 ):
-    request_id = str(uuid.uuid4())
+    if job_queue.full():
+        raise HTTPException(
+            status_code=503,
+            detail="Analysis queue is full, try again later",
+            headers={"Retry-After": "5"},
+        )
 
+    job = await analysis_repo.create_analysis(
+        ImageAnalysisCreate(**payload.model_dump(), request_id=request_id)
+    )
+    job_id = str(job["_id"])
     try:
-        start_time = datetime.now()
-        llm_response = await vlm_service.get_nutrition_info(payload.image_url)
+        job_queue.enqueue(job_id)
+    except asyncio.QueueFull:
+        # Filled up by concurrent requests while the job was being stored
+        await analysis_repo.mark_failed(job_id, "Analysis queue is full")
+        raise HTTPException(
+            status_code=503,
+            detail="Analysis queue is full, try again later",
+            headers={"Retry-After": "5"},
+        )
+
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job_id, "request_id": request_id, "status": "pending"},
+        headers={"Location": f"/api/analyze/{job_id}"},
+    )
+
 
-        if not llm_response:
-            raise HTTPException(
-                status_code=503,
-                detail="Failed to generate response from LLM",
+@router.get("/analyze/{job_id}")
+async def get_analysis(
+    job_id: str,
+    analysis_repo: ImageAnalysisRepository = Depends(get_image_analysis_repository),
+    user: dict = Depends(auth_service.get_current_user),
+):
+    analysis = await analysis_repo.find_by_id(job_id)
+    # Someone else's analysis is reported as missing rather than forbidden
+    if analysis is None or analysis.get("user_uuid") != user["uuid"]:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+
+    analysis.pop("cache_key", None)
+    return object_id_to_str(analysis)
+
+
+@router.post("/analyze/batch")
+async def analyze_batch(
+    request: Request,
+    payload: List[AnalysisRequest],
+    user: dict = Depends(auth_service.get_current_user),
+):
+    if len(payload) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch may contain at most {settings.BATCH_MAX_ITEMS} items",
+        )
+    for item in payload:
+        auth_service.ensure_user_uuid(user, item.user_uuid)
+    # Each item counts against the rate and draws on the token budget
+    await rate_limiter.enforce(user["uuid"], len(payload))
+
+    batch_id = str(uuid.uuid4())
+    semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+
+    async def analyze_item(index: int, item: AnalysisRequest):
+        request_id = str(uuid.uuid4())
+        try:
+            async with semaphore:
+                await rate_limiter.ensure_budget(user["uuid"])
+                result, llm_response = await run_analysis(
+                    item.image_url,
+                    item.allow_similar,
+                    PRIORITY_BATCH,
+                    item.prompt_version,
+                )
+            await rate_limiter.charge_tokens(user["uuid"], llm_response)
+            record = build_analysis_record(item, request_id, result)
+            record["batch_id"] = batch_id
+            return index, record, llm_response, None
+        except Exception as e:
+            traceback.print_exc()
+            return index, None, None, {"request_id": request_id, "error": str(e)}
+
+    async def results():
+        tasks = [
+            asyncio.create_task(analyze_item(index, item))
+            for index, item in enumerate(payload)
+        ]
+        pending_records = []
+
+        async def flush():
+            chunk = pending_records[:]
+            pending_records.clear()
+            try:
+                await save_analyses(chunk)
+            except Exception:
+                # Analyses were already returned to the client, keep going
+                traceback.print_exc()
+
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, record, llm_response, error = await next_done
+                if error is not None:
+                    line = {"index": index, "status": "failed", **error}
+                else:
+                    pending_records.append(record)
+                    line = {
+                        "index": index,
+                        **{k: v for k, v in record.items() if k != "cache_key"},
+                        "cache": llm_response.get("cache"),
+                    }
+                    if len(pending_records) >= settings.BATCH_INSERT_CHUNK_SIZE:
+                        await flush()
+                yield json.dumps(line, default=str) + "\n"
+        finally:
+            # Also when the client goes away: these analyses were billed
+            if pending_records:
+                await asyncio.shield(flush())
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        results(),
+        media_type="application/x-ndjson",
+        headers={"X-Batch-Id": batch_id},
+    )
+
+
+@router.post("/analyze/stream")
+async def analyze_image_stream(
+    request: Request,
+    payload: AnalysisRequest,
+    user: dict = Depends(auth_service.get_current_user),
+):
+    auth_service.ensure_user_uuid(user, payload.user_uuid)
+    await rate_limiter.enforce(user["uuid"])
+    # Same id as the request log line and trace
+    request_id = current_request_id() or str(uuid.uuid4())
+
+    async def events():
+        yield sse_event("started", {"request_id": request_id})
+
+        parser = JSONSectionStream()
+        try:
+            start_time = datetime.now()
+            llm_response = None
+            async for kind, value in vlm_service.stream_nutrition_info(
+                payload.image_url, payload.allow_similar, payload.prompt_version
+            ):
+                if kind == "delta":
+                    for path, section in parser.feed(value):
+                        yield sse_event("section", {"path": path, "value": section})
+                else:
+                    llm_response = value
+            await rate_limiter.charge_tokens(user["uuid"], llm_response)
+
+            nutrient_info = parse_response(llm_response)
+            processing_time = round((datetime.now() - start_time).total_seconds(), 2)
+
+            record = build_analysis_record(
+                payload,
+                request_id,
+                analysis_result_fields(nutrient_info, llm_response, processing_time),
             )
+            await save_analyses([dict(record)])
 
-        nutrient_info = json.loads(llm_response["response"])
-        processing_time = round((datetime.now() - start_time).total_seconds(), 2)
+            record.pop("cache_key")
+            yield sse_event(
+                "complete",
+                {**object_id_to_str(record), "cache": llm_response.get("cache")},
+            )
 
-        # Store result in database
-        analysis_repo = ImageAnalysisRepository()
-        await analysis_repo.insert_one(
-            {
-                "user_uuid": payload.user_uuid,
-                "food_name": payload.food_name,
-                "meal_type": payload.meal_type,
-                "request_id": request_id,
-                "tags": payload.tags,
-                "image_url": payload.image_url,
-                "nutrition_info": nutrient_info,
-                "token_usage": {
-                    "prompt_tokens": llm_response["prompt_tokens"],
-                    "completion_tokens": llm_response["completion_tokens"],
-                    "total_tokens": llm_response["total_tokens"],
+        except ProviderUnavailableError as e:
+            yield sse_event(
+                "error",
+                {
+                    "status": 503,
+                    **provider_unavailable_content(request_id, e, parser.buffer),
                 },
-                "created_at": datetime.now(),
-                "status": "completed",
-                "vlm_response_time": llm_response["completion_time"],
-                "processing_time": processing_time,
-            }
-        )
+            )
+        except Exception:
+            traceback.print_exc()
+            yield sse_event(
+                "error", {"request_id": request_id, "detail": "Internal server error"}
+            )
 
-        return {
-            "user_uuid": payload.user_uuid,
-            "food_name": payload.food_name,
-            "meal_type": payload.meal_type,
-            "request_id": request_id,
-            "tags": payload.tags,
-            "image_url": payload.image_url,
-            "nutrition_info": nutrient_info,
-            "token_usage": {
-                "prompt_tokens": llm_response["prompt_tokens"],
-                "completion_tokens": llm_response["completion_tokens"],
-                "total_tokens": llm_response["total_tokens"],
-            },
-            "created_at": datetime.now(),
-            "status": "completed",
-            "vlm_response_time": llm_response["completion_time"],
-            "processing_time": processing_time,
-        }
-
-    except Exception as e:
-        traceback.print_exc(e)
-        raise HTTPException(status_code=500, detail="Internal server error")
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
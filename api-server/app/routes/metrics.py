@@ -0,0 +1,10 @@
+from app.services.metrics import render_metrics
+from fastapi import APIRouter, Response
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,128 @@
+import json
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from app.database.dependencies import get_image_analysis_repository
+from app.database.image_analysis_repository import ImageAnalysisRepository
+from app.services import auth_service
+from app.utils.cursor import decode_cursor, encode_cursor
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+router = APIRouter(tags=["nutrition"])
+
+MAX_PAGE_SIZE = 1000
+
+# Internal bookkeeping that the dashboard never needs
+HIDDEN_FIELDS = {"cache_key": 0, "phash": 0, "image_preprocessing": 0}
+
+
+def history_projection(include_ingredients: bool):
+    projection = dict(HIDDEN_FIELDS)
+    if not include_ingredients:
+        projection["nutrition_info.ingredients"] = 0
+    return projection
+
+
+async def stream_page(cursor, limit: int):
+    """
+    Serializes a page straight off the Mongo cursor as
+    `{"items": [...], "next_cursor": ...}` without buffering it in memory.
+    The cursor is expected to fetch `limit + 1` documents.
+    """
+    yield '{"items":['
+    count = 0
+    last = None
+    has_more = False
+    async for document in cursor:
+        if count == limit:
+            # The extra document only tells us another page exists
+            has_more = True
+            break
+        yield ("," if count else "") + json.dumps(
+            {**document, "_id": str(document["_id"])}, default=str
+        )
+        last = document
+        count += 1
+
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor(last["created_at"], last["_id"])
+    yield f'],"next_cursor":{json.dumps(next_cursor)}}}'
+
+
+def history_response(
+    analysis_repo: ImageAnalysisRepository,
+    user_uuid: str,
+    start: datetime,
+    end: datetime,
+    cursor: Optional[str],
+    limit: int,
+    include_ingredients: bool,
+):
+    try:
+        after = decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    documents = analysis_repo.find_by_user(
+        user_uuid,
+        start,
+        end,
+        after=after,
+        limit=limit + 1,
+        projection=history_projection(include_ingredients),
+    )
+    return StreamingResponse(
+        stream_page(documents, limit), media_type="application/json"
+    )
+
+
+@router.get("/logs/{day}")
+async def get_daily_logs(
+    day: date,
+    user_uuid: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    include_ingredients: bool = False,
+    analysis_repo: ImageAnalysisRepository = Depends(get_image_analysis_repository),
+    user: dict = Depends(auth_service.get_current_user),
+):
+    user_uuid = auth_service.ensure_user_uuid(user, user_uuid)
+    start = datetime.combine(day, time.min)
+    return history_response(
+        analysis_repo,
+        user_uuid,
+        start,
+        start + timedelta(days=1),
+        cursor,
+        limit,
+        include_ingredients,
+    )
+
+
+@router.get("/history")
+async def get_history(
+    start: date,
+    end: date,
+    user_uuid: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    include_ingredients: bool = False,
+    analysis_repo: ImageAnalysisRepository = Depends(get_image_analysis_repository),
+    user: dict = Depends(auth_service.get_current_user),
+):
+    """Analyses from `start` through `end` inclusive, newest first."""
+    user_uuid = auth_service.ensure_user_uuid(user, user_uuid)
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+
+    return history_response(
+        analysis_repo,
+        user_uuid,
+        datetime.combine(start, time.min),
+        datetime.combine(end + timedelta(days=1), time.min),
+        cursor,
+        limit,
+        include_ingredients,
+    )
@@ -0,0 +1,42 @@
+from datetime import date, timedelta
+from typing import Literal, Optional
+
+from app.services import auth_service, rate_limiter, rollup_service
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+router = APIRouter(tags=["stats"])
+
+
+@router.get("/stats")
+async def get_stats(
+    user_uuid: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    group_by: Literal["day", "week"] = "day",
+    days: int = Query(90, ge=1, le=366),
+    user: dict = Depends(auth_service.get_current_user),
+):
+    """Nutrient totals read only from the daily rollups."""
+    user_uuid = auth_service.ensure_user_uuid(user, user_uuid)
+    end = end or date.today()
+    start = start or end - timedelta(days=days - 1)
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+
+    return {
+        "user_uuid": user_uuid,
+        "start": start,
+        "end": end,
+        "group_by": group_by,
+        "periods": await rollup_service.get_stats(user_uuid, start, end, group_by),
+    }
+
+
+@router.get("/stats/budget")
+async def get_budget(
+    user_uuid: Optional[str] = None,
+    user: dict = Depends(auth_service.get_current_user),
+):
+    """Today's VLM token budget: used, remaining and when it resets."""
+    user_uuid = auth_service.ensure_user_uuid(user, user_uuid)
+    return await rate_limiter.get_budget(user_uuid)
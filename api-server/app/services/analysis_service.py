@@ -0,0 +1,73 @@
+from datetime import datetime
+from typing import List, Optional
+
+from app.config.settings import settings
+from app.database.dependencies import get_image_analysis_repository
+from app.services import rollup_service, vlm_service
+from app.services.metrics import JSON_PARSE_LATENCY, record_error
+from app.services.response_parser import parse_nutrition
+from app.services.vlm_resilience import PRIORITY_INTERACTIVE
+from app.services.write_behind import write_behind
+from app.utils.tracing import span
+
+
+def analysis_result_fields(
+    nutrient_info: dict, llm_response: dict, processing_time: float
+):
+    return {
+        "nutrition_info": nutrient_info,
+        "token_usage": {
+            "prompt_tokens": llm_response["prompt_tokens"],
+            "completion_tokens": llm_response["completion_tokens"],
+            "total_tokens": llm_response["total_tokens"],
+        },
+        "vlm_response_time": llm_response["completion_time"],
+        "processing_time": processing_time,
+        "cache_key": llm_response.get("cache_key"),
+        "image_preprocessing": llm_response.get("image"),
+        "phash": (llm_response.get("image") or {}).get("phash"),
+        "vlm_model": llm_response.get("model"),
+        "prompt_version": llm_response.get("prompt_version"),
+        "vlm_routing": llm_response.get("routing"),
+    }
+
+
+def parse_response(llm_response: dict) -> dict:
+    try:
+        with span("vlm.parse"), JSON_PARSE_LATENCY.time():
+            return parse_nutrition(llm_response["response"])
+    except ValueError as e:
+        record_error("parse", e)
+        raise
+
+
+async def run_analysis(
+    image_url: str,
+    allow_similar: bool = True,
+    priority: int = PRIORITY_INTERACTIVE,
+    prompt_version: Optional[str] = None,
+):
+    """Runs the VLM and returns `(result_fields, llm_response)`."""
+    start_time = datetime.now()
+    llm_response = await vlm_service.get_nutrition_info(
+        image_url, allow_similar, priority, prompt_version
+    )
+    if not llm_response:
+        raise RuntimeError("Failed to generate response from LLM")
+
+    nutrient_info = parse_response(llm_response)
+    processing_time = round((datetime.now() - start_time).total_seconds(), 2)
+    return (
+        analysis_result_fields(nutrient_info, llm_response, processing_time),
+        llm_response,
+    )
+
+
+async def save_analyses(records: List[dict]):
+    """Persists completed analysis records and updates the daily rollups."""
+    if settings.WRITE_BEHIND_ENABLED:
+        await write_behind.submit(records)
+        return
+
+    await get_image_analysis_repository().insert_many(records)
+    await rollup_service.record_analyses(records)
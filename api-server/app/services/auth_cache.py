@@ -0,0 +1,16 @@
+from app.config.settings import settings
+from app.utils.lru_cache import LRUCache
+
+# Verified JWT claims by raw token, each entry expiring with its token
+token_cache = LRUCache(
+    settings.TOKEN_CACHE_MAX_ENTRIES, settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
+
+# User documents (without the password hash) by email. Caches are per
+# process, so the TTL bounds how stale another worker's copy can get after
+# `invalidate_user`.
+user_cache = LRUCache(settings.USER_CACHE_MAX_ENTRIES, settings.USER_CACHE_TTL_SECONDS)
+
+
+def invalidate_user(email: str):
+    user_cache.pop(email)
@@ -1,28 +1,23 @@
-from datetime import datetime, timedelta
+import time
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 import jwt
-from app.config import settings
-from app.database.user_repository import UserRepository
-from fastapi import HTTPException, status
+from app.config.settings import settings
+from app.database.dependencies import get_user_repository
+from app.services.auth_cache import token_cache, user_cache
+from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose.exceptions import JWTError
-from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 
-def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
-
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
-        expire = datetime.now() + expires_delta
+        expire = datetime.now(timezone.utc) + expires_delta
     else:
-        expire = datetime.now() + timedelta(
+        expire = datetime.now(timezone.utc) + timedelta(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
     to_encode.update({"exp": expire})
@@ -32,7 +27,33 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-async def get_current_user(token: str):
+def decode_access_token(token: str) -> dict:
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+
+    payload = jwt.decode(
+        token,
+        settings.SECRET_KEY,
+        algorithms=[settings.ALGORITHM],
+        options={"require": ["exp", "sub"]},
+    )
+    # Never cache past the token's own expiry
+    token_cache.set(token, payload, max(payload["exp"] - time.time(), 0))
+    return payload
+
+
+def public_user(user: dict) -> dict:
+    return {key: value for key, value in user.items() if key != "password"}
+
+
+def cache_user(user: dict) -> dict:
+    user = public_user(user)
+    user_cache.set(user["email"], user)
+    return user
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -40,17 +61,33 @@ async def get_current_user(token: str):
     )
 
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
+        payload = decode_access_token(token)
+    except jwt.InvalidTokenError:
+        raise credentials_exception
+
+    email: str = payload.get("sub")
+    if email is None:
+        raise credentials_exception
 
-        user_repo = UserRepository()
+    user = user_cache.get(email)
+    if user is None:
+        user_repo = get_user_repository()
         user = await user_repo.find_one({"email": email})
         if user is None:
             raise credentials_exception
-
-    except JWTError:
-        raise credentials_exception
+        user = cache_user(user)
 
     return user
+
+
+def ensure_user_uuid(user: dict, user_uuid: Optional[str]) -> str:
+    """
+    Resolves the `user_uuid` a request acts on, rejecting requests made
+    on behalf of another user.
+    """
+    if user_uuid is not None and user_uuid != user["uuid"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not allowed to access another user's data",
+        )
+    return user["uuid"]
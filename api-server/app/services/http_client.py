@@ -0,0 +1,43 @@
+import importlib.util
+from typing import Optional
+
+import httpx
+from app.config.settings import settings
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def http2_available() -> bool:
+    return settings.HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+
+
+def build_timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        settings.HTTP_READ_TIMEOUT,
+        connect=settings.HTTP_CONNECT_TIMEOUT,
+        pool=settings.HTTP_POOL_TIMEOUT,
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared connection pool used for every outbound HTTP call."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=http2_available(),
+            timeout=build_timeout(),
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+            ),
+            follow_redirects=True,
+        )
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,204 @@
+import asyncio
+import base64
+import hashlib
+import io
+import ipaddress
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import httpx
+from app.config.settings import settings
+from app.services.http_client import get_http_client
+from PIL import Image, ImageOps
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+MAX_REDIRECTS = 5
+
+
+class ImageFetchError(ValueError):
+    pass
+
+
+async def ensure_public_url(url: httpx.URL) -> Optional[str]:
+    """
+    Only http(s) URLs whose host resolves to public addresses may be
+    fetched, so user supplied URLs cannot reach internal services.
+    Returns the checked address to connect to, or None when private
+    hosts are allowed.
+    """
+    if url.scheme not in ("http", "https") or not url.host:
+        raise ImageFetchError(f"Unsupported image URL: {url}")
+    if settings.IMAGE_ALLOW_PRIVATE_HOSTS:
+        return None
+
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            url.host, url.port or (443 if url.scheme == "https" else 80)
+        )
+    except OSError as e:
+        raise ImageFetchError(f"Cannot resolve image host {url.host}") from e
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0])
+        if not address.is_global:
+            raise ImageFetchError(f"Image host {url.host} is not public")
+    return infos[0][4][0]
+
+
+def pinned_request(url: httpx.URL, address: Optional[str]) -> dict:
+    """
+    Arguments for a request to `url` that connects to `address` instead of
+    resolving the host again, which a rebinding DNS server could answer
+    with a private address. The Host header and TLS server name (for SNI
+    and certificate checks) still name the original host.
+    """
+    if address is None:
+        return {"url": url}
+    return {
+        "url": url.copy_with(host=address),
+        "headers": {"Host": url.netloc.decode("ascii")},
+        "extensions": {"sni_hostname": url.host},
+    }
+
+
+async def fetch_image_bytes(image_url: str) -> bytes:
+    """
+    Downloads the image, following redirects only to allowed hosts and
+    giving up past `IMAGE_MAX_BYTES` or `IMAGE_FETCH_TIMEOUT` seconds.
+    """
+    try:
+        async with asyncio.timeout(settings.IMAGE_FETCH_TIMEOUT):
+            return await _fetch(httpx.URL(image_url))
+    except TimeoutError as e:
+        raise ImageFetchError(
+            f"Image download took longer than {settings.IMAGE_FETCH_TIMEOUT}s"
+        ) from e
+
+
+async def _fetch(url: httpx.URL) -> bytes:
+    for _ in range(MAX_REDIRECTS + 1):
+        address = await ensure_public_url(url)
+        async with get_http_client().stream(
+            "GET", follow_redirects=False, **pinned_request(url, address)
+        ) as response:
+            if response.is_redirect:
+                url = url.join(response.headers["location"])
+                continue
+            response.raise_for_status()
+
+            length = response.headers.get("content-length")
+            if length and length.isdigit() and int(length) > settings.IMAGE_MAX_BYTES:
+                raise ImageFetchError(
+                    f"Image is larger than {settings.IMAGE_MAX_BYTES} bytes"
+                )
+            body = bytearray()
+            async for part in response.aiter_bytes():
+                body += part
+                if len(body) > settings.IMAGE_MAX_BYTES:
+                    raise ImageFetchError(
+                        f"Image is larger than {settings.IMAGE_MAX_BYTES} bytes"
+                    )
+            return bytes(body)
+    raise ImageFetchError("Too many redirects fetching the image")
+
+
+def image_digest(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=settings.IMAGE_PROCESS_WORKERS)
+    return _process_pool
+
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    # Vision models bill images per tile of the (provider-resized) input
+    tile = settings.IMAGE_TOKEN_TILE_SIZE
+    tiles = min(
+        math.ceil(width / tile) * math.ceil(height / tile),
+        settings.IMAGE_TOKEN_MAX_TILES,
+    )
+    return tiles * settings.IMAGE_TOKENS_PER_TILE
+
+
+# Side of the difference hash grid; labels differ only in small print, so
+# coarser grids hash different products alike
+PHASH_SIZE = 48
+PHASH_BITS = PHASH_SIZE * PHASH_SIZE
+# Gray levels a pixel must exceed its right neighbour by to set a bit, so
+# compression noise in flat areas does not flip bits
+PHASH_MIN_STEP = 4
+
+
+def dhash(image: Image.Image) -> str:
+    # Difference hash: compares horizontally adjacent pixels of a
+    # (PHASH_SIZE + 1) x PHASH_SIZE grayscale thumbnail
+    width = PHASH_SIZE + 1
+    pixels = list(
+        image.convert("L")
+        .resize((width, PHASH_SIZE), Image.Resampling.LANCZOS)
+        .getdata()
+    )
+    value = 0
+    for row in range(PHASH_SIZE):
+        for col in range(PHASH_SIZE):
+            left = pixels[row * width + col]
+            right = pixels[row * width + col + 1]
+            value = (value << 1) | (left > right + PHASH_MIN_STEP)
+    return f"{value:0{PHASH_BITS // 4}x}"
+
+
+def _process_image(image_bytes: bytes, max_edge: int, image_format: str, quality: int):
+    # Runs in the process pool, so it must stay a picklable top-level function
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        original_size = image.size
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGB")
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+        output = io.BytesIO()
+        image.save(output, format=image_format, quality=quality, optimize=True)
+        return output.getvalue(), original_size, image.size, dhash(image)
+
+
+async def preprocess_image(image_bytes: bytes):
+    """
+    Auto-orients, downscales and re-encodes an image off the event loop.
+    Returns `(data_url, stats)`.
+    """
+    image_format = settings.IMAGE_FORMAT.upper()
+    loop = asyncio.get_running_loop()
+    encoded, original_size, size, phash = await loop.run_in_executor(
+        get_process_pool(),
+        _process_image,
+        image_bytes,
+        settings.IMAGE_MAX_EDGE,
+        image_format,
+        settings.IMAGE_QUALITY,
+    )
+
+    data_url = (
+        f"data:image/{image_format.lower()};base64,"
+        f"{base64.b64encode(encoded).decode('ascii')}"
+    )
+    stats = {
+        "bytes_in": len(image_bytes),
+        "bytes_out": len(encoded),
+        "original_size": list(original_size),
+        "size": list(size),
+        "estimated_prompt_tokens_saved": estimate_image_tokens(*original_size)
+        - estimate_image_tokens(*size),
+        "phash": phash,
+    }
+    return data_url, stats
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from app.config.settings import settings
+from app.database.dependencies import get_image_analysis_repository
+from app.database.image_analysis_repository import ImageAnalysisRepository
+from app.services import rate_limiter, rollup_service
+from app.services.analysis_service import run_analysis
+from app.services.metrics import record_error
+from app.services.vlm_resilience import PRIORITY_BATCH, ProviderUnavailableError
+from app.utils import tracing
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisJobQueue:
+    """
+    Bounded queue of pending analysis ids drained by a fixed pool of asyncio
+    workers. The job documents themselves live in `nutrition_analysis`, so
+    the queue only ever holds ids and can be rebuilt from Mongo on startup.
+    """
+
+    def __init__(self):
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers: List[asyncio.Task] = []
+        # Jobs waiting out a provider outage before going back on the queue
+        self._retries: Dict[str, asyncio.TimerHandle] = {}
+
+    @property
+    def repo(self) -> ImageAnalysisRepository:
+        return get_image_analysis_repository()
+
+    def full(self) -> bool:
+        return self.queue is None or self.queue.full()
+
+    def depth(self) -> int:
+        return 0 if self.queue is None else self.queue.qsize()
+
+    def enqueue(self, job_id: str):
+        self.queue.put_nowait(job_id)
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=settings.JOB_QUEUE_MAX_SIZE)
+        self.workers = [
+            asyncio.create_task(self._worker(i))
+            for i in range(settings.JOB_WORKER_CONCURRENCY)
+        ]
+
+        stale_before = datetime.now() - timedelta(
+            seconds=settings.JOB_STALE_AFTER_SECONDS
+        )
+        recovered = await self.repo.recover_pending(stale_before)
+        for job_id in recovered:
+            # Anything that does not fit stays pending for the next restart
+            if self.queue.full():
+                break
+            self.enqueue(job_id)
+        logger.info(f"[JobQueue] Recovered {len(recovered)} pending analyses")
+
+    async def stop(self):
+        # Jobs waiting for a retry are pending in Mongo and recovered later
+        for handle in self._retries.values():
+            handle.cancel()
+        self._retries.clear()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job_id = await self.queue.get()
+            try:
+                await self._process(job_id)
+            except Exception as e:
+                # Claiming or failing the job can hit Mongo too; the worker
+                # must outlive it, and a claimed job is recovered as stale
+                logger.exception(f"[JobQueue] Worker {worker_id} failed on {job_id}")
+                record_error("job", e)
+            finally:
+                self.queue.task_done()
+
+    async def _process(self, job_id: str):
+        job = await self.repo.claim_pending(job_id)
+        if job is None:
+            # Already claimed by another worker or process
+            return
+
+        with tracing.trace(
+            "job.analysis",
+            request_id=job.get("request_id"),
+            max_spans=settings.TRACE_MAX_SPANS,
+            kind=tracing.SPAN_KIND_INTERNAL,
+        ) as trace:
+            trace.root.set_attribute("job.id", job_id)
+            try:
+                result, llm_response = await run_analysis(
+                    job["image_url"],
+                    job.get("allow_similar", True),
+                    PRIORITY_BATCH,
+                    job.get("prompt_version"),
+                )
+                await rate_limiter.charge_tokens(job.get("user_uuid"), llm_response)
+                await self.repo.update_result(job_id, result)
+                await rollup_service.record_analyses([{**job, **result}])
+            except asyncio.CancelledError:
+                # Shutting down: hand the job back so it is recovered on restart
+                await asyncio.shield(self.repo.release(job_id))
+                raise
+            except ProviderUnavailableError as e:
+                # Outages and overload pass; the job waits them out
+                if job.get("retries", 0) >= settings.JOB_MAX_RETRIES:
+                    await self._fail(job_id, e, trace)
+                else:
+                    logger.warning(f"[JobQueue] Analysis {job_id} deferred: {e}")
+                    await self.repo.release(job_id, str(e))
+                    self._retry_later(job_id, e.retry_after)
+            except Exception as e:
+                await self._fail(job_id, e, trace)
+        tracing.export(trace)
+
+    async def _fail(self, job_id: str, error: Exception, trace):
+        logger.exception(f"[JobQueue] Analysis {job_id} failed")
+        record_error("job", error)
+        trace.root.error = type(error).__name__
+        await self.repo.mark_failed(job_id, str(error))
+
+    def _retry_later(self, job_id: str, delay: float):
+        self._retries[job_id] = asyncio.get_running_loop().call_later(
+            max(delay, settings.JOB_RETRY_MIN_DELAY), self._requeue, job_id
+        )
+
+    def _requeue(self, job_id: str):
+        self._retries.pop(job_id, None)
+        # Left pending when full, like the backlog recovered on startup
+        if not self.full():
+            self.enqueue(job_id)
+
+
+job_queue = AnalysisJobQueue()
@@ -0,0 +1,166 @@
+"""
+Process metrics exposed at `/metrics` in the Prometheus text format.
+
+With several uvicorn workers, set `PROMETHEUS_MULTIPROC_DIR` to an empty
+directory before the server starts. Every worker then writes its samples
+to shared files there and any worker can serve the aggregate.
+"""
+
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Model calls run for seconds, everything else for milliseconds
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+VLM_BUCKETS = (0.25, 0.5, 1, 2, 3, 5, 7.5, 10, 15, 20, 30, 45, 60)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS + (30, 60),
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served",
+    multiprocess_mode="livesum",
+)
+VLM_LATENCY = Histogram(
+    "vlm_request_duration_seconds",
+    "Upstream VLM call latency",
+    ["model", "mode", "outcome"],
+    buckets=VLM_BUCKETS,
+)
+VLM_RETRIES = Counter(
+    "vlm_retries_total",
+    "VLM calls retried, by the reason the previous attempt failed",
+    ["reason"],
+)
+VLM_HEDGES = Counter(
+    "vlm_hedged_requests_total",
+    "Hedged VLM requests sent or skipped for want of a slot, and how many won",
+    ["outcome"],
+)
+VLM_CIRCUIT_TRANSITIONS = Counter(
+    "vlm_circuit_transitions_total",
+    "VLM circuit breaker state changes",
+    ["state"],
+)
+VLM_CONCURRENCY_LIMIT = Gauge(
+    "vlm_concurrency_limit",
+    "Current adaptive limit on concurrent VLM calls",
+    multiprocess_mode="livesum",
+)
+VLM_IN_FLIGHT = Gauge(
+    "vlm_calls_in_flight",
+    "VLM calls currently holding a concurrency slot",
+    multiprocess_mode="livesum",
+)
+VLM_QUEUE_DEPTH = Gauge(
+    "vlm_queue_depth",
+    "Requests waiting for a VLM concurrency slot",
+    multiprocess_mode="livesum",
+)
+VLM_SHED = Counter(
+    "vlm_requests_shed_total",
+    "Requests turned away by VLM admission control",
+    ["reason", "priority"],
+)
+VLM_ROUTED = Counter(
+    "vlm_routed_requests_total",
+    "Routed VLM requests by the tier that answered and why",
+    ["tier", "reason"],
+)
+VLM_ROUTING_SAVED_SECONDS = Counter(
+    "vlm_routing_saved_seconds_total",
+    "Estimated latency saved by fast model answers, against the strong "
+    "model's median",
+)
+VLM_ROUTING_ESCALATION_SECONDS = Counter(
+    "vlm_routing_escalation_seconds_total",
+    "Time spent on fast model answers that were escalated",
+)
+VLM_ROUTING_ESCALATION_TOKENS = Counter(
+    "vlm_routing_escalation_tokens_total",
+    "Tokens spent on fast model answers that were escalated",
+)
+VLM_TOKENS = Counter(
+    "vlm_tokens_total",
+    "Tokens billed by the VLM provider",
+    ["model", "kind"],
+)
+RATE_LIMITED = Counter(
+    "rate_limited_requests_total",
+    "Requests rejected by per-user rate limits",
+    ["scope"],
+)
+MONGO_LATENCY = Histogram(
+    "mongo_command_duration_seconds",
+    "MongoDB command latency",
+    ["command", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+JSON_PARSE_LATENCY = Histogram(
+    "vlm_response_parse_duration_seconds",
+    "Time spent parsing VLM responses into nutrition info",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05),
+)
+VLM_RESPONSE_REPAIRS = Counter(
+    "vlm_response_repairs_total",
+    "VLM responses that only parsed after local JSON repair",
+)
+CACHE_LOOKUPS = Counter(
+    "result_cache_lookups_total",
+    "VLM result cache lookups by the tier that answered",
+    ["tier"],
+)
+ERRORS = Counter(
+    "errors_total",
+    "Errors by pipeline stage and exception type",
+    ["stage", "type"],
+)
+
+
+def multiprocess_enabled() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def record_error(stage: str, error: BaseException):
+    ERRORS.labels(stage=stage, type=type(error).__name__).inc()
+
+
+def render_metrics():
+    """Returns `(body, content_type)` for the `/metrics` response."""
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    # Drops this worker's live gauges from the shared files on shutdown
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(os.getpid())
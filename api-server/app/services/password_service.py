@@ -0,0 +1,78 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from app.config.settings import settings
+from passlib.context import CryptContext
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+@lru_cache
+def crypt_context(rounds: int) -> CryptContext:
+    # Hashes with any other cost are reported as needing an update, so
+    # changing BCRYPT_ROUNDS rehashes passwords (up or down) on next login
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+def _hash(password: str, rounds: int) -> str:
+    # Runs in the process pool, so it must stay a picklable top-level function
+    return crypt_context(rounds).hash(password)
+
+
+def _verify_and_update(
+    password: str, hashed_password: str, rounds: int
+) -> Tuple[bool, Optional[str]]:
+    return crypt_context(rounds).verify_and_update(password, hashed_password)
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+    return _process_pool
+
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(settings.PASSWORD_HASH_CONCURRENCY)
+    return _semaphore
+
+
+async def _run(fn, *args):
+    async with get_semaphore():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_process_pool(), fn, *args)
+
+
+async def hash_password(password: str) -> str:
+    return await _run(_hash, password, settings.BCRYPT_ROUNDS)
+
+
+async def verify_password(
+    password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    Checks a password off the event loop. Returns `(valid, new_hash)`, where
+    `new_hash` is set when the stored hash used a different bcrypt cost and
+    should be replaced.
+    """
+    return await _run(
+        _verify_and_update, password, hashed_password, settings.BCRYPT_ROUNDS
+    )
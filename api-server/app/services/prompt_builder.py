@@ -0,0 +1,434 @@
+"""
+Prompt versions for the nutrition extraction call, each built once at
+import. Cached results are keyed by version, so change a prompt by adding
+a version rather than editing one. A request may pick its version
+(`prompt_version`) to A/B them; compare their sizes with
+
+    python -m benchmarks.bench_prompt_tokens
+"""
+
+from typing import Any, Dict, Optional
+
+import orjson
+from app.config.settings import settings
+from app.models.nutrition_response import (
+    Metadata,
+    NutritionInfo,
+    Nutrients,
+    Vitamin,
+)
+from pydantic import BaseModel
+
+
+class Prompt:
+    def __init__(self, version: str, text: str, response_format: Dict[str, Any]):
+        self.version = version
+        self.text = text
+        self.response_format = response_format
+
+    def messages(self, image_source: str):
+        return [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": self.text},
+                    {"type": "image_url", "image_url": {"url": image_source}},
+                ],
+            },
+        ]
+
+
+def skeleton(value: Any) -> Any:
+    """
+    The response template for a model instance: field names with their
+    example values, minus fields marked `NOT_IN_PROMPT` and unset
+    `PROMPT_WHEN_SET` ones.
+    """
+    if isinstance(value, BaseModel):
+        template = {}
+        for name, field in type(value).model_fields.items():
+            marker = (field.json_schema_extra or {}).get("prompt", True)
+            field_value = getattr(value, name)
+            if marker is False or (marker == "when_set" and field_value is None):
+                continue
+            template[name] = skeleton(field_value)
+        return template
+    if isinstance(value, dict):
+        return {key: skeleton(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [skeleton(item) for item in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+# One of each repeated item, so the template shows their shape
+TEMPLATE_EXAMPLE = NutritionInfo(
+    metadata=Metadata(confidence_score=0, error_status=False),
+    nutrients=Nutrients(vitamins=[Vitamin(vitamin_type="A", unit="mcg")]),
+    ingredients=[""],
+    allergens=[""],
+)
+
+COMPACT_INSTRUCTIONS = (
+    "Read the nutrition facts on this food label. Reply with only a JSON "
+    "object shaped like this template:\n"
+    "{template}\n"
+    "Amounts are numbers in the label's unit (g, mg, mcg) and "
+    "daily_value_percentage is the %DV number. Use 0 for amounts and null "
+    "for values the label does not show. Add other listed nutrients under "
+    "nutrients and one vitamins entry per vitamin. Expand abbreviations "
+    "(sat. = saturated). confidence_score is your confidence from 0 to 1. "
+    'Add short "health_insights" strings if useful.'
+)
+
+
+def build_compact_prompt() -> str:
+    template = orjson.dumps(skeleton(TEMPLATE_EXAMPLE)).decode()
+    return COMPACT_INSTRUCTIONS.replace("{template}", template)
+
+
+NUTRITION_PROMPT = """
+Extract comprehensive nutritional information from the food label image. Structure the output in JSON format, including fields even if values are missing (use 0 or null). Ensure all units are standardized (g, mg, mcg, %DV) and include daily value percentages where available. Handle abbreviations appropriately (e.g., 'sat.' → 'saturated', 'cholest.' → 'cholesterol'). If any field is missing from the label, use 0 for numerical values and empty strings/null for text fields. Add your confidence score precisely upto 2 floating points to the metadata field. Please include the health insights from your side if possible.
+
+Response Structure:
+{
+    "metadata": {
+        "confidence_score": "float or null",
+        "error_status": "boolean or null"
+    },
+    "product_details": {
+        "serving_size": {
+            "amount": "float or null",
+            "unit": "string"
+            "type": "string or null", # e.g., 'calories', 'serving', 'container'
+        }
+    },
+    "total_calories": "integer",
+    "nutrients": {
+        "total_fat": {
+            "amount": "float or null",
+            "unit": "g",
+            "daily_value_percentage": "float or null",
+            "group": "fats",
+            "category": "macronutrient",
+            "sub_nutrients": {
+                "saturated_fat": {
+                    "amount": "float or null",
+                    "unit": "g",
+                    "daily_value_percentage": "float or null",
+                    "group": "fats",
+                    "category": "macronutrient"
+                },
+                "trans_fat": {
+                    "amount": "float or null",
+                    "unit": "g",
+                    "daily_value_percentage": "float or null",
+                    "group": "fats",
+                    "category": "macronutrient"
+                }
+            }
+        },
+        "cholesterol": {
+            "amount": "float or null",
+            "unit": "mg",
+            "daily_value_percentage": "float or null",
+            "group": "fats",
+            "category": "macronutrient"
+        },
+        "carbohydrates": {
+            "amount": "float or null",
+            "unit": "g",
+            "daily_value_percentage": "float or null",
+            "group": "carbohydrates",
+            "category": "macronutrient",
+            "sub_nutrients": {
+                "dietary_fiber": {
+                    "amount": "float or null",
+                    "unit": "g",
+                    "daily_value_percentage": "float or null",
+                    "group": "carbohydrates",
+                    "category": "macronutrient"
+                },
+                "total_sugar": {
+                    "amount": "float or null",
+                    "unit": "g",
+                    "daily_value_percentage": "float or null",
+                    "group": "carbohydrates",
+                    "category": "macronutrient"
+                },
+                "added_sugar": {
+                    "amount": "float or null",
+                    "unit": "g",
+                    "daily_value_percentage": "float or null",
+                    "group": "carbohydrates",
+                    "category": "macronutrient"
+                }
+            }
+        },
+        "protein": {
+            "amount": "float or null",
+            "unit": "g",
+            "daily_value_percentage": "float or null",
+            "group": "protein",
+            "category": "macronutrient"
+        },
+        "sodium": {
+            "amount": "float or null",
+            "unit": "mg",
+            "daily_value_percentage": "float or null",
+            "group": "mineral",
+            "category": "micronutrient"
+        },
+        "calcium": {
+            "amount": "float or null",
+            "unit": "mg",
+            "daily_value_percentage": "float or null",
+            "group": "mineral",
+            "category": "micronutrient"
+        },
+        "iron": {
+            "amount": "float or null",
+            "unit": "mg",
+            "daily_value_percentage": "float or null",
+            "group": "mineral",
+            "category": "micronutrient"
+        },
+        "vitamins": [
+            {
+                "vitamin_type": "string", # e.g., 'A', 'B', 'C', 'D', 'E', 'K'
+                "amount": "float",
+                "unit": "mg",
+                "daily_value_percentage": "float or null",
+                "group": "vitamins",
+                "category": "micronutrient"
+            }
+        ],
+    },
+    "ingredients": ["string"] or null,
+    "allergens": ["string"] or null
+}
+"""
+
+
+RESPONSE_FORMAT = {
+    "type": "json_object",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "metadata": {
+                "type": "object",
+                "properties": {
+                    "confidence_score": {"type": ["number", "null"]},
+                    "error_status": {"type": ["boolean", "null"]},
+                },
+                "required": ["confidence_score"],
+            },
+            "product_details": {
+                "type": "object",
+                "properties": {
+                    "serving_size": {
+                        "type": "object",
+                        "properties": {
+                            "amount": {"type": ["number", "null"]},
+                            "unit": {"type": "string"},
+                            "type": {"type": ["string", "null"]},
+                        },
+                        "required": ["amount", "unit"],
+                    },
+                },
+                "required": ["serving_size"],
+            },
+            "total_calories": {"type": "integer"},
+            "nutrients": {
+                "type": "object",
+                "properties": {
+                    "total_fat": {
+                        "type": "object",
+                        "properties": {
+                            "amount": {"type": ["number", "null"]},
+                            "unit": {"type": "string"},
+                            "daily_value_percentage": {"type": ["number", "null"]},
+                            "group": {"type": "string"},
+                            "category": {"type": "string"},
+                            "sub_nutrients": {
+                                "type": "object",
+                                "properties": {
+                                    "saturated_fat": {
+                                        "type": "object",
+                                        "properties": {
+                                            "amount": {"type": ["number", "null"]},
+                                            "unit": {"type": "string"},
+                                            "daily_value_percentage": {
+                                                "type": ["number", "null"]
+                                            },
+                                            "group": {"type": "string"},
+                                            "category": {"type": "string"},
+                                        },
+                                    },
+                                    "trans_fat": {
+                                        "type": "object",
+                                        "properties": {
+                                            "amount": {"type": ["number", "null"]},
+                                            "unit": {"type": "string"},
+                                            "daily_value_percentage": {
+                                                "type": ["number", "null"]
+                                            },
+                                            "group": {"type": "string"},
+                                            "category": {"type": "string"},
+                                        },
+                                    },
+                                },
+                            },
+                        },
+                    },
+                    "cholesterol": {
+                        "type": "object",
+                        "properties": {
+                            "amount": {"type": ["number", "null"]},
+                            "unit": {"type": "string"},
+                            "daily_value_percentage": {"type": ["number", "null"]},
+                            "group": {"type": "string"},
+                            "category": {"type": "string"},
+                        },
+                    },
+                    "carbohydrates": {
+                        "type": "object",
+                        "properties": {
+                            "amount": {"type": ["number", "null"]},
+                            "unit": {"type": "string"},
+                            "daily_value_percentage": {"type": ["number", "null"]},
+                            "group": {"type": "string"},
+                            "category": {"type": "string"},
+                            "sub_nutrients": {
+                                "type": "object",
+                                "properties": {
+                                    "dietary_fiber": {
+                                        "type": "object",
+                                        "properties": {
+                                            "amount": {"type": ["number", "null"]},
+                                            "unit": {"type": "string"},
+                                            "daily_value_percentage": {
+                                                "type": ["number", "null"]
+                                            },
+                                            "group": {"type": "string"},
+                                            "category": {"type": "string"},
+                                        },
+                                    },
+                                    "total_sugar": {
+                                        "type": "object",
+                                        "properties": {
+                                            "amount": {"type": ["number", "null"]},
+                                            "unit": {"type": "string"},
+                                            "daily_value_percentage": {
+                                                "type": ["number", "null"]
+                                            },
+                                            "group": {"type": "string"},
+                                            "category": {"type": "string"},
+                                        },
+                                    },
+                                    "added_sugar": {
+                                        "type": "object",
+                                        "properties": {
+                                            "amount": {"type": ["number", "null"]},
+                                            "unit": {"type": "string"},
+                                            "daily_value_percentage": {
+                                                "type": ["number", "null"]
+                                            },
+                                            "group": {"type": "string"},
+                                            "category": {"type": "string"},
+                                        },
+                                    },
+                                },
+                            },
+                        },
+                    },
+                    "protein": {
+                        "type": "object",
+                        "properties": {
+                            "amount": {"type": ["number", "null"]},
+                            "unit": {"type": "string"},
+                            "daily_value_percentage": {"type": ["number", "null"]},
+                            "group": {"type": "string"},
+                            "category": {"type": "string"},
+                        },
+                    },
+                    "sodium": {
+                        "type": "object",
+                        "properties": {
+                            "amount": {"type": ["number", "null"]},
+                            "unit": {"type": "string"},
+                            "daily_value_percentage": {"type": ["number", "null"]},
+                            "group": {"type": "string"},
+                            "category": {"type": "string"},
+                        },
+                    },
+                    "calcium": {
+                        "type": "object",
+                        "properties": {
+                            "amount": {"type": ["number", "null"]},
+                            "unit": {"type": "string"},
+                            "daily_value_percentage": {"type": ["number", "null"]},
+                            "group": {"type": "string"},
+                            "category": {"type": "string"},
+                        },
+                    },
+                    "iron": {
+                        "type": "object",
+                        "properties": {
+                            "amount": {"type": ["number", "null"]},
+                            "unit": {"type": "string"},
+                            "daily_value_percentage": {"type": ["number", "null"]},
+                            "group": {"type": "string"},
+                            "category": {"type": "string"},
+                        },
+                    },
+                    "vitamins": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "vitamin_type": {"type": "string"},
+                                "amount": {"type": "number"},
+                                "unit": {"type": "string"},
+                                "daily_value_percentage": {"type": ["number", "null"]},
+                                "group": {"type": "string"},
+                                "category": {"type": "string"},
+                            },
+                        },
+                    },
+                },
+            },
+            "ingredients": {
+                "type": ["array", "null"],
+                "items": {"type": "string"},
+            },
+            "allergens": {
+                "type": ["array", "null"],
+                "items": {"type": "string"},
+            },
+        },
+        "required": [
+            "metadata",
+            "product_details",
+            "total_calories",
+            "nutrients",
+        ],
+    },
+}
+
+
+PROMPTS = {
+    # The original pretty-printed template plus the full JSON schema
+    "v1": Prompt("v1", NUTRITION_PROMPT, RESPONSE_FORMAT),
+    # Template derived from `NutritionInfo`, compact JSON, no schema
+    "v2": Prompt("v2", build_compact_prompt(), {"type": "json_object"}),
+}
+
+
+def get_prompt(version: Optional[str] = None) -> Prompt:
+    """The requested prompt version, or the configured default."""
+    version = version or settings.PROMPT_VERSION
+    if version not in PROMPTS:
+        raise ValueError(f"Unknown prompt version: {version}")
+    return PROMPTS[version]
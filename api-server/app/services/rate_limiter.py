@@ -0,0 +1,151 @@
+"""
+Per-user rate limits for the analysis endpoints: a token bucket of
+requests per second, and a daily budget of VLM tokens that is charged
+with what each analysis actually billed (cache hits are free).
+"""
+
+import asyncio
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.config.settings import settings
+from app.services.metrics import RATE_LIMITED
+from app.utils.rate_limit import (
+    MemoryRateLimitStore,
+    SQLiteRateLimitStore,
+    day_window,
+)
+from fastapi import HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+_store = None
+# A blocking store gets one thread of its own, off the event loop
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        if settings.RATE_LIMIT_BACKEND == "sqlite":
+            _store = SQLiteRateLimitStore(settings.RATE_LIMIT_SQLITE_PATH)
+        else:
+            _store = MemoryRateLimitStore()
+    return _store
+
+
+async def call_store(method: str, *args):
+    global _executor
+    store = get_store()
+    if not store.blocking:
+        return getattr(store, method)(*args)
+    if _executor is None:
+        _executor = ThreadPoolExecutor(1, thread_name_prefix="rate-limit")
+    return await asyncio.get_running_loop().run_in_executor(
+        _executor, getattr(store, method), *args
+    )
+
+
+async def close_store():
+    global _store, _executor
+    if _store is not None:
+        await call_store("close")
+        _store = None
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+def rate_limit_exception(
+    scope: str, limit: int, remaining: int, reset_at: float, detail: str
+) -> HTTPException:
+    RATE_LIMITED.labels(scope=scope).inc()
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={
+            "Retry-After": str(max(1, math.ceil(reset_at - time.time()))),
+            "X-RateLimit-Scope": scope,
+            "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Remaining": str(remaining),
+            # Epoch seconds, to the millisecond
+            "X-RateLimit-Reset": f"{reset_at:.3f}",
+        },
+    )
+
+
+async def ensure_budget(user_uuid: str):
+    """Raises a 429 once the user has spent today's VLM token budget."""
+    if not settings.RATE_LIMIT_ENABLED or settings.RATE_LIMIT_DAILY_TOKENS is None:
+        return
+    day, reset_at = day_window(time.time())
+    used = await call_store("usage", user_uuid, day)
+    if used >= settings.RATE_LIMIT_DAILY_TOKENS:
+        raise rate_limit_exception(
+            "tokens",
+            settings.RATE_LIMIT_DAILY_TOKENS,
+            0,
+            reset_at,
+            "Daily VLM token budget exhausted",
+        )
+
+
+async def enforce(user_uuid: str, cost: int = 1):
+    """Admits `cost` analysis requests for the user, or raises a 429."""
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    await ensure_budget(user_uuid)
+
+    now = time.time()
+    allowed, remaining, retry_after = await call_store(
+        "take",
+        f"requests:{user_uuid}",
+        cost,
+        settings.RATE_LIMIT_REQUESTS_PER_SECOND,
+        settings.RATE_LIMIT_BURST,
+        now,
+    )
+    if not allowed:
+        raise rate_limit_exception(
+            "requests",
+            settings.RATE_LIMIT_BURST,
+            max(0, math.floor(remaining)),
+            now + retry_after,
+            "Too many analysis requests",
+        )
+
+
+async def charge_tokens(user_uuid: Optional[str], llm_response: Optional[dict]):
+    """Adds the tokens an analysis billed to the user's daily usage."""
+    if not (settings.RATE_LIMIT_ENABLED and user_uuid and llm_response):
+        return
+    tokens = llm_response.get("total_tokens") or 0
+    if not tokens:
+        return
+    try:
+        day, _ = day_window(time.time())
+        await call_store("add_usage", user_uuid, day, tokens)
+    except Exception:
+        # The analysis already succeeded; losing one charge is acceptable
+        logger.exception("[RateLimit] Failed to record token usage")
+
+
+async def get_budget(user_uuid: str) -> dict:
+    """Today's VLM token budget for the user."""
+    day, reset_at = day_window(time.time())
+    used = await call_store("usage", user_uuid, day)
+    limit = settings.RATE_LIMIT_DAILY_TOKENS if settings.RATE_LIMIT_ENABLED else None
+    return {
+        "user_uuid": user_uuid,
+        "day": day,
+        "limit": limit,
+        "used": used,
+        "remaining": None if limit is None else max(0, limit - used),
+        "resets_at": datetime.fromtimestamp(reset_at, timezone.utc),
+        "requests_per_second": settings.RATE_LIMIT_REQUESTS_PER_SECOND,
+        "burst": settings.RATE_LIMIT_BURST,
+    }
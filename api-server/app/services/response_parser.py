@@ -0,0 +1,147 @@
+"""
+Parses VLM output into validated nutrition info. Well-formed JSON takes the
+fast path (orjson plus a validator compiled once at import); common
+malformations are repaired locally instead of paying for a second VLM call.
+"""
+
+import re
+from typing import Any, Dict, Optional, Tuple
+
+import orjson
+from app.models.nutrition_response import NutritionInfo
+from app.services.metrics import VLM_RESPONSE_REPAIRS
+from pydantic import TypeAdapter
+
+nutrition_validator = TypeAdapter(NutritionInfo)
+
+TRAILING_COMMA = re.compile(r",\s*[}\]]")
+# Skips over strings so commas inside them are left alone
+STRING_OR_TRAILING_COMMA = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|,(\s*[}\]])')
+# Strings are matched whole (an unterminated one runs to the end of the
+# text), so only structural characters outside strings are seen
+TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*("|\\?\Z)|[{}\[\],:]')
+CLOSERS = {"{": "}", "[": "]"}
+# Top-level fields every prompt version asks for
+REQUIRED_FIELDS = ("metadata", "product_details", "total_calories", "nutrients")
+
+
+def _strip_trailing_commas(text: str) -> str:
+    if not TRAILING_COMMA.search(text):
+        return text
+    return STRING_OR_TRAILING_COMMA.sub(
+        lambda match: match.group(0) if match.group(1) is None else match.group(1),
+        text,
+    )
+
+
+def _close_truncated(text: str) -> Tuple[str, bool]:
+    """
+    Cuts `text` after its root object. If the output was cut off before
+    the root closed, it is cut back to the last complete member instead
+    and whatever is still open gets closed; the flag is then True. A final
+    value is never kept, as `25` may be what is left of `250`.
+    """
+    # `text` starts at the root "{". The containers open at the last cut
+    # point are always `stack[:cut_depth]`.
+    stack = []
+    cut = cut_depth = 0
+    for match in TOKEN.finditer(text):
+        token = match.group(0)
+        if token[0] == '"':
+            continue
+        if token in CLOSERS:
+            stack.append(token)
+            # An empty container would be read as all defaults, so only
+            # the root is a cut point before its first complete member
+            if len(stack) == 1:
+                cut, cut_depth = match.end(), 1
+        elif token in "}]":
+            stack.pop()
+            if not stack:
+                # Anything after the root object is chatter
+                return text[: match.end()], False
+            cut, cut_depth = match.end(), len(stack)
+        elif stack and token == ",":
+            # Everything before the comma is a complete member
+            cut, cut_depth = match.start(), len(stack)
+
+    closers = "".join(CLOSERS[opener] for opener in reversed(stack[:cut_depth]))
+    return text[:cut] + closers, True
+
+
+def repair_json(text: str) -> Tuple[str, bool]:
+    """
+    Fixes the usual ways model output fails to parse: code fences or
+    chatter around the object, trailing commas and truncated output.
+    Returns the repaired text and whether the output had been cut off.
+    """
+    start = text.find("{")
+    if start == -1:
+        raise ValueError("No JSON object in VLM response")
+    text = _strip_trailing_commas(text[start:]).rstrip()
+
+    # Usually only a fence or chatter follows the object
+    end = text.rfind("}") + 1
+    try:
+        orjson.loads(text[:end])
+        return text[:end], False
+    except orjson.JSONDecodeError:
+        return _close_truncated(text)
+
+
+def _load(text: str) -> Tuple[Dict[str, Any], bool, bool]:
+    """Returns the response object and whether it was repaired, cut off."""
+    try:
+        data, repaired, truncated = orjson.loads(text), False, False
+    except orjson.JSONDecodeError:
+        repaired_text, truncated = repair_json(text)
+        data, repaired = orjson.loads(repaired_text), True
+
+    if not isinstance(data, dict):
+        raise ValueError("VLM response is not a JSON object")
+    return data, repaired, truncated
+
+
+def parse_nutrition(text: str, allow_truncated: bool = False) -> Dict[str, Any]:
+    """
+    Parses and validates a VLM response. Raises `ValueError` if unusable,
+    which includes output that was cut off unless `allow_truncated` (the
+    fields that were cut off would read as zero).
+    """
+    data, repaired, truncated = _load(text)
+    if repaired:
+        VLM_RESPONSE_REPAIRS.inc()
+    if truncated and not allow_truncated:
+        raise ValueError("VLM response was cut off")
+    # Every field has a default, so without this `{}` (or output cut off
+    # early) would pass as an all-zero analysis
+    missing = [field for field in REQUIRED_FIELDS if field not in data]
+    if missing:
+        raise ValueError(f"VLM response is missing {', '.join(missing)}")
+    return nutrition_validator.validate_python(data).model_dump()
+
+
+def escalation_reason(text: str, min_confidence: float) -> Optional[str]:
+    """
+    Why a response is worth asking a stronger model for: it is unusable,
+    was cut off, lacks a required field, or the model's own confidence is
+    below `min_confidence`. None when it can be served as is.
+    """
+    try:
+        data, _, truncated = _load(text)
+        info = nutrition_validator.validate_python(data)
+    except ValueError:
+        return "invalid"
+    # Whatever confidence it claims, the rest of the answer is missing
+    if truncated:
+        return "truncated"
+    if any(field not in data for field in REQUIRED_FIELDS):
+        return "missing_fields"
+
+    confidence = info.metadata.confidence_score
+    # Some models answer in percent
+    if confidence is not None and confidence > 1:
+        confidence /= 100
+    if confidence is None or confidence < min_confidence:
+        return "low_confidence"
+    return None
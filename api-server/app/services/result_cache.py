@@ -0,0 +1,78 @@
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from app.config.settings import settings
+from app.database.dependencies import get_image_analysis_repository
+from app.database.image_analysis_repository import ImageAnalysisRepository
+from app.services.metrics import CACHE_LOOKUPS
+from app.utils.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def build_cache_key(digest: str, model: str, prompt_version: str) -> str:
+    return f"{digest}:{model}:{prompt_version}"
+
+
+class ResultCache:
+    """
+    Two tier cache for VLM results. The memory tier is an LRU, the persistent
+    tier is the completed records in `nutrition_analysis`, looked up by the
+    `cache_key` stored alongside each analysis.
+    """
+
+    def __init__(self):
+        self.memory = LRUCache(
+            settings.RESULT_CACHE_MAX_ENTRIES, settings.RESULT_CACHE_TTL_SECONDS
+        )
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def repo(self) -> ImageAnalysisRepository:
+        return get_image_analysis_repository()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        result = self.memory.get(key)
+        if result is not None:
+            self.hits += 1
+            CACHE_LOOKUPS.labels(tier="memory").inc()
+            return {**result, "cache_tier": "memory"}
+
+        since = datetime.now() - timedelta(seconds=settings.RESULT_CACHE_TTL_SECONDS)
+        try:
+            record = await self.repo.find_cached_result(key, since)
+        except Exception:
+            # The persistent tier is an optimisation; fall through to the VLM
+            logger.warning("[ResultCache] Mongo lookup failed", exc_info=True)
+            record = None
+        if record is not None:
+            result = {
+                "response": json.dumps(record["nutrition_info"]),
+                "completion_time": record.get("vlm_response_time", 0),
+            }
+            self.memory.set(key, result)
+            self.hits += 1
+            CACHE_LOOKUPS.labels(tier="mongo").inc()
+            return {**result, "cache_tier": "mongo"}
+
+        self.misses += 1
+        CACHE_LOOKUPS.labels(tier="miss").inc()
+        return None
+
+    def set(self, key: str, result: Dict[str, Any]):
+        self.memory.set(
+            key,
+            {
+                "response": result["response"],
+                "completion_time": result["completion_time"],
+            },
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.memory)}
+
+
+result_cache = ResultCache()
@@ -0,0 +1,133 @@
+"""
+Per-user daily nutrient rollups, maintained incrementally on every write.
+
+Rebuild them from `nutrition_analysis` with:
+
+    python -m app.services.rollup_service --backfill [--user USER_UUID]
+
+The rebuild only holds back the increments of the process running it. Run
+from the CLI, stop ingestion in the API workers first: increments they make
+meanwhile land in the rollups being replaced and are lost or counted twice.
+"""
+
+import argparse
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from app.database.dependencies import (
+    get_image_analysis_repository,
+    get_rollup_repository,
+)
+from app.database.rollup_repository import ROLLUP_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Passes over the days written to during a rebuild before giving up on
+# recomputing them and applying what is left as plain increments
+RECOMPUTE_ROUNDS = 3
+
+# Records whose increments are held back while a rebuild runs
+_held: Optional[List[Dict[str, Any]]] = None
+
+
+async def _increment(records: List[Dict[str, Any]]):
+    # Rollups are derived data and can be rebuilt, so a failure here must
+    # never fail the analysis that was already persisted.
+    try:
+        await get_rollup_repository().increment_many(records)
+    except Exception:
+        logger.exception("[Rollups] Failed to update daily rollups")
+
+
+async def record_analyses(records: List[Dict[str, Any]]):
+    if _held is not None:
+        _held.extend(records)
+        return
+    await _increment(records)
+
+
+def _days(records: List[Dict[str, Any]]):
+    return {
+        (record["user_uuid"], record["created_at"].date().isoformat())
+        for record in records
+    }
+
+
+async def backfill(user_uuid: Optional[str] = None):
+    """
+    Rebuilds the rollups from `nutrition_analysis`. Increments made meanwhile
+    could be lost with the replaced rollups or counted twice, so they are held
+    back and the days they touch recomputed once the rebuild is in place.
+    """
+    global _held
+    if _held is not None:
+        raise RuntimeError("A rollup rebuild is already running")
+
+    rollup_repo = get_rollup_repository()
+    source = get_image_analysis_repository().collection
+    _held = []
+    try:
+        await rollup_repo.rebuild_from(source, user_uuid)
+        for _ in range(RECOMPUTE_ROUNDS):
+            held, _held = _held, []
+            if not held:
+                break
+            await rollup_repo.recompute_days(source, _days(held))
+    finally:
+        # Either the rebuild failed and the old rollups are still in place,
+        # or these arrived during the last recompute
+        held, _held = _held, None
+        if held:
+            await _increment(held)
+
+
+def _empty_totals():
+    return {field: 0.0 for field in ROLLUP_FIELDS}
+
+
+def _period(day: str, group_by: str) -> str:
+    if group_by == "week":
+        year, week, _ = date.fromisoformat(day).isocalendar()
+        return f"{year}-W{week:02d}"
+    return day
+
+
+async def get_stats(user_uuid: str, start: date, end: date, group_by: str = "day"):
+    """Totals per day (or ISO week), broken down by meal type."""
+    periods: Dict[str, Dict[str, Any]] = {}
+    async for rollup in get_rollup_repository().find_range(user_uuid, start, end):
+        key = _period(rollup["day"], group_by)
+        period = periods.setdefault(
+            key,
+            {
+                "period": key,
+                "count": 0,
+                "totals": _empty_totals(),
+                "by_meal_type": defaultdict(_empty_totals),
+            },
+        )
+        period["count"] += rollup.get("count", 0)
+        for field in ROLLUP_FIELDS:
+            value = rollup.get("totals", {}).get(field, 0)
+            period["totals"][field] += value
+            period["by_meal_type"][rollup["meal_type"]][field] += value
+
+    return list(periods.values())
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backfill", action="store_true")
+    parser.add_argument("--user", default=None)
+    args = parser.parse_args()
+
+    if args.backfill:
+        await backfill(args.user)
+        print("Rollups rebuilt")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+import logging
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from app.config.settings import settings
+from app.database.dependencies import get_image_analysis_repository
+from app.services.image_service import PHASH_BITS
+from app.utils.hamming_index import HammingIndex
+
+logger = logging.getLogger(__name__)
+
+
+class SimilarImageIndex:
+    """
+    In-memory perceptual hash index of analyzed images. Values are the
+    result cache keys of the prior analyses, so a near-duplicate match is
+    resolved through the normal result cache tiers. A match must also have
+    the same original dimensions, as a re-upload of the same photo would.
+    """
+
+    def __init__(self):
+        # Chunks wider than the distance, so lookups probe exact buckets
+        self.index = HammingIndex(
+            settings.PHASH_MAX_DISTANCE, chunks=24, bits=PHASH_BITS
+        )
+        # The same image is remembered on every analysis; index it once
+        self._indexed: Set[Tuple[str, str]] = set()
+        self._sizes: Dict[str, Tuple[int, ...]] = {}
+
+    async def load(self):
+        repo = get_image_analysis_repository()
+        count = 0
+        async for record in repo.iter_phashes():
+            size = (record.get("image_preprocessing") or {}).get("original_size")
+            if size and self.add(record["phash"], record["cache_key"], size):
+                count += 1
+        logger.info(f"[SimilarImageIndex] Loaded {count} perceptual hashes")
+
+    def add(self, phash: str, cache_key: str, size: Sequence[int]) -> bool:
+        # Hashes from an older, narrower scheme are not comparable
+        if len(phash) != PHASH_BITS // 4 or (phash, cache_key) in self._indexed:
+            return False
+        self._indexed.add((phash, cache_key))
+        self._sizes[cache_key] = tuple(size)
+        self.index.add(int(phash, 16), cache_key)
+        return True
+
+    def find(self, phash: str, size: Sequence[int]) -> Optional[Tuple[int, str]]:
+        """Returns `(distance, cache_key)` of the closest prior analysis."""
+        if len(phash) != PHASH_BITS // 4:
+            return None
+        matches: List[Tuple[int, str]] = self.index.search(
+            int(phash, 16), settings.PHASH_MAX_DISTANCE
+        )
+        for distance, cache_key in matches:
+            if self._sizes.get(cache_key) == tuple(size):
+                return distance, cache_key
+        return None
+
+
+similar_image_index = SimilarImageIndex()
@@ -0,0 +1,247 @@
+"""
+Resilience policy for calls to the VLM provider: adaptive admission
+control, a deadline per attempt, retries with jittered backoff on rate
+limits, 5xx responses and timeouts (honouring Retry-After), optional
+hedging once the recent p95 latency is known, and a circuit breaker that
+fails fast while the provider is down.
+"""
+
+import asyncio
+import email.utils
+import logging
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import groq
+from app.config.settings import settings
+from app.services.metrics import (
+    VLM_CIRCUIT_TRANSITIONS,
+    VLM_CONCURRENCY_LIMIT,
+    VLM_HEDGES,
+    VLM_IN_FLIGHT,
+    VLM_QUEUE_DEPTH,
+    VLM_RETRIES,
+    VLM_SHED,
+)
+from app.utils.adaptive_limiter import AdaptiveLimiter, LimitExceeded
+from app.utils.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyWindow,
+    backoff_delay,
+    hedged,
+)
+
+logger = logging.getLogger(__name__)
+
+# Admission priorities, lower first: someone is waiting on an interactive
+# scan, batch items and background jobs can wait longer
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BATCH: "batch"}
+
+
+class ProviderUnavailableError(Exception):
+    """
+    The provider is failing or the circuit is open. `fallback` may carry
+    the closest prior analysis to serve in degraded mode.
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.fallback: Optional[dict] = None
+
+
+class OverloadedError(ProviderUnavailableError):
+    """Shed by admission control before reaching the provider."""
+
+
+def _on_circuit_change(state: str):
+    logger.warning(f"[VLM] Circuit breaker {state}")
+    VLM_CIRCUIT_TRANSITIONS.labels(state=state).inc()
+
+
+vlm_breaker = CircuitBreaker(
+    settings.VLM_CIRCUIT_FAILURE_THRESHOLD,
+    settings.VLM_CIRCUIT_RESET_SECONDS,
+    _on_circuit_change,
+)
+# Successful attempt latencies per model, used to derive the hedging delay
+vlm_latency: Dict[str, LatencyWindow] = defaultdict(LatencyWindow)
+
+
+def _on_limiter_change(limiter: AdaptiveLimiter):
+    VLM_CONCURRENCY_LIMIT.set(limiter.limit)
+    VLM_IN_FLIGHT.set(limiter.in_flight)
+    VLM_QUEUE_DEPTH.set(limiter.queue_depth)
+
+
+vlm_limiter = AdaptiveLimiter(
+    settings.VLM_LIMIT_INITIAL,
+    settings.VLM_LIMIT_MIN,
+    settings.VLM_LIMIT_MAX,
+    settings.VLM_QUEUE_MAX,
+    settings.VLM_LIMIT_BACKOFF,
+    _on_limiter_change,
+)
+_on_limiter_change(vlm_limiter)
+
+
+@asynccontextmanager
+async def admission(priority: int = PRIORITY_INTERACTIVE):
+    """Holds a VLM concurrency slot, or raises `OverloadedError`."""
+    timeout = (
+        settings.VLM_QUEUE_TIMEOUT
+        if priority == PRIORITY_INTERACTIVE
+        else settings.VLM_BATCH_QUEUE_TIMEOUT
+    )
+    try:
+        await vlm_limiter.acquire(priority, timeout)
+    except LimitExceeded as e:
+        VLM_SHED.labels(reason=e.reason, priority=PRIORITY_NAMES[priority]).inc()
+        raise OverloadedError("VLM stage overloaded", e.retry_after) from e
+    try:
+        yield
+    finally:
+        vlm_limiter.release()
+
+
+def failure_reason(error: BaseException) -> Optional[str]:
+    """Why a failed attempt is worth retrying, or None if it is not."""
+    if isinstance(error, (asyncio.TimeoutError, groq.APITimeoutError)):
+        return "timeout"
+    if isinstance(error, groq.APIConnectionError):
+        return "connection"
+    if isinstance(error, groq.APIStatusError):
+        if error.status_code == 429:
+            return "rate_limited"
+        if error.status_code >= 500:
+            return "server_error"
+    return None
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def hedge_delay(model: str) -> Optional[float]:
+    latency = vlm_latency[model]
+    if not settings.VLM_HEDGE_ENABLED or len(latency) < settings.VLM_HEDGE_MIN_SAMPLES:
+        return None
+    return max(
+        settings.VLM_HEDGE_MIN_DELAY,
+        latency.percentile(settings.VLM_HEDGE_PERCENTILE),
+    )
+
+
+async def guarded_attempt(
+    call: Callable[[], Awaitable[Any]], model: str, timeout: float
+):
+    """One provider request under the circuit breaker and attempt deadline."""
+    vlm_breaker.before_call()
+    start = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(call(), timeout)
+    except Exception as e:
+        reason = failure_reason(e)
+        if reason is not None:
+            vlm_limiter.record_congestion()
+        # Rate limits and client errors mean the provider is up
+        if reason in (None, "rate_limited"):
+            vlm_breaker.record_success()
+        else:
+            vlm_breaker.record_failure()
+        raise
+    latency = time.perf_counter() - start
+    vlm_breaker.record_success()
+    vlm_latency[model].add(latency)
+    if latency > settings.VLM_LIMIT_SLOW_CALL_SECONDS:
+        vlm_limiter.record_congestion()
+    else:
+        vlm_limiter.record_success(latency)
+    return result
+
+
+async def hedge_attempt(call: Callable[[], Awaitable[Any]], model: str, timeout: float):
+    """
+    A hedge is one more request upstream, so it takes a concurrency slot
+    of its own. It is not sent when no slot is free right away, since
+    hedging a saturated provider only adds to its load.
+    """
+    if not vlm_limiter.try_acquire():
+        VLM_HEDGES.labels(outcome="skipped").inc()
+        raise LimitExceeded("hedge", 0.0)
+    VLM_HEDGES.labels(outcome="sent").inc()
+    try:
+        return await guarded_attempt(call, model, timeout)
+    finally:
+        vlm_limiter.release()
+
+
+async def call_with_resilience(
+    call: Callable[[], Awaitable[Any]],
+    model: str,
+    hedge=True,
+    timeout: Optional[float] = None,
+):
+    """
+    Runs `call` (a single provider request to `model`) under the resilience
+    policy. Errors that retrying cannot fix are raised unchanged; a
+    degraded provider surfaces as `ProviderUnavailableError`.
+    """
+    timeout = timeout or settings.VLM_ATTEMPT_TIMEOUT
+    for attempt in range(settings.VLM_MAX_ATTEMPTS):
+        try:
+            result, hedge_won = await hedged(
+                lambda: guarded_attempt(call, model, timeout),
+                hedge_delay(model) if hedge else None,
+                hedge_call=lambda: hedge_attempt(call, model, timeout),
+            )
+            if hedge_won:
+                VLM_HEDGES.labels(outcome="won").inc()
+            return result
+        except CircuitOpenError as e:
+            raise ProviderUnavailableError(
+                "VLM provider circuit is open", e.retry_after
+            ) from e
+        except Exception as e:
+            reason = failure_reason(e)
+            if reason is None:
+                raise
+            retry_after = retry_after_seconds(e)
+            delay = max(
+                backoff_delay(
+                    attempt, settings.VLM_RETRY_BACKOFF, settings.VLM_RETRY_MAX_DELAY
+                ),
+                retry_after or 0,
+            )
+            if (
+                attempt == settings.VLM_MAX_ATTEMPTS - 1
+                or delay > settings.VLM_RETRY_MAX_DELAY
+            ):
+                raise ProviderUnavailableError(
+                    f"VLM provider unavailable after {attempt + 1} attempts: {reason}",
+                    retry_after or settings.VLM_RETRY_MAX_DELAY,
+                ) from e
+
+            VLM_RETRIES.labels(reason=reason).inc()
+            logger.warning(
+                f"[VLM] Attempt {attempt + 1} failed ({reason}), "
+                f"retrying in {delay:.2f}s"
+            )
+            await asyncio.sleep(delay)
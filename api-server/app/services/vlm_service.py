@@ -1,403 +1,482 @@
 import os
 import asyncio
-from groq import Groq
+import logging
+import time
+from typing import Optional
+from groq import AsyncGroq
 from dotenv import load_dotenv
+from app.config.settings import settings
+from app.services import image_service
+from app.services.metrics import (
+    CACHE_LOOKUPS,
+    VLM_LATENCY,
+    VLM_ROUTED,
+    VLM_ROUTING_ESCALATION_SECONDS,
+    VLM_ROUTING_ESCALATION_TOKENS,
+    VLM_ROUTING_SAVED_SECONDS,
+    VLM_TOKENS,
+    record_error,
+)
+from app.services.http_client import (
+    build_timeout,
+    close_http_client,
+    get_http_client,
+)
+from app.services.prompt_builder import Prompt, get_prompt
+from app.services.response_parser import escalation_reason, parse_nutrition
+from app.services.result_cache import build_cache_key, result_cache
+from app.services.similarity_index import similar_image_index
+from app.services.vlm_resilience import (
+    PRIORITY_INTERACTIVE,
+    ProviderUnavailableError,
+    admission,
+    call_with_resilience,
+    failure_reason,
+    vlm_breaker,
+    vlm_latency,
+)
+from app.utils.single_flight import SingleFlight
+from app.utils.tracing import span
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 MODEL = os.getenv("MODEL", "llama-3.2-11b-vision-preview")
 API_KEY = os.getenv(
     "API_KEY", "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"
 )
 
-groq = Groq(api_key=API_KEY)
-
-
-async def get_nutrition_info(image_url: str):
-    chat_completion = await asyncio.to_thread(
-        groq.chat.completions.create,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": """
-Extract comprehensive nutritional information from the food label image. Structure the output in JSON format, including fields even if values are missing (use 0 or null). Ensure all units are standardized (g, mg, mcg, %DV) and include daily value percentages where available. Handle abbreviations appropriately (e.g., 'sat.' → 'saturated', 'cholest.' → 'cholesterol'). If any field is missing from the label, use 0 for numerical values and empty strings/null for text fields. Add your confidence score precisely upto 2 floating points to the metadata field. Please include the health insights from your side if possible.
-
-Response Structure:
-{
-    "metadata": {
-        "confidence_score": "float or null",
-        "error_status": "boolean or null"
-    },
-    "product_details": {
-        "serving_size": {
-            "amount": "float or null",
-            "unit": "string"
-            "type": "string or null", # e.g., 'calories', 'serving', 'container'
-        }
-    },
-    "total_calories": "integer",
-    "nutrients": {
-        "total_fat": {
-            "amount": "float or null",
-            "unit": "g",
-            "daily_value_percentage": "float or null",
-            "group": "fats",
-            "category": "macronutrient",
-            "sub_nutrients": {
-                "saturated_fat": {
-                    "amount": "float or null",
-                    "unit": "g",
-                    "daily_value_percentage": "float or null",
-                    "group": "fats",
-                    "category": "macronutrient"
-                },
-                "trans_fat": {
-                    "amount": "float or null",
-                    "unit": "g",
-                    "daily_value_percentage": "float or null",
-                    "group": "fats",
-                    "category": "macronutrient"
-                }
-            }
-        },
-        "cholesterol": {
-            "amount": "float or null",
-            "unit": "mg",
-            "daily_value_percentage": "float or null",
-            "group": "fats",
-            "category": "macronutrient"
-        },
-        "carbohydrates": {
-            "amount": "float or null",
-            "unit": "g",
-            "daily_value_percentage": "float or null",
-            "group": "carbohydrates",
-            "category": "macronutrient",
-            "sub_nutrients": {
-                "dietary_fiber": {
-                    "amount": "float or null",
-                    "unit": "g",
-                    "daily_value_percentage": "float or null",
-                    "group": "carbohydrates",
-                    "category": "macronutrient"
-                },
-                "total_sugar": {
-                    "amount": "float or null",
-                    "unit": "g",
-                    "daily_value_percentage": "float or null",
-                    "group": "carbohydrates",
-                    "category": "macronutrient"
-                },
-                "added_sugar": {
-                    "amount": "float or null",
-                    "unit": "g",
-                    "daily_value_percentage": "float or null",
-                    "group": "carbohydrates",
-                    "category": "macronutrient"
-                }
+_groq: Optional[AsyncGroq] = None
+
+
+def get_groq() -> AsyncGroq:
+    global _groq
+    if _groq is None:
+        # Retries are handled by app.services.vlm_resilience
+        _groq = AsyncGroq(
+            api_key=API_KEY,
+            base_url=settings.LLM_BASE_URL,
+            http_client=get_http_client(),
+            timeout=build_timeout(),
+            max_retries=0,
+        )
+    return _groq
+
+
+def result_model() -> str:
+    """What produces the results, as far as the result cache is concerned."""
+    if settings.VLM_ROUTING_ENABLED:
+        return f"{settings.VLM_FAST_MODEL}>{settings.VLM_STRONG_MODEL}"
+    return MODEL
+
+
+def reset_groq():
+    # The pooled http client is owned by app.services.http_client
+    global _groq
+    _groq = None
+
+
+# Concurrent requests for the same image share a single upstream VLM call
+vlm_flights = SingleFlight()
+
+
+async def load_image(image_url: str, prompt_version: str, model: Optional[str] = None):
+    """
+    Fetches the image once and returns `(image_bytes, cache_key)`. The key
+    is for results of `model`, the routed models by default.
+    """
+    if not (settings.RESULT_CACHE_ENABLED or settings.IMAGE_PREPROCESS_ENABLED):
+        return None, None
+
+    try:
+        with span("image.fetch") as fetch_span:
+            image_bytes = await image_service.fetch_image_bytes(image_url)
+            if fetch_span is not None:
+                fetch_span.set_attribute("bytes", len(image_bytes))
+    except Exception as e:
+        logger.warning(f"[VLM] Could not fetch image, passing the URL through: {e}")
+        return None, None
+
+    cache_key = None
+    if settings.RESULT_CACHE_ENABLED:
+        cache_key = build_cache_key(
+            image_service.image_digest(image_bytes),
+            model or result_model(),
+            prompt_version,
+        )
+    return image_bytes, cache_key
+
+
+async def prepare_vlm_image(image_url: str, image_bytes: Optional[bytes]):
+    """Returns the image reference sent to the VLM and preprocessing stats."""
+    if image_bytes is None or not settings.IMAGE_PREPROCESS_ENABLED:
+        return image_url, None
+
+    try:
+        with span("image.preprocess"):
+            return await image_service.preprocess_image(image_bytes)
+    except Exception as e:
+        logger.warning(
+            f"[VLM] Image preprocessing failed, passing the URL through: {e}"
+        )
+        return image_url, None
+
+
+def cached_result(cache_key: str, cached: dict):
+    return {
+        "response": cached["response"],
+        "completion_time": cached["completion_time"],
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "cache_key": cache_key,
+        "cache": {"hit": True, "tier": cached["cache_tier"], **result_cache.stats()},
+    }
+
+
+def with_cache_info(result: dict, cache_key: Optional[str]):
+    if cache_key is None or "cache" in result:
+        return result
+    return {
+        **result,
+        "cache_key": cache_key,
+        "cache": {"hit": False, "tier": None, **result_cache.stats()},
+    }
+
+
+async def find_similar_result(
+    cache_key: Optional[str],
+    image_stats: Optional[dict],
+    allow_similar: bool,
+    remember: bool = True,
+):
+    """Reuses a prior analysis of a perceptually near-identical image."""
+    if not (allow_similar and settings.PHASH_ENABLED and cache_key and image_stats):
+        return None
+
+    match = similar_image_index.find(image_stats["phash"], image_stats["original_size"])
+    if match is None:
+        return None
+
+    distance, similar_key = match
+    cached = await result_cache.get(similar_key)
+    if cached is None:
+        return None
+    CACHE_LOOKUPS.labels(tier="similar").inc()
+
+    # Remember the new bytes too, so the next exact repeat is a plain hit
+    if remember:
+        result_cache.set(cache_key, cached)
+    result = cached_result(cache_key, {**cached, "cache_tier": "similar"})
+    result["cache"]["similar_distance"] = distance
+    return {**result, "image": image_stats}
+
+
+async def degraded_result(cache_key: Optional[str], image_stats: Optional[dict]):
+    """
+    The closest prior analysis, offered while the provider is unavailable
+    even if the caller opted out of near-duplicate reuse. Not cached.
+    """
+    try:
+        return await find_similar_result(cache_key, image_stats, True, remember=False)
+    except Exception:
+        return None
+
+
+def remember_result(cache_key: Optional[str], image_stats: Optional[dict], result):
+    if cache_key is None:
+        return
+    # An unusable response would otherwise be served for the whole TTL
+    try:
+        parse_nutrition(result["response"])
+    except ValueError:
+        return
+    result_cache.set(cache_key, result)
+    if settings.PHASH_ENABLED and image_stats:
+        similar_image_index.add(
+            image_stats["phash"], cache_key, image_stats["original_size"]
+        )
+
+
+async def get_nutrition_info(
+    image_url: str,
+    allow_similar: bool = True,
+    priority: int = PRIORITY_INTERACTIVE,
+    prompt_version: Optional[str] = None,
+):
+    prompt = get_prompt(prompt_version)
+    image_bytes, cache_key = await load_image(image_url, prompt.version)
+    if cache_key is not None:
+        with span("cache.lookup"):
+            cached = await result_cache.get(cache_key)
+        if cached is not None:
+            return {
+                **cached_result(cache_key, cached),
+                "prompt_version": prompt.version,
             }
-        },
-        "protein": {
-            "amount": "float or null",
-            "unit": "g",
-            "daily_value_percentage": "float or null",
-            "group": "protein",
-            "category": "macronutrient"
-        },
-        "sodium": {
-            "amount": "float or null",
-            "unit": "mg",
-            "daily_value_percentage": "float or null",
-            "group": "mineral",
-            "category": "micronutrient"
-        },
-        "calcium": {
-            "amount": "float or null",
-            "unit": "mg",
-            "daily_value_percentage": "float or null",
-            "group": "mineral",
-            "category": "micronutrient"
-        },
-        "iron": {
-            "amount": "float or null",
-            "unit": "mg",
-            "daily_value_percentage": "float or null",
-            "group": "mineral",
-            "category": "micronutrient"
-        },
-        "vitamins": [
-            {
-                "vitamin_type": "string", # e.g., 'A', 'B', 'C', 'D', 'E', 'K'
-                "amount": "float",
-                "unit": "mg",
-                "daily_value_percentage": "float or null",
-                "group": "vitamins",
-                "category": "micronutrient"
+
+    async def analyze():
+        image_source, image_stats = await prepare_vlm_image(image_url, image_bytes)
+        similar = await find_similar_result(cache_key, image_stats, allow_similar)
+        if similar is not None:
+            return similar
+
+        try:
+            result = await call_vlm(image_source, prompt, priority)
+        except ProviderUnavailableError as e:
+            e.fallback = await degraded_result(cache_key, image_stats)
+            raise
+        remember_result(cache_key, image_stats, result)
+        return {**result, "image": image_stats}
+
+    result = await call_vlm_coalesced(
+        f"{cache_key or image_url}:{prompt.version}:{allow_similar}", analyze
+    )
+    return {**with_cache_info(result, cache_key), "prompt_version": prompt.version}
+
+
+async def stream_nutrition_info(
+    image_url: str, allow_similar: bool = True, prompt_version: Optional[str] = None
+):
+    """
+    Streaming variant of `get_nutrition_info`. Yields `("delta", text)` as
+    tokens arrive and finishes with `("result", dict)` shaped like the
+    non-streaming result.
+    """
+    prompt = get_prompt(prompt_version)
+    # Streams are never routed, so they have cache entries of their own
+    image_bytes, cache_key = await load_image(image_url, prompt.version, MODEL)
+    if cache_key is not None:
+        with span("cache.lookup"):
+            cached = await result_cache.get(cache_key)
+        if cached is not None:
+            yield "delta", cached["response"]
+            yield "result", {
+                **cached_result(cache_key, cached),
+                "prompt_version": prompt.version,
             }
-        ],
-    },
-    "ingredients": ["string"] or null,
-    "allergens": ["string"] or null
-}
-""",
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": image_url,
-                        },
-                    },
-                ],
-            },
-        ],
-        model=MODEL,
-        temperature=0.2,
-        stream=False,
-        response_format={
-            "type": "json_object",
-            "schema": {
-                "type": "object",
-                "properties": {
-                    "metadata": {
-                        "type": "object",
-                        "properties": {
-                            "confidence_score": {"type": ["number", "null"]},
-                            "error_status": {"type": ["boolean", "null"]},
-                        },
-                        "required": ["confidence_score"],
-                    },
-                    "product_details": {
-                        "type": "object",
-                        "properties": {
-                            "serving_size": {
-                                "type": "object",
-                                "properties": {
-                                    "amount": {"type": ["number", "null"]},
-                                    "unit": {"type": "string"},
-                                    "type": {"type": ["string", "null"]},
-                                },
-                                "required": ["amount", "unit"],
-                            },
-                        },
-                        "required": ["serving_size"],
-                    },
-                    "total_calories": {"type": "integer"},
-                    "nutrients": {
-                        "type": "object",
-                        "properties": {
-                            "total_fat": {
-                                "type": "object",
-                                "properties": {
-                                    "amount": {"type": ["number", "null"]},
-                                    "unit": {"type": "string"},
-                                    "daily_value_percentage": {
-                                        "type": ["number", "null"]
-                                    },
-                                    "group": {"type": "string"},
-                                    "category": {"type": "string"},
-                                    "sub_nutrients": {
-                                        "type": "object",
-                                        "properties": {
-                                            "saturated_fat": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "amount": {
-                                                        "type": ["number", "null"]
-                                                    },
-                                                    "unit": {"type": "string"},
-                                                    "daily_value_percentage": {
-                                                        "type": ["number", "null"]
-                                                    },
-                                                    "group": {"type": "string"},
-                                                    "category": {"type": "string"},
-                                                },
-                                            },
-                                            "trans_fat": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "amount": {
-                                                        "type": ["number", "null"]
-                                                    },
-                                                    "unit": {"type": "string"},
-                                                    "daily_value_percentage": {
-                                                        "type": ["number", "null"]
-                                                    },
-                                                    "group": {"type": "string"},
-                                                    "category": {"type": "string"},
-                                                },
-                                            },
-                                        },
-                                    },
-                                },
-                            },
-                            "cholesterol": {
-                                "type": "object",
-                                "properties": {
-                                    "amount": {"type": ["number", "null"]},
-                                    "unit": {"type": "string"},
-                                    "daily_value_percentage": {
-                                        "type": ["number", "null"]
-                                    },
-                                    "group": {"type": "string"},
-                                    "category": {"type": "string"},
-                                },
-                            },
-                            "carbohydrates": {
-                                "type": "object",
-                                "properties": {
-                                    "amount": {"type": ["number", "null"]},
-                                    "unit": {"type": "string"},
-                                    "daily_value_percentage": {
-                                        "type": ["number", "null"]
-                                    },
-                                    "group": {"type": "string"},
-                                    "category": {"type": "string"},
-                                    "sub_nutrients": {
-                                        "type": "object",
-                                        "properties": {
-                                            "dietary_fiber": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "amount": {
-                                                        "type": ["number", "null"]
-                                                    },
-                                                    "unit": {"type": "string"},
-                                                    "daily_value_percentage": {
-                                                        "type": ["number", "null"]
-                                                    },
-                                                    "group": {"type": "string"},
-                                                    "category": {"type": "string"},
-                                                },
-                                            },
-                                            "total_sugar": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "amount": {
-                                                        "type": ["number", "null"]
-                                                    },
-                                                    "unit": {"type": "string"},
-                                                    "daily_value_percentage": {
-                                                        "type": ["number", "null"]
-                                                    },
-                                                    "group": {"type": "string"},
-                                                    "category": {"type": "string"},
-                                                },
-                                            },
-                                            "added_sugar": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "amount": {
-                                                        "type": ["number", "null"]
-                                                    },
-                                                    "unit": {"type": "string"},
-                                                    "daily_value_percentage": {
-                                                        "type": ["number", "null"]
-                                                    },
-                                                    "group": {"type": "string"},
-                                                    "category": {"type": "string"},
-                                                },
-                                            },
-                                        },
-                                    },
-                                },
-                            },
-                            "protein": {
-                                "type": "object",
-                                "properties": {
-                                    "amount": {"type": ["number", "null"]},
-                                    "unit": {"type": "string"},
-                                    "daily_value_percentage": {
-                                        "type": ["number", "null"]
-                                    },
-                                    "group": {"type": "string"},
-                                    "category": {"type": "string"},
-                                },
-                            },
-                            "sodium": {
-                                "type": "object",
-                                "properties": {
-                                    "amount": {"type": ["number", "null"]},
-                                    "unit": {"type": "string"},
-                                    "daily_value_percentage": {
-                                        "type": ["number", "null"]
-                                    },
-                                    "group": {"type": "string"},
-                                    "category": {"type": "string"},
-                                },
-                            },
-                            "calcium": {
-                                "type": "object",
-                                "properties": {
-                                    "amount": {"type": ["number", "null"]},
-                                    "unit": {"type": "string"},
-                                    "daily_value_percentage": {
-                                        "type": ["number", "null"]
-                                    },
-                                    "group": {"type": "string"},
-                                    "category": {"type": "string"},
-                                },
-                            },
-                            "iron": {
-                                "type": "object",
-                                "properties": {
-                                    "amount": {"type": ["number", "null"]},
-                                    "unit": {"type": "string"},
-                                    "daily_value_percentage": {
-                                        "type": ["number", "null"]
-                                    },
-                                    "group": {"type": "string"},
-                                    "category": {"type": "string"},
-                                },
-                            },
-                            "vitamins": {
-                                "type": "array",
-                                "items": {
-                                    "type": "object",
-                                    "properties": {
-                                        "vitamin_type": {"type": "string"},
-                                        "amount": {"type": "number"},
-                                        "unit": {"type": "string"},
-                                        "daily_value_percentage": {
-                                            "type": ["number", "null"]
-                                        },
-                                        "group": {"type": "string"},
-                                        "category": {"type": "string"},
-                                    },
-                                },
-                            },
-                        },
-                    },
-                    "ingredients": {
-                        "type": ["array", "null"],
-                        "items": {"type": "string"},
-                    },
-                    "allergens": {
-                        "type": ["array", "null"],
-                        "items": {"type": "string"},
-                    },
-                },
-                "required": [
-                    "metadata",
-                    "product_details",
-                    "total_calories",
-                    "nutrients",
-                ],
-            },
-        },
+            return
+
+    image_source, image_stats = await prepare_vlm_image(image_url, image_bytes)
+    similar = await find_similar_result(cache_key, image_stats, allow_similar)
+    if similar is not None:
+        yield "delta", similar["response"]
+        yield "result", {**similar, "prompt_version": prompt.version}
+        return
+
+    async def open_stream():
+        # An attempt lasts until the first chunk, so a provider that accepts
+        # the request but never starts answering is retried too
+        stream = await get_groq().chat.completions.create(
+            messages=prompt.messages(image_source),
+            model=MODEL,
+            temperature=0.2,
+            stream=True,
+        )
+        try:
+            return stream, await anext(stream, None)
+        except BaseException:
+            await stream.close()
+            raise
+
+    parts = []
+    usage = None
+    opened = False
+    start_time = time.perf_counter()
+    try:
+        # Not activated: the consumer runs its own code between deltas
+        with span("vlm.stream", activate=False, model=MODEL) as stream_span:
+            # Groq does not support JSON mode together with streaming, so the
+            # structure is enforced by the prompt alone here. Two streams
+            # racing would both reach the client, so there is no hedging.
+            # The slot is held until the stream ends
+            async with admission(PRIORITY_INTERACTIVE):
+                stream, chunk = await call_with_resilience(
+                    open_stream, MODEL, hedge=False
+                )
+                opened = True
+                # Also on client disconnect, so the pooled connection is freed
+                try:
+                    while chunk is not None:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            if not parts and stream_span is not None:
+                                stream_span.set_attribute(
+                                    "first_token_ms", round(stream_span.duration_ms, 3)
+                                )
+                            parts.append(chunk.choices[0].delta.content)
+                            yield "delta", chunk.choices[0].delta.content
+
+                        x_groq = getattr(chunk, "x_groq", None)
+                        if (
+                            x_groq is not None
+                            and getattr(x_groq, "usage", None) is not None
+                        ):
+                            usage = x_groq.usage
+                        chunk = await anext(stream, None)
+                finally:
+                    await stream.close()
+    except ProviderUnavailableError as e:
+        observe_vlm_call("stream", "unavailable", start_time)
+        record_error("vlm", e)
+        e.fallback = await degraded_result(cache_key, image_stats)
+        raise
+    except Exception as e:
+        observe_vlm_call("stream", "error", start_time)
+        record_error("vlm", e)
+        if opened and failure_reason(e) not in (None, "rate_limited"):
+            # Already partly delivered, so it cannot be retried
+            vlm_breaker.record_failure()
+            raise ProviderUnavailableError(
+                f"VLM stream interrupted: {failure_reason(e)}",
+                settings.VLM_RETRY_BACKOFF,
+            ) from e
+        raise
+    observe_vlm_call("stream", "ok", start_time)
+
+    result = build_result("".join(parts), usage)
+    remember_result(cache_key, image_stats, result)
+    result = {**result, "image": image_stats, "prompt_version": prompt.version}
+    yield "result", with_cache_info(result, cache_key)
+
+
+async def call_vlm_coalesced(key: str, call):
+    result, shared, owner = await vlm_flights.do(key, call)
+    if shared:
+        result = {**result, "coalesced": True}
+    if owner:
+        return result
+
+    # Only one request is charged for the upstream tokens: the leading one,
+    # or a follower if the leader went away before the result came back
+    return {**result, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+
+def observe_vlm_call(mode: str, outcome: str, start_time: float, model: str = MODEL):
+    VLM_LATENCY.labels(model=model, mode=mode, outcome=outcome).observe(
+        time.perf_counter() - start_time
     )
 
-    response = chat_completion.choices[0].message.content
-    completion_time = round(chat_completion.usage.completion_time, 2)
-    completion_tokens = chat_completion.usage.completion_tokens
-    prompt_tokens = chat_completion.usage.prompt_tokens
-    total_tokens = chat_completion.usage.total_tokens
-    print(
-        f"Completion time: {completion_time}, Prompt Tokens: {prompt_tokens}, Completion Tokens: {completion_tokens}, Total tokens: {total_tokens}"
+
+async def call_model(
+    image_source: str,
+    model: str,
+    prompt: Prompt,
+    priority: int = PRIORITY_INTERACTIVE,
+    timeout: Optional[float] = None,
+):
+    async def request():
+        start_time = time.perf_counter()
+        try:
+            with span("vlm.call", model=model):
+                chat_completion = await get_groq().chat.completions.create(
+                    messages=prompt.messages(image_source),
+                    model=model,
+                    temperature=0.2,
+                    stream=False,
+                    response_format=prompt.response_format,
+                )
+        except asyncio.CancelledError:
+            # Attempt deadline hit, or a hedged request lost the race
+            observe_vlm_call("sync", "cancelled", start_time, model)
+            raise
+        except Exception as e:
+            observe_vlm_call("sync", "error", start_time, model)
+            record_error("vlm", e)
+            raise
+        observe_vlm_call("sync", "ok", start_time, model)
+        return chat_completion
+
+    async with admission(priority):
+        start_time = time.perf_counter()
+        chat_completion = await call_with_resilience(request, model, timeout=timeout)
+        latency = time.perf_counter() - start_time
+    return {
+        **build_result(
+            chat_completion.choices[0].message.content, chat_completion.usage, model
+        ),
+        "latency": round(latency, 3),
+    }
+
+
+async def call_vlm(
+    image_source: str, prompt: Prompt, priority: int = PRIORITY_INTERACTIVE
+):
+    if not settings.VLM_ROUTING_ENABLED:
+        return await call_model(image_source, MODEL, prompt, priority)
+    return await call_routed(image_source, prompt, priority)
+
+
+async def call_routed(
+    image_source: str, prompt: Prompt, priority: int = PRIORITY_INTERACTIVE
+):
+    """
+    Asks the fast model first and only pays for the strong model when the
+    fast answer is invalid, cut off, incomplete or below the confidence
+    threshold.
+    """
+    fast = await call_model(
+        image_source,
+        settings.VLM_FAST_MODEL,
+        prompt,
+        priority,
+        settings.VLM_FAST_ATTEMPT_TIMEOUT,
+    )
+    reason = escalation_reason(fast["response"], settings.VLM_ESCALATION_CONFIDENCE)
+    if reason is None:
+        VLM_ROUTED.labels(tier="fast", reason="accepted").inc()
+        strong_latency = vlm_latency[settings.VLM_STRONG_MODEL].percentile(0.5)
+        if strong_latency is not None:
+            VLM_ROUTING_SAVED_SECONDS.inc(max(0.0, strong_latency - fast["latency"]))
+        return {**fast, "routing": {"tier": "fast", "escalation_reason": None}}
+
+    VLM_ROUTING_ESCALATION_SECONDS.inc(fast["latency"])
+    VLM_ROUTING_ESCALATION_TOKENS.inc(fast["total_tokens"] or 0)
+    try:
+        strong = await call_model(
+            image_source,
+            settings.VLM_STRONG_MODEL,
+            prompt,
+            priority,
+            settings.VLM_STRONG_ATTEMPT_TIMEOUT,
+        )
+    except ProviderUnavailableError:
+        # Neither would be accepted by the parser
+        if reason in ("invalid", "truncated"):
+            raise
+        # A usable if doubtful answer beats none
+        logger.warning(f"[VLM] Escalation ({reason}) failed, serving the fast answer")
+        VLM_ROUTED.labels(tier="fast", reason="escalation_failed").inc()
+        return {**fast, "routing": {"tier": "fast", "escalation_reason": reason}}
+
+    VLM_ROUTED.labels(tier="strong", reason=reason).inc()
+    # Both calls are billed
+    return {
+        **strong,
+        **{
+            field: (fast[field] or 0) + (strong[field] or 0)
+            for field in ("prompt_tokens", "completion_tokens", "total_tokens")
+        },
+        "completion_time": round(
+            fast["completion_time"] + strong["completion_time"], 2
+        ),
+        "latency": round(fast["latency"] + strong["latency"], 3),
+        "routing": {"tier": "strong", "escalation_reason": reason},
+    }
+
+
+def build_result(response: str, usage, model: str = MODEL):
+    completion_time = round(getattr(usage, "completion_time", 0) or 0, 2)
+    completion_tokens = getattr(usage, "completion_tokens", 0)
+    prompt_tokens = getattr(usage, "prompt_tokens", 0)
+    total_tokens = getattr(usage, "total_tokens", 0)
+    logger.debug(
+        f"[VLM] {model}: {completion_time}s, {prompt_tokens} prompt + "
+        f"{completion_tokens} completion = {total_tokens} tokens"
     )
-    print(response)
+    logger.debug(f"[VLM] Response: {response}")
+    VLM_TOKENS.labels(model=model, kind="prompt").inc(prompt_tokens or 0)
+    VLM_TOKENS.labels(model=model, kind="completion").inc(completion_tokens or 0)
 
     return {
         "response": response,
@@ -405,14 +484,17 @@ Response Structure:
         "prompt_tokens": prompt_tokens,
         "completion_tokens": completion_tokens,
         "total_tokens": total_tokens,
+        "model": model,
     }
 
 
 async def main():
     image_url = "https://cupcakesproteinshakes.wordpress.com/wp-content/uploads/2013/10/ingredients.jpg"
     nutrition_info = await get_nutrition_info(image_url)
-    print(type(nutrition_info))
+    logger.debug(f"[VLM] Result: {nutrition_info}")
+    await close_http_client()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
     asyncio.run(main())
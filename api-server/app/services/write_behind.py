@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from app.config.settings import settings
+from app.database.dependencies import get_image_analysis_repository
+from app.services import rollup_service
+from bson import json_util
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class WriteBehindBuffer:
+    """
+    Accepts analysis records into a bounded queue and persists them with
+    unordered `insert_many`, flushing when `WRITE_BEHIND_BATCH_SIZE` records
+    are waiting or `WRITE_BEHIND_FLUSH_INTERVAL` seconds have passed.
+
+    Failed flushes are retried with jittered backoff. Records that still
+    cannot be written are appended to a local spill file, which is replayed
+    into Mongo on the next start. When the queue stays full, requests
+    write their own records instead of waiting on the flusher.
+    """
+
+    def __init__(self):
+        self.queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._flushing: Optional[asyncio.Task] = None
+        # Records taken off the queue but not yet handed to a flush
+        self._batch: List[Dict[str, Any]] = []
+        self.flushes = 0
+        self.flushed_records = 0
+        self.retries = 0
+        self.spilled_records = 0
+        self.direct_records = 0
+        self.lost_records = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    @property
+    def repo(self):
+        return get_image_analysis_repository()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.queue is not None,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "queue_capacity": settings.WRITE_BEHIND_MAX_QUEUE,
+            "flushes": self.flushes,
+            "flushed_records": self.flushed_records,
+            "retries": self.retries,
+            "spilled_records": self.spilled_records,
+            "direct_records": self.direct_records,
+            "lost_records": self.lost_records,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "avg_flush_ms": round(self._total_flush_ms / max(self.flushes, 1), 2),
+        }
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=settings.WRITE_BEHIND_MAX_QUEUE)
+        await self.replay_spill_file()
+        self._flusher = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Drains everything still queued before returning."""
+        if self._flusher is None:
+            return
+
+        self._flusher.cancel()
+        await asyncio.gather(self._flusher, return_exceptions=True)
+        self._flusher = None
+        if self._flushing is not None:
+            await asyncio.gather(self._flushing, return_exceptions=True)
+
+        remaining, self._batch = self._batch, []
+        while not self.queue.empty():
+            remaining.append(self.queue.get_nowait())
+        for start in range(0, len(remaining), settings.WRITE_BEHIND_BATCH_SIZE):
+            await self.flush(
+                remaining[start : start + settings.WRITE_BEHIND_BATCH_SIZE]
+            )
+        self.queue = None
+
+    async def submit(self, records: List[Dict[str, Any]]):
+        for index, record in enumerate(records):
+            # Backpressure: when the buffer is full, wait a while for room
+            # rather than dropping the record or growing without bound
+            try:
+                await asyncio.wait_for(
+                    self.queue.put(record), settings.WRITE_BEHIND_SUBMIT_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                remaining = records[index:]
+                logger.warning(
+                    f"[WriteBehind] Buffer full, writing {len(remaining)} records directly"
+                )
+                self.direct_records += len(remaining)
+                await self.flush(remaining)
+                return
+
+    async def _run(self):
+        while True:
+            self._batch.append(await self.queue.get())
+            deadline = time.monotonic() + settings.WRITE_BEHIND_FLUSH_INTERVAL
+            while len(self._batch) < settings.WRITE_BEHIND_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    self._batch.append(
+                        await asyncio.wait_for(self.queue.get(), timeout)
+                    )
+                except asyncio.TimeoutError:
+                    break
+
+            # Flushes run as their own task so a shutdown arriving mid-flush
+            # lets `stop` wait for it instead of abandoning the batch
+            batch, self._batch = self._batch, []
+            self._flushing = asyncio.create_task(self.flush(batch))
+            try:
+                await asyncio.shield(self._flushing)
+            except Exception:
+                # The flusher must outlive any one batch, or the queue fills
+                # up and every request waits on it
+                logger.exception("[WriteBehind] Flush failed")
+
+    async def flush(self, records: List[Dict[str, Any]]):
+        start = time.perf_counter()
+        pending = records
+        for attempt in range(settings.WRITE_BEHIND_MAX_RETRIES + 1):
+            try:
+                await self.repo.insert_many(pending, ordered=False)
+                pending = []
+                break
+            except BulkWriteError as e:
+                # Unordered: everything except the failed indexes was written.
+                # Duplicates mean an earlier attempt already stored the record.
+                failed = {
+                    error["index"]
+                    for error in e.details.get("writeErrors", [])
+                    if error.get("code") != DUPLICATE_KEY
+                }
+                pending = [pending[i] for i in sorted(failed)]
+                if not pending:
+                    break
+            except Exception:
+                logger.exception("[WriteBehind] insert_many failed")
+
+            if attempt < settings.WRITE_BEHIND_MAX_RETRIES:
+                self.retries += 1
+                backoff = settings.WRITE_BEHIND_RETRY_BACKOFF * 2**attempt
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.5))
+
+        pending_ids = {id(record) for record in pending}
+        written = [record for record in records if id(record) not in pending_ids]
+        if written:
+            await rollup_service.record_analyses(written)
+        if pending:
+            await self.spill(pending)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.flushes += 1
+        self.flushed_records += len(written)
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+
+    async def spill(self, records: List[Dict[str, Any]]):
+        logger.error(f"[WriteBehind] Spilling {len(records)} records to disk")
+        lines = "".join(json_util.dumps(record) + "\n" for record in records)
+        try:
+            await asyncio.to_thread(_append, settings.WRITE_BEHIND_SPILL_FILE, lines)
+        except OSError:
+            # Disk full or not writable: nowhere left to keep them
+            logger.exception(f"[WriteBehind] Lost {len(records)} records")
+            self.lost_records += len(records)
+            return
+        self.spilled_records += len(records)
+
+    async def replay_spill_file(self):
+        path = settings.WRITE_BEHIND_SPILL_FILE
+        replay_path = f"{path}.replay"
+
+        # Move the spill file aside first so records spilled while replaying
+        # are not lost. A leftover replay file means a replay was interrupted.
+        if os.path.exists(path):
+            if os.path.exists(replay_path):
+                with open(path) as spill_file:
+                    _append(replay_path, spill_file.read())
+                os.remove(path)
+            else:
+                os.replace(path, replay_path)
+        if not os.path.exists(replay_path):
+            return
+
+        with open(replay_path) as spill_file:
+            records = [json_util.loads(line) for line in spill_file if line.strip()]
+        logger.info(f"[WriteBehind] Replaying {len(records)} spilled records")
+
+        for start in range(0, len(records), settings.WRITE_BEHIND_BATCH_SIZE):
+            await self.flush(records[start : start + settings.WRITE_BEHIND_BATCH_SIZE])
+        os.remove(replay_path)
+
+
+def _append(path: str, lines: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as spill_file:
+        spill_file.write(lines)
+        spill_file.flush()
+        os.fsync(spill_file.fileno())
+
+
+write_behind = WriteBehindBuffer()
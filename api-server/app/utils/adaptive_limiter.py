@@ -0,0 +1,155 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, List, Optional
+
+
+class LimitExceeded(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Concurrency limit reached ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit adjusted AIMD style: every successful call while the
+    limit is saturated raises it by `1 / limit` (about one per round of
+    calls), and congestion (rate limits, timeouts, slow calls) multiplies
+    it by `backoff`, at most once per typical call duration.
+
+    Callers over the limit wait in a priority queue (lower value first,
+    FIFO within a priority). A caller is turned away immediately when the
+    queue is full or its expected wait already exceeds its timeout.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        max_queue: int,
+        backoff: float = 0.7,
+        on_change: Optional[Callable[["AdaptiveLimiter"], None]] = None,
+    ):
+        self._limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.backoff = backoff
+        self.on_change = on_change
+        self.in_flight = 0
+        self.avg_latency: Optional[float] = None
+        self._waiters: List[list] = []
+        self._queued = 0
+        self._sequence = itertools.count()
+        self._last_decrease = 0.0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def expected_wait(self, priority: int) -> Optional[float]:
+        """Rough queueing delay for a new caller, once latency is known."""
+        if self.avg_latency is None:
+            return None
+        ahead = sum(1 for entry in self._waiters if entry[0] <= priority and entry[2])
+        return (ahead + 1) / self.limit * self.avg_latency
+
+    @asynccontextmanager
+    async def slot(self, priority: int, timeout: float):
+        await self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def try_acquire(self) -> bool:
+        """Takes a slot only if one is free without queueing."""
+        if self.in_flight < self.limit and not self._queued:
+            self.in_flight += 1
+            self._changed()
+            return True
+        return False
+
+    async def acquire(self, priority: int, timeout: float):
+        if self.try_acquire():
+            return
+
+        if self._queued >= self.max_queue:
+            raise LimitExceeded("queue_full", self._retry_after())
+        expected = self.expected_wait(priority)
+        if expected is not None and expected > timeout:
+            raise LimitExceeded("deadline", expected)
+
+        future = asyncio.get_running_loop().create_future()
+        # [priority, sequence, future]; the future is cleared when abandoned
+        entry = [priority, next(self._sequence), future]
+        heapq.heappush(self._waiters, entry)
+        self._queued += 1
+        self._changed()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # Granted just as the wait ended: pass the slot on
+                self.release()
+            else:
+                future.cancel()
+                entry[2] = None
+                self._queued -= 1
+                self._changed()
+            if isinstance(e, asyncio.TimeoutError):
+                raise LimitExceeded("deadline", self._retry_after()) from None
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._dispatch()
+        self._changed()
+
+    def record_success(self, latency: float):
+        self.avg_latency = (
+            latency
+            if self.avg_latency is None
+            else 0.9 * self.avg_latency + 0.1 * latency
+        )
+        # Only grow while the limit is actually what holds callers back
+        if self.in_flight >= self.limit - 1 and self._limit < self.max_limit:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            self._dispatch()
+            self._changed()
+
+    def record_congestion(self):
+        # Calls already in flight report the same congestion; back off once
+        now = time.monotonic()
+        if now - self._last_decrease < (self.avg_latency or 1.0):
+            return
+        self._last_decrease = now
+        self._limit = max(self.min_limit, self._limit * self.backoff)
+        self._changed()
+
+    def _dispatch(self):
+        while self._waiters and self.in_flight < self.limit:
+            _, _, future = heapq.heappop(self._waiters)
+            if future is None:
+                continue
+            self._queued -= 1
+            self.in_flight += 1
+            future.set_result(None)
+        # Drop abandoned entries left at the top
+        while self._waiters and self._waiters[0][2] is None:
+            heapq.heappop(self._waiters)
+
+    def _retry_after(self) -> float:
+        return self.expected_wait(0) or 1.0
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change(self)
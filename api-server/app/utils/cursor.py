@@ -0,0 +1,23 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+from bson import ObjectId
+
+
+def encode_cursor(created_at: datetime, document_id: ObjectId) -> str:
+    raw = f"{created_at.isoformat()}|{document_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, ObjectId]]:
+    """Raises ValueError for malformed cursors."""
+    if not cursor:
+        return None
+
+    created_at, document_id = (
+        base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+    )
+    if not ObjectId.is_valid(document_id):
+        raise ValueError(f"Invalid document id in cursor: {document_id}")
+    return datetime.fromisoformat(created_at), ObjectId(document_id)
@@ -0,0 +1,56 @@
+from itertools import combinations
+from typing import Any, Dict, List, Tuple
+
+
+class HammingIndex:
+    """
+    Multi-index hashing over fixed-width hashes. Each hash is split into `chunks`
+    equal substrings, each with its own table. By pigeonhole, two hashes
+    within `max_distance` bits agree to within `max_distance // chunks` bits
+    on at least one substring, so a lookup only probes the buckets within
+    that small radius in every table instead of scanning all entries.
+    """
+
+    def __init__(self, max_distance: int, chunks: int = 4, bits: int = 64):
+        self.max_distance = max_distance
+        width = bits // chunks
+        self._spans = [(i * width, (1 << width) - 1) for i in range(chunks)]
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(chunks)]
+        self._flips = [0] + [
+            sum(1 << bit for bit in combo)
+            for radius in range(1, max_distance // chunks + 1)
+            for combo in combinations(range(width), radius)
+        ]
+        self._hashes: List[int] = []
+        self._values: List[Any] = []
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def add(self, hash_value: int, value: Any):
+        index = len(self._hashes)
+        self._hashes.append(hash_value)
+        self._values.append(value)
+        for table, (shift, mask) in zip(self._tables, self._spans):
+            table.setdefault((hash_value >> shift) & mask, []).append(index)
+
+    def search(self, hash_value: int, max_distance: int) -> List[Tuple[int, Any]]:
+        """Returns `(distance, value)` pairs sorted by distance."""
+        max_distance = min(max_distance, self.max_distance)
+        matches: Dict[int, int] = {}
+        for table, (shift, mask) in zip(self._tables, self._spans):
+            key = (hash_value >> shift) & mask
+            for flip in self._flips:
+                for index in table.get(key ^ flip, ()):
+                    distance = (self._hashes[index] ^ hash_value).bit_count()
+                    if distance <= max_distance:
+                        matches[index] = distance
+
+        return sorted(
+            ((distance, self._values[index]) for index, distance in matches.items()),
+            key=lambda match: match[0],
+        )
+
+    def nearest(self, hash_value: int, max_distance: int):
+        matches = self.search(hash_value, max_distance)
+        return matches[0] if matches else None
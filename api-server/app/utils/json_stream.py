@@ -0,0 +1,123 @@
+import json
+from typing import Any, Iterable, List, Optional, Tuple
+
+Section = Tuple[Tuple[str, ...], Any]
+
+
+class _Frame:
+    def __init__(self, kind: str, path: Tuple[str, ...]):
+        self.kind = kind  # "{" or "["
+        self.path = path
+        self.key: Optional[str] = None
+        self.state = "key" if kind == "{" else "value"
+        self.value_start: Optional[int] = None
+        self.in_scalar = False
+
+
+class JSONSectionStream:
+    """
+    Incremental scanner for a streamed JSON object. Text is fed in as it
+    arrives and every member of the root object (and of the objects listed
+    in `expand`) is returned as soon as its value is complete, e.g.
+    `(("metadata",), {...})` or `(("nutrients", "protein"), {...})`.
+
+    Anything before the first `{` (code fences, chatter) is ignored.
+    """
+
+    def __init__(self, expand: Iterable[str] = ("nutrients",)):
+        self.buffer = ""
+        self.done = False
+        self._expand = {(key,) for key in expand}
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+
+    def feed(self, text: str) -> List[Section]:
+        self.buffer += text
+        sections: List[Section] = []
+
+        while self._pos < len(self.buffer) and not self.done:
+            char = self.buffer[self._pos]
+            i = self._pos
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._end_string(i, sections)
+                continue
+
+            if not self._stack:
+                if char == "{":
+                    self._stack.append(_Frame("{", ()))
+                continue
+
+            frame = self._stack[-1]
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+                if frame.state == "value":
+                    frame.value_start = i
+            elif char in "{[":
+                frame.value_start = i
+                path = frame.path + (frame.key if frame.kind == "{" else "",)
+                self._stack.append(_Frame(char, path))
+            elif char in "}]":
+                self._end_scalar(frame, i, sections)
+                self._stack.pop()
+                if not self._stack:
+                    self.done = True
+                else:
+                    self._end_value(self._stack[-1], i + 1, sections)
+            elif char == ":":
+                frame.state = "value"
+            elif char == ",":
+                self._end_scalar(frame, i, sections)
+                frame.state = "key" if frame.kind == "{" else "value"
+            elif not char.isspace() and frame.state == "value":
+                if not frame.in_scalar:
+                    frame.in_scalar = True
+                    frame.value_start = i
+
+        return sections
+
+    def result(self) -> Any:
+        return json.loads(self.buffer[self.buffer.index("{") : self._pos])
+
+    def _end_string(self, end: int, sections: List[Section]):
+        frame = self._stack[-1]
+        if frame.state == "key":
+            frame.key = json.loads(self.buffer[self._string_start : end + 1])
+            frame.state = "colon"
+        elif frame.state == "value":
+            self._end_value(frame, end + 1, sections)
+
+    def _end_scalar(self, frame: _Frame, end: int, sections: List[Section]):
+        if frame.in_scalar:
+            frame.in_scalar = False
+            self._end_value(frame, end, sections)
+
+    def _end_value(self, frame: _Frame, end: int, sections: List[Section]):
+        start = frame.value_start
+        frame.value_start = None
+        frame.state = "after"
+        if frame.kind != "{" or start is None:
+            return
+
+        path = frame.path + (frame.key,)
+        if path in self._expand:
+            return
+        if frame.path == () or frame.path in self._expand:
+            try:
+                value = json.loads(self.buffer[start:end])
+            except json.JSONDecodeError:
+                # e.g. a trailing comma: not streamed, but repaired when
+                # the full response is parsed
+                return
+            sections.append((path, value))
@@ -0,0 +1,174 @@
+import math
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+DAY_SECONDS = 86400
+
+
+def refill(
+    tokens: float, updated_at: float, now: float, rate: float, capacity: float
+) -> float:
+    """Bucket level at `now`, given its level at `updated_at`."""
+    return min(capacity, tokens + max(0.0, now - updated_at) * rate)
+
+
+def take_from(
+    tokens: float, rate: float, capacity: float, cost: float
+) -> Tuple[float, bool, float]:
+    """
+    Takes `cost` from a bucket holding `tokens`. Returns the new level,
+    whether it was allowed and how long until it would be. A cost above
+    `capacity` is let through from a full bucket and leaves it in debt.
+    """
+    needed = min(cost, capacity)
+    if tokens >= needed:
+        return tokens - cost, True, 0.0
+    return tokens, False, (needed - tokens) / rate
+
+
+def day_window(now: float) -> Tuple[str, float]:
+    """The UTC day containing `now` and the epoch time it ends."""
+    return (
+        time.strftime("%Y-%m-%d", time.gmtime(now)),
+        (math.floor(now / DAY_SECONDS) + 1) * DAY_SECONDS,
+    )
+
+
+class MemoryRateLimitStore:
+    """
+    Token buckets and daily usage counters for a single process. The
+    least recently used buckets are forgotten past `max_keys`, which only
+    ever refills them early.
+    """
+
+    blocking = False
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._usage: Dict[str, int] = {}
+        self._usage_day = None
+
+    def take(
+        self, key: str, cost: float, rate: float, capacity: float, now: float
+    ) -> Tuple[bool, float, float]:
+        """Returns `(allowed, remaining, retry_after)`."""
+        tokens, updated_at = self._buckets.get(key, (capacity, now))
+        tokens = refill(tokens, updated_at, now, rate, capacity)
+        tokens, allowed, retry_after = take_from(tokens, rate, capacity, cost)
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, tokens, retry_after
+
+    def add_usage(self, key: str, day: str, amount: int) -> int:
+        self._roll_day(day)
+        self._usage[key] = self._usage.get(key, 0) + amount
+        return self._usage[key]
+
+    def usage(self, key: str, day: str) -> int:
+        self._roll_day(day)
+        return self._usage.get(key, 0)
+
+    def _roll_day(self, day: str):
+        if day != self._usage_day:
+            self._usage_day = day
+            self._usage.clear()
+
+    def close(self):
+        pass
+
+
+class SQLiteRateLimitStore:
+    """
+    The same state in a SQLite file, shared by every worker process on
+    the host. Each update is a short `BEGIN IMMEDIATE` transaction, so
+    concurrent workers serialise on the database lock. Calls block, so
+    `blocking` tells callers to make them from a single worker thread.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, usage_days_kept: int = 7):
+        self.path = path
+        self.usage_days_kept = usage_days_kept
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pruned_day = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        connection = self._connection
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS usage (key TEXT NOT NULL, "
+                "day TEXT NOT NULL, amount INTEGER NOT NULL, PRIMARY KEY (key, day))"
+            )
+            self._connection = connection
+        return connection
+
+    def take(
+        self, key: str, cost: float, rate: float, capacity: float, now: float
+    ) -> Tuple[bool, float, float]:
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens = capacity if row is None else refill(*row, now, rate, capacity)
+            tokens, allowed, retry_after = take_from(tokens, rate, capacity, cost)
+            connection.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated_at) "
+                "VALUES (?, ?, ?)",
+                (key, tokens, now),
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return allowed, tokens, retry_after
+
+    def add_usage(self, key: str, day: str, amount: int) -> int:
+        self._prune(day)
+        (total,) = self.connection.execute(
+            "INSERT INTO usage (key, day, amount) VALUES (?, ?, ?) "
+            "ON CONFLICT (key, day) DO UPDATE SET amount = amount + excluded.amount "
+            "RETURNING amount",
+            (key, day, amount),
+        ).fetchone()
+        return total
+
+    def usage(self, key: str, day: str) -> int:
+        row = self.connection.execute(
+            "SELECT amount FROM usage WHERE key = ? AND day = ?", (key, day)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _prune(self, day: str):
+        # Once per day per process; idle buckets are full and can go too
+        if day == self._pruned_day:
+            return
+        self._pruned_day = day
+        now = time.time()
+        oldest = time.strftime(
+            "%Y-%m-%d", time.gmtime(now - self.usage_days_kept * DAY_SECONDS)
+        )
+        self.connection.execute("DELETE FROM usage WHERE day < ?", (oldest,))
+        self.connection.execute(
+            "DELETE FROM buckets WHERE updated_at < ?", (now - DAY_SECONDS,)
+        )
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
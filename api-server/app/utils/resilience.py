@@ -0,0 +1,149 @@
+import asyncio
+import bisect
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Circuit open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds. After that a single probe call is let
+    through (half-open): its success closes the circuit, its failure opens
+    it again. A probe that never reports back (e.g. it was cancelled) is
+    replaced after another `reset_timeout`.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        on_state_change: Optional[Callable[[str], None]] = None,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.on_state_change = on_state_change
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_started: Optional[float] = None
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def before_call(self):
+        """Raises `CircuitOpenError` when the call must not be attempted."""
+        if self.state == OPEN:
+            if self.retry_after() > 0:
+                raise CircuitOpenError(self.retry_after())
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            now = time.monotonic()
+            if (
+                self._probe_started is not None
+                and now - self._probe_started < self.reset_timeout
+            ):
+                raise CircuitOpenError(self._probe_started + self.reset_timeout - now)
+            self._probe_started = now
+
+    def record_success(self):
+        self._probe_started = None
+        self.failures = 0
+        if self.state != CLOSED:
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        self._probe_started = None
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            if self.state != OPEN:
+                self._set_state(OPEN)
+
+    def _set_state(self, state: str):
+        self.state = state
+        if self.on_state_change is not None:
+            self.on_state_change(state)
+
+
+class LatencyWindow:
+    """Latencies of the most recent `size` successful calls, in seconds."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._sorted = []
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float):
+        if len(self._samples) == self._samples.maxlen:
+            oldest = self._samples[0]
+            del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+        self._samples.append(seconds)
+        bisect.insort(self._sorted, seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self._sorted:
+            return None
+        return self._sorted[
+            min(len(self._sorted) - 1, int(len(self._sorted) * fraction))
+        ]
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter for the given retry (0-based)."""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+async def hedged(
+    call: Callable[[], Awaitable[Any]],
+    delay: Optional[float],
+    on_hedge: Optional[Callable[[], None]] = None,
+    hedge_call: Optional[Callable[[], Awaitable[Any]]] = None,
+):
+    """
+    Runs `call`, and if it has not finished after `delay` seconds starts a
+    second identical call (`hedge_call` when given). The first to succeed
+    wins and the other is cancelled; the call only fails once every
+    started call has failed, with the error of the first call.
+    Returns `(result, hedge_won)`.
+    """
+    if delay is None:
+        return await call(), False
+
+    primary = asyncio.create_task(call())
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            if on_hedge is not None:
+                on_hedge()
+            tasks.append(asyncio.create_task((hedge_call or call)()))
+
+        error = None
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), task is not primary
+                if error is None or task is primary:
+                    error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
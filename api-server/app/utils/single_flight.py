@@ -0,0 +1,64 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+        # Set once a caller has taken the result as its own
+        self.claimed = False
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one execution whose
+    result (or exception) is shared by every caller. The underlying call is
+    only cancelled once every caller waiting on it has gone away.
+
+    Exactly one caller that receives a result owns it (to be charged for
+    it): the one that started the call, or the first caller still waiting
+    if that one went away.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.coalesced = 0
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def do(
+        self, key: Hashable, fn: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool, bool]:
+        """
+        Returns the result, whether the call was started by another caller
+        and whether this caller owns the result.
+        """
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = _Flight(asyncio.create_task(fn()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+        # Waiters resume in the order they joined, starting with the leader
+        owner = not flight.claimed
+        flight.claimed = True
+        return result, shared, owner
+
+    def _forget(self, key: Hashable, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
@@ -0,0 +1,237 @@
+"""
+Minimal request tracing. A trace is opened per request (or background job)
+and carried through contextvars, so any code running on its behalf can open
+nested spans with `with span("name"):` without threading arguments around.
+Outside a trace, `span` is a no-op.
+
+Finished traces can be rendered as OTLP/JSON (`ExportTraceServiceRequest`)
+for import into any OpenTelemetry collector.
+"""
+
+import logging
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+# OTLP span kinds
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# Finished traces are logged here; the logging setup decides where they go
+EXPORT_LOGGER_NAME = "traces"
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("span", default=None)
+
+
+def new_id(size: int) -> str:
+    # Trace ids need uniqueness, not secrecy; os.urandom is a syscall per id
+    return f"{random.getrandbits(size * 8):0{size * 2}x}"
+
+
+class Span:
+    __slots__ = (
+        "name",
+        "span_id",
+        "parent_id",
+        "kind",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "error",
+    )
+
+    def __init__(self, name: str, parent_id: Optional[str], kind: int, attributes):
+        self.name = name
+        self.span_id = new_id(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = attributes
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1_000_000
+
+
+class Trace:
+    def __init__(
+        self,
+        request_id: Optional[str] = None,
+        traceparent: Optional[str] = None,
+        max_spans: int = 256,
+    ):
+        # Join the caller's trace when a W3C traceparent header was sent
+        match = TRACEPARENT.match(traceparent or "")
+        self.trace_id = match.group(1) if match else new_id(16)
+        self.parent_span_id = match.group(2) if match else None
+        self.request_id = request_id
+        self.max_spans = max_spans
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+        self.root: Optional[Span] = None
+
+    def add(self, span: Span):
+        # Large batches would otherwise produce unbounded log lines. The
+        # root span closes last and is always kept.
+        if len(self.spans) < self.max_spans or span is self.root:
+            self.spans.append(span)
+        else:
+            self.dropped_spans += 1
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Compact span list for the request log line, in start order."""
+        start_ns = self.root.start_ns if self.root else 0
+        return [
+            {
+                "name": span.name,
+                "span_id": span.span_id,
+                "parent_id": span.parent_id,
+                "start_ms": round((span.start_ns - start_ns) / 1_000_000, 3),
+                "duration_ms": round(span.duration_ms, 3),
+                **({"error": span.error} if span.error else {}),
+                **span.attributes,
+            }
+            for span in sorted(self.spans, key=lambda span: span.start_ns)
+        ]
+
+    def to_otlp(self, service_name: str) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [otlp_attribute("service.name", service_name)]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [self._otlp_span(span) for span in self.spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def _otlp_span(self, span: Span) -> Dict[str, Any]:
+        attributes = dict(span.attributes)
+        if span is self.root and self.request_id:
+            attributes["request.id"] = self.request_id
+        if span.error:
+            attributes["exception.type"] = span.error
+
+        otlp_span = {
+            "traceId": self.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": span.kind,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns or span.start_ns),
+            "attributes": [
+                otlp_attribute(key, value) for key, value in attributes.items()
+            ],
+            "status": {"code": STATUS_ERROR if span.error else STATUS_OK},
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        return otlp_span
+
+
+def otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+
+def _reset(var: ContextVar, token):
+    try:
+        var.reset(token)
+    except ValueError:
+        # Closed from another context, e.g. an async generator finalized
+        # by the event loop; the originating context is gone anyway
+        pass
+
+
+@contextmanager
+def trace(
+    name: str,
+    request_id: Optional[str] = None,
+    traceparent: Optional[str] = None,
+    max_spans: int = 256,
+    kind: int = SPAN_KIND_SERVER,
+):
+    """Opens a new trace with a root span named `name`."""
+    new_trace = Trace(request_id, traceparent, max_spans)
+    trace_token = _current_trace.set(new_trace)
+    try:
+        with span(name, kind=kind) as root:
+            new_trace.root = root
+            yield new_trace
+    finally:
+        _reset(_current_trace, trace_token)
+
+
+@contextmanager
+def span(
+    name: str, kind: int = SPAN_KIND_INTERNAL, activate: bool = True, **attributes
+):
+    """
+    Times the enclosed block as a child of the current span. Pass
+    `activate=False` when the block yields to unrelated code (async
+    generators), so spans opened meanwhile are not parented to this one.
+    """
+    active_trace = _current_trace.get()
+    if active_trace is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    new_span = Span(
+        name,
+        parent.span_id if parent is not None else active_trace.parent_span_id,
+        kind,
+        attributes,
+    )
+    span_token = _current_span.set(new_span) if activate else None
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.error = type(e).__name__
+        raise
+    finally:
+        new_span.end_ns = time.time_ns()
+        if span_token is not None:
+            _reset(_current_span, span_token)
+        active_trace.add(new_span)
+
+
+def export(finished: Trace):
+    """Hands a finished trace to the OTLP exporter, when one is configured."""
+    export_logger = logging.getLogger(EXPORT_LOGGER_NAME)
+    if export_logger.handlers:
+        export_logger.info("trace", extra={"trace": finished})
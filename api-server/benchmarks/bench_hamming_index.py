@@ -0,0 +1,67 @@
+"""
+Lookup latency of the perceptual hash index at scale.
+
+    python -m benchmarks.bench_hamming_index --size 1000000
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from app.utils.hamming_index import HammingIndex
+
+
+def flip_bits(value: int, count: int) -> int:
+    for bit in random.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--max-distance", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    hashes = [random.getrandbits(64) for _ in range(args.size)]
+
+    index = HammingIndex(args.max_distance)
+    start = time.perf_counter()
+    for i, value in enumerate(hashes):
+        index.add(value, i)
+    build_time = time.perf_counter() - start
+
+    # Half the queries are near-duplicates of stored hashes, half are misses
+    queries = [
+        (
+            flip_bits(random.choice(hashes), random.randint(0, args.max_distance))
+            if i % 2 == 0
+            else random.getrandbits(64)
+        )
+        for i in range(args.queries)
+    ]
+
+    timings = []
+    hits = 0
+    for query in queries:
+        start = time.perf_counter()
+        match = index.nearest(query, args.max_distance)
+        timings.append((time.perf_counter() - start) * 1000)
+        hits += match is not None
+
+    timings.sort()
+    print(f"Indexed {args.size} hashes in {build_time:.2f}s")
+    print(
+        f"Lookups: {args.queries}, hits: {hits}, "
+        f"p50: {statistics.median(timings):.3f}ms, "
+        f"p99: {timings[int(len(timings) * 0.99) - 1]:.3f}ms, "
+        f"max: {timings[-1]:.3f}ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
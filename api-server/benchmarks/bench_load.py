@@ -0,0 +1,428 @@
+"""
+End-to-end load test. Boots the API in its own process against the fake
+VLM provider (`benchmarks.fake_provider`) and a MongoDB, drives it at a
+fixed request rate and reports throughput, latency percentiles, server
+event loop lag and memory. Results are written as JSON so runs on
+different commits can be compared.
+
+    python -m benchmarks.bench_load --rps 20 --duration 30 --output before.json
+    python -m benchmarks.bench_load --rps 20 --duration 30 --baseline before.json
+
+MongoDB comes from `--mongo-uri`, or a throwaway `mongod` (which must be
+on PATH) is started in a temporary directory. Each run uses its own
+database, dropped afterwards.
+
+Latency is measured from each request's scheduled start, so time spent
+waiting for a free `--concurrency` slot counts against the server.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+from benchmarks import fake_provider
+
+API_DIR = Path(__file__).resolve().parents[1]
+LAG_TICK_SECONDS = 0.01
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(timings: list, fraction: float) -> float:
+    if not timings:
+        return 0.0
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+def summarize(timings: list) -> dict:
+    timings = sorted(timings)
+    return {
+        "p50": round(percentile(timings, 0.5), 2),
+        "p95": round(percentile(timings, 0.95), 2),
+        "p99": round(percentile(timings, 0.99), 2),
+        "max": round(timings[-1] if timings else 0.0, 2),
+    }
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return 0.0
+
+
+def serve(port: int):
+    """Runs the API with an event loop lag probe; used as the server process."""
+    import uvicorn
+    from main import app
+
+    lags = []
+
+    async def measure_lag():
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(LAG_TICK_SECONDS)
+            lags.append((time.perf_counter() - start - LAG_TICK_SECONDS) * 1000)
+
+    async def bench_stats():
+        return {
+            "loop_lag_ms": summarize(lags),
+            "rss_mb": rss_mb(),
+            # ru_maxrss is in KiB on Linux
+            "peak_rss_mb": round(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+            ),
+        }
+
+    async def bench_reset():
+        lags.clear()
+
+    app.add_api_route("/_bench/stats", bench_stats, methods=["GET"])
+    app.add_api_route("/_bench/reset", bench_reset, methods=["POST"])
+
+    async def run():
+        server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+        )
+        probe = asyncio.create_task(measure_lag())
+        try:
+            await server.serve()
+        finally:
+            probe.cancel()
+
+    asyncio.run(run())
+
+
+def start_mongod(workdir: str):
+    if shutil.which("mongod") is None:
+        raise SystemExit("No --mongo-uri given and mongod is not on PATH")
+    port = free_port()
+    process = subprocess.Popen(
+        ["mongod", "--dbpath", workdir, "--port", str(port), "--bind_ip", "127.0.0.1"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return process, f"mongodb://127.0.0.1:{port}"
+
+
+async def wait_until_ready(client: httpx.AsyncClient, url: str, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"{url} exited with code {process.returncode}")
+        try:
+            if (await client.get(url)).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit(f"{url} did not become ready in {timeout}s")
+
+
+async def authenticate(client: httpx.AsyncClient, api_url: str):
+    credentials = {"email": "bench@example.com", "password": "bench-password"}
+    await client.post(
+        f"{api_url}/api/auth/register",
+        json={**credentials, "display_name": "Benchmark"},
+    )
+    response = await client.post(f"{api_url}/api/auth/login", json=credentials)
+    response.raise_for_status()
+    login = response.json()
+    return {"Authorization": f"Bearer {login['access_token']}"}, login["user"]["uuid"]
+
+
+async def send(client: httpx.AsyncClient, mode: str, api_url: str, payload, headers):
+    """Sends one analysis and returns its outcome (a status code or error)."""
+    if mode == "stream":
+        async with client.stream(
+            "POST", f"{api_url}/api/analyze/stream", json=payload, headers=headers
+        ) as response:
+            failed = False
+            async for line in response.aiter_lines():
+                failed = failed or line == "event: error"
+            return "stream_error" if failed else response.status_code
+
+    if mode == "async":
+        response = await client.post(
+            f"{api_url}/api/analyze",
+            params={"async": "true"},
+            json=payload,
+            headers=headers,
+        )
+        if response.status_code != 202:
+            return response.status_code
+        job_url = f"{api_url}{response.headers['location']}"
+        while True:
+            await asyncio.sleep(0.1)
+            job = (await client.get(job_url, headers=headers)).json()
+            if job.get("status") == "completed":
+                return 200
+            if job.get("status") == "failed":
+                return "job_failed"
+
+    response = await client.post(
+        f"{api_url}/api/analyze", json=payload, headers=headers
+    )
+    return response.status_code
+
+
+async def generate_load(
+    args, api_url: str, image_url: str, headers, user_uuid: str, first_index=0
+):
+    total = int(args.rps * args.duration)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    outcomes = Counter()
+
+    async with httpx.AsyncClient(
+        timeout=args.request_timeout,
+        limits=httpx.Limits(max_connections=args.concurrency),
+    ) as client:
+
+        async def request(index: int, scheduled: float):
+            # Offset so the warmup does not pre-cache the measured images
+            index += first_index
+            payload = {
+                "user_uuid": user_uuid,
+                "food_name": f"item {index}",
+                "meal_type": "lunch",
+                "tags": ["bench"],
+                "image_url": f"{image_url}/images/{index % args.unique_images}.jpg",
+            }
+            async with semaphore:
+                try:
+                    outcome = await send(client, args.mode, api_url, payload, headers)
+                except httpx.HTTPError as e:
+                    outcome = type(e).__name__
+            outcomes[str(outcome)] += 1
+            if outcome == 200:
+                latencies.append((time.perf_counter() - scheduled) * 1000)
+
+        # Open loop: requests start on schedule whether or not earlier ones
+        # have finished
+        start = time.perf_counter()
+        tasks = []
+        for index in range(total):
+            scheduled = start + index / args.rps
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            tasks.append(asyncio.create_task(request(index, scheduled)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests": total,
+        "succeeded": len(latencies),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "latency_ms": summarize(latencies),
+        "outcomes": dict(outcomes),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=API_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Compared against --baseline; True when higher is better
+COMPARED = {
+    ("throughput_rps",): True,
+    ("latency_ms", "p50"): False,
+    ("latency_ms", "p95"): False,
+    ("latency_ms", "p99"): False,
+    ("server", "loop_lag_ms", "p99"): False,
+    ("server", "peak_rss_mb"): False,
+}
+
+
+def lookup(results: dict, path: tuple):
+    for key in path:
+        results = results.get(key, {}) if isinstance(results, dict) else {}
+    return results if isinstance(results, (int, float)) else None
+
+
+def compare(results: dict, baseline: dict):
+    print(f"\nvs {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    for path, higher_is_better in COMPARED.items():
+        before, after = lookup(baseline, path), lookup(results, path)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        better = change > 0 if higher_is_better else change < 0
+        verdict = "" if abs(change) < 5 else (" better" if better else " WORSE")
+        print(f"{'.'.join(path):>28}: {before} -> {after} ({change:+.1f}%){verdict}")
+
+
+async def run(args):
+    workdir = tempfile.mkdtemp(prefix="vlm-bench-")
+    processes = []
+    database = f"vlm_bench_{int(time.time())}"
+    mongo_uri = args.mongo_uri
+    try:
+        if mongo_uri is None:
+            mongod, mongo_uri = start_mongod(workdir)
+            processes.append(mongod)
+
+        provider_port, api_port = free_port(), free_port()
+        provider_url = f"http://127.0.0.1:{provider_port}"
+        api_url = f"http://127.0.0.1:{api_port}"
+        provider_args = [
+            f"--{field.replace('_', '-')}={value}"
+            for field, value in vars(fake_provider.config_from_args(args)).items()
+        ]
+        processes.append(
+            subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.fake_provider"]
+                + ["--port", str(provider_port)]
+                + provider_args,
+                cwd=API_DIR,
+            )
+        )
+
+        env = {
+            **os.environ,
+            "MONGODB_URI": mongo_uri,
+            "MONGODB_DB_NAME": database,
+            "LLM_API_KEY": "bench",
+            "API_KEY": "bench",
+            "SECRET_KEY": "bench",
+            "LLM_BASE_URL": provider_url,
+            "LOG_FILE": os.path.join(workdir, "api_logs.jsonl"),
+            "LOG_CONSOLE_ENABLED": "false",
+            "WRITE_BEHIND_SPILL_FILE": os.path.join(workdir, "spill.jsonl"),
+            # A single user drives the whole load
+            "RATE_LIMIT_ENABLED": "false",
+            # Label images are served by the local fake provider
+            "IMAGE_ALLOW_PRIVATE_HOSTS": "true",
+            **dict(setting.split("=", 1) for setting in args.setting),
+        }
+        processes.append(
+            subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.bench_load"]
+                + ["--serve", "--port", str(api_port)],
+                cwd=API_DIR,
+                env=env,
+                stdout=subprocess.DEVNULL if args.quiet_server else None,
+            )
+        )
+
+        async with httpx.AsyncClient(timeout=30) as client:
+            await wait_until_ready(client, f"{provider_url}/stats", processes[-2])
+            await wait_until_ready(client, f"{api_url}/api/health", processes[-1])
+            headers, user_uuid = await authenticate(client, api_url)
+
+            warmup_requests = int(args.rps * args.warmup)
+            if warmup_requests:
+                warmup = argparse.Namespace(**{**vars(args), "duration": args.warmup})
+                await generate_load(warmup, api_url, provider_url, headers, user_uuid)
+            await client.post(f"{api_url}/_bench/reset")
+
+            results = await generate_load(
+                args, api_url, provider_url, headers, user_uuid, warmup_requests
+            )
+            results["server"] = (await client.get(f"{api_url}/_bench/stats")).json()
+            results["provider"] = (await client.get(f"{provider_url}/stats")).json()
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+        for process in reversed(processes):
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if args.mongo_uri is not None:
+            from pymongo import MongoClient
+            from pymongo.errors import PyMongoError
+
+            try:
+                with MongoClient(
+                    args.mongo_uri, serverSelectionTimeoutMS=5000
+                ) as mongo:
+                    mongo.drop_database(database)
+            except PyMongoError as e:
+                print(f"Could not drop benchmark database {database}: {e}")
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "baseline", "mongo_uri", "serve", "port")
+        },
+        **results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rps", type=float, default=10)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument(
+        "--mode", choices=("analyze", "stream", "async"), default="analyze"
+    )
+    # Requests cycle through this many distinct images; fewer means more
+    # result cache hits
+    parser.add_argument("--unique-images", type=int, default=1_000_000)
+    parser.add_argument("--request-timeout", type=float, default=120)
+    parser.add_argument("--mongo-uri")
+    parser.add_argument(
+        "--setting",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="API setting for the server process, e.g. RESULT_CACHE_ENABLED=false",
+    )
+    parser.add_argument("--quiet-server", action="store_true")
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    provider = parser.add_argument_group("fake provider")
+    fake_provider.add_arguments(provider)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port)
+        return
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            compare(results, json.load(baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Per-request latency added by LoggingMiddleware, comparing the queue-based
+writer against logging synchronously to the file on the event loop.
+
+    python -m benchmarks.bench_logging_middleware --requests 20000
+    python -m benchmarks.bench_logging_middleware --requests 2000 --write-delay-ms 1
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from app.config.settings import settings
+from app.middlewares import logging_middleware
+from app.middlewares.logging_middleware import LoggingMiddleware
+
+
+class StdlibJSONFormatter(logging.Formatter):
+    # The formatter the middleware used before moving to orjson
+    def format(self, record):
+        return json.dumps(
+            {
+                "timestamp": self.formatTime(record),
+                "level": record.levelname,
+                "message": record.getMessage(),
+                "module": record.module,
+                "process": record.process,
+                "thread": record.thread,
+                "function": record.funcName,
+                "line": record.lineno,
+            }
+        )
+
+
+async def app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def slow_down(handler: logging.Handler, delay_ms: float):
+    # Simulates a slow or contended disk (network volume, fsync storms)
+    emit = handler.emit
+
+    def slow_emit(record):
+        time.sleep(delay_ms / 1000)
+        emit(record)
+
+    handler.emit = slow_emit
+
+
+def build_app(mode: str, write_delay_ms: float):
+    if mode == "none":
+        return app
+
+    middleware = LoggingMiddleware(app)
+    if mode == "blocking":
+        logging_middleware.stop_logging()
+        file_handler = logging.FileHandler(settings.LOG_FILE)
+        file_handler.setFormatter(StdlibJSONFormatter())
+        middleware.logger.addHandler(file_handler)
+    else:
+        _, _, listener = logging_middleware._listeners[0]
+        file_handler = listener.handlers[0]
+
+    if write_delay_ms:
+        slow_down(file_handler, write_delay_ms)
+    return middleware
+
+
+async def run(mode: str, requests: int, write_delay_ms: float = 0) -> list:
+    target = build_app(mode, write_delay_ms)
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/api/analyze",
+        "raw_path": b"/api/analyze",
+        "query_string": b"",
+        "headers": [],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+        "scheme": "http",
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await target(dict(scope), receive, send)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    logger = logging.getLogger(logging_middleware.LOGGER_NAME)
+    logging_middleware.stop_logging()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    return sorted(timings)
+
+
+def percentile(timings: list, fraction: float) -> float:
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument(
+        "--write-delay-ms",
+        type=float,
+        default=0,
+        help="Extra latency per log write, to model a slow disk",
+    )
+    args = parser.parse_args()
+
+    settings.LOG_CONSOLE_ENABLED = False
+    settings.LOG_SUCCESS_SAMPLE_RATE = 1.0
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        settings.LOG_FILE = os.path.join(log_dir, "api_logs.jsonl")
+        baseline = None
+        for mode in ("none", "blocking", "queue"):
+            timings = await run(mode, args.requests, args.write_delay_ms)
+            p99 = percentile(timings, 0.99)
+            baseline = p99 if baseline is None else baseline
+            print(
+                f"{mode:>8}: p50: {statistics.median(timings) * 1000:.1f}us, "
+                f"p99: {p99 * 1000:.1f}us, "
+                f"p99 overhead: {(p99 - baseline) * 1000:.1f}us"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+"""
+Event loop lag during a login storm, with bcrypt run inline on the loop
+versus offloaded to the password hashing process pool.
+
+    python -m benchmarks.bench_password_hashing --logins 50 --rounds 12
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.config.settings import settings
+from app.services import password_service
+
+TICK_SECONDS = 0.01
+
+
+async def measure_lag(stop: asyncio.Event, lags: list):
+    # Stand-in for every other request on the worker: how late does a
+    # 10ms timer fire while logins are being verified?
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append((time.perf_counter() - start - TICK_SECONDS) * 1000)
+
+
+async def login_storm(mode: str, logins: int, password: str, hashed: str):
+    async def login():
+        if mode == "inline":
+            password_service._verify_and_update(
+                password, hashed, settings.BCRYPT_ROUNDS
+            )
+        else:
+            await password_service.verify_password(password, hashed)
+
+    stop = asyncio.Event()
+    lags = []
+    ticker = asyncio.create_task(measure_lag(stop, lags))
+    await asyncio.sleep(TICK_SECONDS)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await ticker
+
+    lags.sort()
+    print(
+        f"{mode:>6}: {logins} logins in {elapsed:.2f}s, "
+        f"loop lag p50: {statistics.median(lags):.1f}ms, "
+        f"p99: {lags[min(len(lags) - 1, int(len(lags) * 0.99))]:.1f}ms, "
+        f"max: {lags[-1]:.1f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=settings.BCRYPT_ROUNDS)
+    args = parser.parse_args()
+
+    settings.BCRYPT_ROUNDS = args.rounds
+    password = "correct horse battery staple"
+    hashed = password_service._hash(password, args.rounds)
+
+    # Warm the pool so worker start-up is not counted as lag
+    await password_service.verify_password(password, hashed)
+
+    try:
+        for mode in ("inline", "pool"):
+            await login_storm(mode, args.logins, password, hashed)
+    finally:
+        password_service.shutdown_process_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
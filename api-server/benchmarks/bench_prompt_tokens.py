@@ -0,0 +1,65 @@
+"""
+Size of each prompt version in `prompt_builder.PROMPTS`. Offline the
+token count is approximate (one per word or punctuation mark, close to
+what BPE tokenizers do with JSON); `--live` asks the configured provider
+for the exact prompt token count of each text, without the image.
+
+    python -m benchmarks.bench_prompt_tokens [--live]
+"""
+
+import argparse
+import asyncio
+import json
+import re
+
+from app.services.prompt_builder import PROMPTS
+
+PIECE = re.compile(r"\w+|[^\w\s]")
+
+
+def approx_tokens(text: str) -> int:
+    return len(PIECE.findall(text))
+
+
+async def live_tokens():
+    """Prompt tokens billed for each version's text, by version."""
+    from app.services.http_client import close_http_client
+    from app.services.vlm_service import MODEL, get_groq
+
+    counts = {}
+    try:
+        for version, prompt in PROMPTS.items():
+            completion = await get_groq().chat.completions.create(
+                messages=[{"role": "user", "content": prompt.text}],
+                model=MODEL,
+                max_tokens=1,
+            )
+            counts[version] = completion.usage.prompt_tokens
+    finally:
+        await close_http_client()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--live", action="store_true")
+    args = parser.parse_args()
+
+    live = asyncio.run(live_tokens()) if args.live else {}
+    baseline = None
+    for version, prompt in PROMPTS.items():
+        schema = json.dumps(prompt.response_format)
+        tokens = approx_tokens(prompt.text)
+        baseline = baseline or tokens
+        line = (
+            f"{version:>4}: {len(prompt.text):6d} chars, ~{tokens:5d} tokens "
+            f"({tokens / baseline:6.1%} of {next(iter(PROMPTS))}), "
+            f"response_format ~{approx_tokens(schema):5d} tokens"
+        )
+        if version in live:
+            line += f", provider {live[version]} tokens"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Per-response cost of turning VLM output into nutrition info: plain
+`json.loads` (the old path, which rejects anything malformed) versus
+`parse_nutrition` (orjson, repair when needed, compiled validation).
+
+    python -m benchmarks.bench_response_parsing --iterations 20000
+"""
+
+import argparse
+import functools
+import json
+import time
+
+from app.services.response_parser import parse_nutrition
+
+RESPONSE = {
+    "metadata": {"confidence_score": 0.92, "error_status": False},
+    "product_details": {
+        "name": "Rolled Oats",
+        "brand": "Example Foods",
+        "serving_size": {"amount": 40, "unit": "g", "type": "weight"},
+    },
+    "total_calories": 150,
+    "nutrients": {
+        "total_fat": {
+            "amount": 3,
+            "unit": "g",
+            "daily_value_percentage": 4,
+            "sub_nutrients": {
+                "saturated_fat": {"amount": 0.5, "unit": "g"},
+                "trans_fat": {"amount": 0, "unit": "g"},
+            },
+        },
+        "cholesterol": {"amount": 0, "unit": "mg", "daily_value_percentage": 0},
+        "carbohydrates": {
+            "amount": 27,
+            "unit": "g",
+            "daily_value_percentage": 10,
+            "sub_nutrients": {
+                "dietary_fiber": {"amount": 4, "unit": "g"},
+                "total_sugars": {"amount": 1, "unit": "g"},
+            },
+        },
+        "protein": {"amount": 5, "unit": "g", "daily_value_percentage": 10},
+        "sodium": {"amount": 0, "unit": "mg", "daily_value_percentage": 0},
+        "calcium": {"amount": 20, "unit": "mg", "daily_value_percentage": 2},
+        "iron": {"amount": 1.8, "unit": "mg", "daily_value_percentage": 10},
+        "vitamins": [
+            {"vitamin_type": "B1", "amount": 0.2, "unit": "mg"},
+            {"vitamin_type": "B6", "amount": 0.1, "unit": "mg"},
+        ],
+    },
+    "ingredients": ["whole grain rolled oats"],
+    "allergens": ["may contain wheat"],
+    "health_insights": {"summary": "High in fiber, low in sugar."},
+}
+
+
+def samples():
+    valid = json.dumps(RESPONSE, indent=2)
+    return {
+        "valid": valid,
+        "fenced": f"Here is the nutrition info:\n```json\n{valid}\n```",
+        "trailing_commas": valid.replace('"mg"\n', '"mg",\n'),
+        "truncated": valid[: int(len(valid) * 0.8)],
+    }
+
+
+def percentile(timings: list, fraction: float) -> float:
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+def run(name: str, parse, text: str, iterations: int):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        try:
+            parse(text)
+        except ValueError:
+            print(f"{name:>28}: fails to parse")
+            return
+        timings.append((time.perf_counter() - start) * 1_000_000)
+
+    timings.sort()
+    print(
+        f"{name:>28}: p50 {percentile(timings, 0.5):7.1f}us, "
+        f"p99 {percentile(timings, 0.99):7.1f}us"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20_000)
+    args = parser.parse_args()
+
+    # Times the repair too; the service itself rejects truncated output
+    parse = functools.partial(parse_nutrition, allow_truncated=True)
+    for sample, text in samples().items():
+        run(f"{sample} json.loads", json.loads, text, args.iterations)
+        run(f"{sample} parse_nutrition", parse, text, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Stand-in for the Groq (OpenAI-compatible) chat completions API, so the
+service can be load tested without spending provider credits. Latency
+follows a log-normal distribution and errors are injected at fixed rates.
+It also serves distinct generated label images at `/images/{n}.jpg`.
+
+    python -m benchmarks.fake_provider --port 8100 --latency-ms 800
+
+Point the API at it with `LLM_BASE_URL=http://127.0.0.1:8100`.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import random
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+
+import uvicorn
+from benchmarks.bench_response_parsing import RESPONSE
+from PIL import Image
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+CONTENT = json.dumps(RESPONSE)
+
+
+@dataclass
+class ProviderConfig:
+    latency_ms: float = 800.0
+    # Spread of the log-normal latency; 0 makes every call take latency_ms
+    latency_sigma: float = 0.5
+    prompt_tokens: int = 1800
+    completion_tokens: int = 400
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    # Requests that hang far beyond any client deadline
+    hang_rate: float = 0.0
+    image_size: int = 256
+
+
+class ProviderStats:
+    def __init__(self):
+        self.requests = 0
+        self.streams = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.hung = 0
+        self.images = 0
+
+    def snapshot(self):
+        return dict(vars(self))
+
+
+def sample_latency(config: ProviderConfig) -> float:
+    if config.latency_sigma <= 0:
+        return config.latency_ms / 1000
+    # The median of the distribution is latency_ms
+    return (
+        random.lognormvariate(math.log(config.latency_ms), config.latency_sigma) / 1000
+    )
+
+
+def usage(config: ProviderConfig, elapsed: float):
+    return {
+        "prompt_tokens": config.prompt_tokens,
+        "completion_tokens": config.completion_tokens,
+        "total_tokens": config.prompt_tokens + config.completion_tokens,
+        "completion_time": round(elapsed, 3),
+    }
+
+
+def chunk(model: str, delta: dict, finish_reason=None, **extra):
+    body = {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        **extra,
+    }
+    return f"data: {json.dumps(body)}\n\n"
+
+
+def split_content(parts: int):
+    size = max(1, math.ceil(len(CONTENT) / max(parts, 1)))
+    return [CONTENT[i : i + size] for i in range(0, len(CONTENT), size)]
+
+
+@lru_cache(maxsize=4096)
+def label_image(index: int, size: int) -> bytes:
+    # Seeded noise: every index hashes (and perceptually hashes) differently
+    rng = random.Random(index)
+    image = Image.frombytes(
+        "L", (size, size), bytes(rng.getrandbits(8) for _ in range(size * size))
+    )
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def build_app(config: ProviderConfig) -> Starlette:
+    stats = ProviderStats()
+
+    async def completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake")
+        stats.requests += 1
+
+        roll = random.random()
+        if roll < config.hang_rate:
+            stats.hung += 1
+            await asyncio.sleep(3600)
+        roll -= config.hang_rate
+        if roll < config.error_rate:
+            stats.errors += 1
+            await asyncio.sleep(sample_latency(config) / 10)
+            return JSONResponse(
+                {"error": {"message": "Injected failure", "type": "server_error"}},
+                status_code=500,
+            )
+        roll -= config.error_rate
+        if roll < config.rate_limit_rate:
+            stats.rate_limited += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "rate_limit"}},
+                status_code=429,
+                headers={"Retry-After": "1"},
+            )
+
+        latency = sample_latency(config)
+        if body.get("stream"):
+            stats.streams += 1
+            return StreamingResponse(
+                stream(model, latency), media_type="text/event-stream"
+            )
+
+        await asyncio.sleep(latency)
+        return JSONResponse(
+            {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": CONTENT},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage(config, latency),
+            }
+        )
+
+    async def stream(model: str, latency: float):
+        # A third of the latency goes to the first token, the rest is
+        # spread across the chunks
+        parts = split_content(config.completion_tokens)
+        await asyncio.sleep(latency / 3)
+        yield chunk(model, {"role": "assistant", "content": ""})
+        for part in parts:
+            await asyncio.sleep(latency * 2 / 3 / len(parts))
+            yield chunk(model, {"content": part})
+        yield chunk(
+            model,
+            {},
+            "stop",
+            x_groq={"id": "req-fake", "usage": usage(config, latency)},
+        )
+        yield "data: [DONE]\n\n"
+
+    async def image(request: Request):
+        stats.images += 1
+        index = int(request.path_params["index"])
+        return Response(label_image(index, config.image_size), media_type="image/jpeg")
+
+    async def provider_stats(request: Request):
+        return JSONResponse(stats.snapshot())
+
+    return Starlette(
+        routes=[
+            Route("/openai/v1/chat/completions", completions, methods=["POST"]),
+            Route("/images/{index:int}.jpg", image),
+            Route("/stats", provider_stats),
+        ]
+    )
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    defaults = ProviderConfig()
+    for field, value in vars(defaults).items():
+        parser.add_argument(
+            f"--{field.replace('_', '-')}", type=type(value), default=value
+        )
+
+
+def config_from_args(args: argparse.Namespace) -> ProviderConfig:
+    return ProviderConfig(
+        **{field: getattr(args, field) for field in vars(ProviderConfig())}
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        build_app(config_from_args(args)),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
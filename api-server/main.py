@@ -1,10 +1,29 @@
 import logging
 
+from app.config.settings import settings
 from app.database.base_repository import init_db
-from app.middlewares.logging_middleware import LoggingMiddleware
+from app.database.indexes import ensure_indexes
+from app.database.mongo_client import close_client
+from app.middlewares.logging_middleware import LoggingMiddleware, stop_logging
+from app.middlewares.metrics_middleware import MetricsMiddleware
+from app.services import (
+    image_service,
+    metrics,
+    password_service,
+    rate_limiter,
+    vlm_service,
+)
+from app.services.http_client import close_http_client, get_http_client
+from app.services.job_queue import job_queue
+from app.services.similarity_index import similar_image_index
+from app.services.write_behind import write_behind
 from app.routes.auth import router as auth_router
 from app.routes.endpoints import router as endpoints_router
+from app.routes.health import router as health_router
+from app.routes.metrics import router as metrics_router
 from app.routes.image import router as image_router
+from app.routes.nutrition import router as nutrition_router
+from app.routes.stats import router as stats_router
 from fastapi import FastAPI
 from fastapi.concurrency import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
@@ -24,11 +43,42 @@ async def lifespan(app: FastAPI):
     await init_db()
     logging.info("[VLM-API Server] Database connection established")
 
+    await ensure_indexes()
+    logging.info("[VLM-API Server] Database indexes reconciled")
+
+    # Load perceptual hashes of prior analyses for near-duplicate reuse
+    if settings.PHASH_ENABLED:
+        await similar_image_index.load()
+
+    # Open the shared outbound HTTP pool used by the VLM client
+    get_http_client()
+    logging.info("[VLM-API Server] HTTP connection pool ready")
+
+    if settings.WRITE_BEHIND_ENABLED:
+        await write_behind.start()
+        logging.info("[VLM-API Server] Write-behind persistence buffer started")
+
+    # Start analysis workers and pick up jobs left pending by a crash
+    await job_queue.start()
+    logging.info("[VLM-API Server] Analysis job workers started")
+
     # Yield control to FastVLM-API
     yield
 
     # Shutdown sequence
     logging.info("[VLM-API Server] Shutting down VLM-API Server...")
+    await job_queue.stop()
+    # Drain buffered records while Mongo is still connected
+    await write_behind.stop()
+    vlm_service.reset_groq()
+    await close_http_client()
+    image_service.shutdown_process_pool()
+    password_service.shutdown_process_pool()
+    await rate_limiter.close_store()
+    close_client()
+    metrics.mark_process_dead()
+    # Last, so everything logged during shutdown is written out
+    stop_logging()
 
 
 logging.info("[VLM-API Server] Shutdown completed")
@@ -53,11 +103,17 @@ app.add_middleware(
 
 # Add logging middleware
 app.add_middleware(LoggingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 # Add routers
 app.include_router(auth_router, prefix="/api/auth", tags=["auth"])
 app.include_router(image_router, prefix="/api", tags=["analysis"])
+app.include_router(nutrition_router, prefix="/api/nutrition", tags=["nutrition"])
+app.include_router(stats_router, prefix="/api", tags=["stats"])
 app.include_router(endpoints_router, prefix="/api", tags=["endpoints"])
+app.include_router(health_router, prefix="/api", tags=["health"])
+# Unprefixed, where Prometheus scrapes by default
+app.include_router(metrics_router)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,9 @@
+import os
+
+# Settings are read at import; tests never reach these services unless a
+# test opts in (see test_indexes.py)
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("MONGODB_DB_NAME", "vlm_api_test")
+os.environ.setdefault("LLM_API_KEY", "test")
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("LOG_CONSOLE_ENABLED", "false")
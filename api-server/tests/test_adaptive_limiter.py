@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from app.utils.adaptive_limiter import AdaptiveLimiter, LimitExceeded
+
+INTERACTIVE, BATCH = 0, 1
+
+
+def test_limit_grows_only_while_saturated():
+    limiter = AdaptiveLimiter(2, 1, 10, 10)
+    limiter.record_success(0.1)
+    assert limiter._limit == 2
+
+    limiter.in_flight = 2
+    for _ in range(3):
+        limiter.record_success(0.1)
+    # Additive: about one per round of calls at the current limit
+    assert limiter.limit == 3
+
+
+def test_congestion_backs_off_once_per_call_duration():
+    limiter = AdaptiveLimiter(8, 2, 10, 10, backoff=0.5)
+    limiter.record_success(10.0)
+    limiter.record_congestion()
+    assert limiter.limit == 4
+    # The other calls in flight report the same congestion
+    limiter.record_congestion()
+    assert limiter.limit == 4
+
+    limiter._last_decrease -= 10.0
+    limiter.record_congestion()
+    limiter._last_decrease -= 10.0
+    limiter.record_congestion()
+    assert limiter.limit == 2
+
+
+def test_interactive_callers_go_before_batch():
+    async def run():
+        limiter = AdaptiveLimiter(1, 1, 1, 10)
+        await limiter.acquire(INTERACTIVE, 1)
+        granted = []
+
+        async def wait(priority, name):
+            await limiter.acquire(priority, 1)
+            granted.append(name)
+
+        waiters = [
+            asyncio.create_task(wait(BATCH, "batch 1")),
+            asyncio.create_task(wait(BATCH, "batch 2")),
+            asyncio.create_task(wait(INTERACTIVE, "interactive")),
+        ]
+        await asyncio.sleep(0)
+        for _ in waiters:
+            limiter.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*waiters)
+        return granted
+
+    assert asyncio.run(run()) == ["interactive", "batch 1", "batch 2"]
+
+
+def test_sheds_callers_that_would_wait_too_long():
+    async def run():
+        limiter = AdaptiveLimiter(1, 1, 1, 1)
+        await limiter.acquire(INTERACTIVE, 1)
+        # Too slow to be served within the timeout
+        limiter.avg_latency = 5.0
+        with pytest.raises(LimitExceeded) as shed:
+            await limiter.acquire(INTERACTIVE, 1)
+        assert shed.value.reason == "deadline"
+
+        limiter.avg_latency = 0.01
+        waiter = asyncio.create_task(limiter.acquire(INTERACTIVE, 1))
+        await asyncio.sleep(0)
+        with pytest.raises(LimitExceeded) as shed:
+            await limiter.acquire(BATCH, 1)
+        assert shed.value.reason == "queue_full"
+        waiter.cancel()
+
+    asyncio.run(run())
+
+
+def test_abandoned_waiters_are_cleaned_up():
+    async def run():
+        limiter = AdaptiveLimiter(1, 1, 1, 10)
+        await limiter.acquire(INTERACTIVE, 1)
+        with pytest.raises(LimitExceeded):
+            await limiter.acquire(INTERACTIVE, 0.01)
+        cancelled = asyncio.create_task(limiter.acquire(INTERACTIVE, 1))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        assert limiter.queue_depth == 0
+
+        # The slot is not handed to either abandoned waiter
+        limiter.release()
+        assert limiter.in_flight == 0
+        assert limiter._waiters == []
+        await asyncio.wait_for(limiter.acquire(INTERACTIVE, 1), 0.1)
+        assert limiter.in_flight == 1
+
+    asyncio.run(run())
+
+
+def test_try_acquire_never_queues():
+    limiter = AdaptiveLimiter(1, 1, 1, 10)
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+    assert limiter.in_flight == 1
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from datetime import timedelta
+
+import jwt
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.config.settings import settings
+from app.routes.stats import router as stats_router
+from app.services import auth_cache, auth_service
+from app.utils.lru_cache import LRUCache
+
+USER = {"email": "ana@example.com", "uuid": "ana-uuid", "password": "hash"}
+
+
+class FakeUserRepository:
+    def __init__(self):
+        self.users = {USER["email"]: dict(USER)}
+        self.lookups = 0
+
+    async def find_one(self, filter):
+        self.lookups += 1
+        user = self.users.get(filter["email"])
+        return None if user is None else dict(user)
+
+
+@pytest.fixture
+def repo(monkeypatch):
+    repo = FakeUserRepository()
+    monkeypatch.setattr(auth_service, "get_user_repository", lambda: repo)
+    token_cache = LRUCache(100, 3600)
+    user_cache = LRUCache(100, 300)
+    monkeypatch.setattr(auth_service, "token_cache", token_cache)
+    monkeypatch.setattr(auth_service, "user_cache", user_cache)
+    monkeypatch.setattr(auth_cache, "user_cache", user_cache)
+    return repo
+
+
+def token_for(email: str = USER["email"], **kwargs) -> str:
+    return auth_service.create_access_token({"sub": email}, **kwargs)
+
+
+def current_user(token: str):
+    return asyncio.run(auth_service.get_current_user(token))
+
+
+def test_users_are_cached_without_their_password(repo):
+    token = token_for()
+    assert current_user(token)["uuid"] == USER["uuid"]
+    user = current_user(token)
+    assert "password" not in user
+    assert repo.lookups == 1
+
+
+def test_invalidated_users_are_read_again(repo):
+    token = token_for()
+    current_user(token)
+    repo.users[USER["email"]]["display_name"] = "Ana"
+    auth_cache.invalidate_user(USER["email"])
+    assert current_user(token)["display_name"] == "Ana"
+    assert repo.lookups == 2
+
+
+def test_cached_token_expires_with_the_token(repo):
+    token = token_for(expires_delta=timedelta(seconds=1))
+    current_user(token)
+    exp = jwt.decode(token, options={"verify_signature": False})["exp"]
+    assert auth_service.token_cache.get(token) is not None
+
+    time.sleep(max(0.0, exp - time.time()) + 0.05)
+    assert auth_service.token_cache.get(token) is None
+    with pytest.raises(HTTPException) as error:
+        current_user(token)
+    assert error.value.status_code == 401
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        "not-a-jwt",
+        jwt.encode({"sub": USER["email"], "exp": time.time() + 60}, "other-key"),
+        jwt.encode({"exp": time.time() + 60}, settings.SECRET_KEY),
+        token_for("nobody@example.com"),
+        token_for(expires_delta=timedelta(seconds=-1)),
+    ],
+    ids=["garbage", "wrong_key", "no_subject", "unknown_user", "expired"],
+)
+def test_bad_tokens_are_rejected(repo, token):
+    with pytest.raises(HTTPException) as error:
+        current_user(token)
+    assert error.value.status_code == 401
+    assert error.value.headers == {"WWW-Authenticate": "Bearer"}
+
+
+def test_other_users_data_is_forbidden(repo):
+    app = FastAPI()
+    app.include_router(stats_router)
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {token_for()}"}
+
+    own = client.get(
+        "/stats/budget", params={"user_uuid": USER["uuid"]}, headers=headers
+    )
+    assert own.status_code == 200
+    other = client.get("/stats/budget", params={"user_uuid": "bob"}, headers=headers)
+    assert other.status_code == 403
+    assert client.get("/stats/budget").status_code == 401
@@ -0,0 +1,42 @@
+import asyncio
+
+from app.routes import image
+from app.routes.image import AnalysisRequest
+
+
+def test_finished_analyses_are_saved_when_the_client_disconnects(monkeypatch):
+    saved = []
+
+    async def run_analysis(image_url, allow_similar, priority, prompt_version):
+        if image_url.endswith("slow.jpg"):
+            await asyncio.sleep(10)
+        return {"nutrition_info": {}, "cache_key": None}, {"total_tokens": 0}
+
+    async def save_analyses(records):
+        saved.extend(records)
+
+    monkeypatch.setattr(image, "run_analysis", run_analysis)
+    monkeypatch.setattr(image, "save_analyses", save_analyses)
+    items = [
+        AnalysisRequest(
+            user_uuid="user",
+            food_name="oats",
+            meal_type="breakfast",
+            tags=[],
+            image_url=f"http://example.com/{name}.jpg",
+        )
+        for name in ("a", "b", "slow")
+    ]
+
+    async def run():
+        response = await image.analyze_batch(None, items, {"uuid": "user"})
+        lines = response.body_iterator
+        await anext(lines)
+        await anext(lines)
+        await lines.aclose()
+
+    asyncio.run(run())
+    assert sorted(record["image_url"] for record in saved) == [
+        "http://example.com/a.jpg",
+        "http://example.com/b.jpg",
+    ]
@@ -0,0 +1,96 @@
+import asyncio
+
+import httpx
+import pytest
+from app.config.settings import settings
+from app.services import image_service
+from app.services.image_service import ImageFetchError, fetch_image_bytes
+
+PUBLIC = "http://93.184.216.34"
+
+
+def serve(monkeypatch, handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(image_service, "get_http_client", lambda: client)
+
+
+def fetch(url):
+    return asyncio.run(fetch_image_bytes(url))
+
+
+def test_fetches_public_image(monkeypatch):
+    serve(monkeypatch, lambda request: httpx.Response(200, content=b"jpeg"))
+    assert fetch(f"{PUBLIC}/label.jpg") == b"jpeg"
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "http://127.0.0.1/label.jpg",
+        "http://169.254.169.254/latest/meta-data",
+        "http://[::1]/label.jpg",
+        "file:///etc/passwd",
+    ],
+)
+def test_refuses_non_public_urls(monkeypatch, url):
+    serve(monkeypatch, lambda request: httpx.Response(200, content=b"secret"))
+    with pytest.raises(ImageFetchError):
+        fetch(url)
+
+
+def test_refuses_redirect_to_private_host(monkeypatch):
+    def handler(request):
+        if request.url.host == "93.184.216.34":
+            return httpx.Response(302, headers={"location": "http://10.0.0.5/"})
+        return httpx.Response(200, content=b"secret")
+
+    serve(monkeypatch, handler)
+    with pytest.raises(ImageFetchError):
+        fetch(f"{PUBLIC}/label.jpg")
+
+
+def test_caps_the_body_size(monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_MAX_BYTES", 1024)
+
+    async def chunks():
+        for _ in range(4):
+            yield b"x" * 512
+
+    serve(monkeypatch, lambda request: httpx.Response(200, content=chunks()))
+    with pytest.raises(ImageFetchError):
+        fetch(f"{PUBLIC}/huge.jpg")
+
+
+def test_connects_to_the_checked_address(monkeypatch):
+    # A rebinding DNS server would answer a second lookup differently
+    answers = iter(["93.184.216.34", "127.0.0.1"])
+
+    async def getaddrinfo(self, host, port, **kwargs):
+        return [(None, None, None, "", (next(answers), port))]
+
+    monkeypatch.setattr(asyncio.BaseEventLoop, "getaddrinfo", getaddrinfo)
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, content=b"jpeg")
+
+    serve(monkeypatch, handler)
+    assert fetch("https://labels.example:8443/label.jpg") == b"jpeg"
+    (request,) = requests
+    assert request.url.host == "93.184.216.34"
+    assert request.headers["host"] == "labels.example:8443"
+    assert request.extensions["sni_hostname"] == "labels.example"
+
+
+def test_gives_up_on_a_slow_download(monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_FETCH_TIMEOUT", 0.1)
+
+    async def trickle():
+        for _ in range(10):
+            await asyncio.sleep(0.05)
+            yield b"x"
+
+    serve(monkeypatch, lambda request: httpx.Response(200, content=trickle()))
+    with pytest.raises(ImageFetchError, match="longer than"):
+        fetch(f"{PUBLIC}/slow.jpg")
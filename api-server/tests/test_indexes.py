@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from app.config.settings import settings
+from app.database import mongo_client
+from app.database.indexes import ensure_indexes, explain_hot_queries
+
+
+def mongo_reachable() -> bool:
+    client = MongoClient(settings.MONGODB_URI, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+        return True
+    except PyMongoError:
+        return False
+    finally:
+        client.close()
+
+
+@pytest.mark.skipif(not mongo_reachable(), reason="no MongoDB reachable")
+def test_hot_queries_use_an_index():
+    async def run():
+        await ensure_indexes()
+        return await explain_hot_queries()
+
+    try:
+        reports = asyncio.run(run())
+    finally:
+        # The client is bound to the loop that just closed
+        mongo_client.close_client()
+
+    assert reports
+    scans = [
+        f"{report['collection']} {report['filter']} sort={report['sort']}"
+        for report in reports
+        if report["collscan"]
+    ]
+    assert not scans, f"COLLSCAN on {scans}"
@@ -0,0 +1,119 @@
+import asyncio
+
+from app.config.settings import settings
+from app.services import job_queue as job_queue_module
+from app.services import rollup_service
+from app.services.job_queue import AnalysisJobQueue
+from app.services.vlm_resilience import OverloadedError
+
+
+class FlakyRepository:
+    """Fails the first claims, as a briefly unreachable Mongo would."""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.claimed = []
+
+    async def recover_pending(self, stale_before):
+        return []
+
+    async def claim_pending(self, job_id):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("mongo unavailable")
+        self.claimed.append(job_id)
+        # Already claimed elsewhere, nothing to run
+        return None
+
+
+def test_workers_survive_failing_jobs(monkeypatch):
+    repo = FlakyRepository(failures=2)
+    monkeypatch.setattr(job_queue_module, "get_image_analysis_repository", lambda: repo)
+    monkeypatch.setattr(settings, "JOB_WORKER_CONCURRENCY", 2)
+
+    async def run():
+        queue = AnalysisJobQueue()
+        await queue.start()
+        for job_id in ("a", "b", "c", "d", "e"):
+            queue.enqueue(job_id)
+        await asyncio.wait_for(queue.queue.join(), 1)
+        alive = [not worker.done() for worker in queue.workers]
+        await queue.stop()
+        return alive
+
+    assert asyncio.run(run()) == [True, True]
+    assert sorted(repo.claimed) == ["c", "d", "e"]
+
+
+class RetryingRepository:
+    """Keeps job documents in memory, the way the Mongo repository does."""
+
+    def __init__(self):
+        self.jobs = {"job": {"status": "pending", "image_url": "http://x/a.jpg"}}
+
+    async def recover_pending(self, stale_before):
+        return []
+
+    async def claim_pending(self, job_id):
+        job = self.jobs[job_id]
+        if job["status"] != "pending":
+            return None
+        job["status"] = "processing"
+        return dict(job)
+
+    async def release(self, job_id, error=None):
+        job = self.jobs[job_id]
+        job["status"] = "pending"
+        if error is not None:
+            job["retries"] = job.get("retries", 0) + 1
+
+    async def update_result(self, job_id, result):
+        self.jobs[job_id].update(status="completed", **result)
+
+    async def mark_failed(self, job_id, error):
+        self.jobs[job_id].update(status="failed", error=error)
+
+
+def run_job(monkeypatch, failures: int):
+    repo = RetryingRepository()
+    monkeypatch.setattr(job_queue_module, "get_image_analysis_repository", lambda: repo)
+    monkeypatch.setattr(settings, "JOB_WORKER_CONCURRENCY", 1)
+    monkeypatch.setattr(settings, "JOB_MAX_RETRIES", 2)
+    monkeypatch.setattr(settings, "JOB_RETRY_MIN_DELAY", 0.01)
+    calls = []
+
+    async def run_analysis(*args):
+        calls.append(args)
+        if len(calls) <= failures:
+            raise OverloadedError("Analysis queue is saturated", 0)
+        return {"nutrition_info": {}}, {"total_tokens": 0}
+
+    async def record_analyses(records):
+        pass
+
+    monkeypatch.setattr(job_queue_module, "run_analysis", run_analysis)
+    monkeypatch.setattr(rollup_service, "record_analyses", record_analyses)
+
+    async def run():
+        queue = AnalysisJobQueue()
+        await queue.start()
+        queue.enqueue("job")
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if repo.jobs["job"]["status"] in ("completed", "failed"):
+                break
+        await queue.stop()
+
+    asyncio.run(run())
+    return repo.jobs["job"], len(calls)
+
+
+def test_overloaded_jobs_are_retried(monkeypatch):
+    job, calls = run_job(monkeypatch, failures=2)
+    assert (job["status"], job["retries"], calls) == ("completed", 2, 3)
+
+
+def test_jobs_fail_once_retries_run_out(monkeypatch):
+    job, calls = run_job(monkeypatch, failures=10)
+    assert (job["status"], calls) == ("failed", 3)
+    assert "saturated" in job["error"]
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.config.settings import settings
+from app.services import rate_limiter
+from app.utils.rate_limit import MemoryRateLimitStore, SQLiteRateLimitStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "RATE_LIMIT_BACKEND", request.param)
+    monkeypatch.setattr(
+        settings, "RATE_LIMIT_SQLITE_PATH", str(tmp_path / "limits.sqlite3")
+    )
+    monkeypatch.setattr(settings, "RATE_LIMIT_REQUESTS_PER_SECOND", 1.0)
+    monkeypatch.setattr(settings, "RATE_LIMIT_BURST", 10)
+    monkeypatch.setattr(settings, "RATE_LIMIT_DAILY_TOKENS", 1000)
+    monkeypatch.setattr(rate_limiter, "_store", None)
+    yield request.param
+    asyncio.run(rate_limiter.close_store())
+
+
+def test_batch_larger_than_burst_leaves_bucket_in_debt(backend):
+    async def run():
+        await rate_limiter.enforce("user", 25)
+        with pytest.raises(HTTPException) as denied:
+            await rate_limiter.enforce("user")
+        return denied.value
+
+    denied = asyncio.run(run())
+    assert denied.status_code == 429
+    assert denied.headers["X-RateLimit-Scope"] == "requests"
+    assert denied.headers["X-RateLimit-Remaining"] == "0"
+    # 15 in debt plus the one requested, at one per second
+    assert 15 <= int(denied.headers["Retry-After"]) <= 16
+
+
+def test_token_budget(backend):
+    async def run():
+        await rate_limiter.charge_tokens("user", {"total_tokens": 600})
+        await rate_limiter.ensure_budget("user")
+        await rate_limiter.charge_tokens("user", {"total_tokens": 600})
+        budget = await rate_limiter.get_budget("user")
+        with pytest.raises(HTTPException) as denied:
+            await rate_limiter.enforce("user")
+        return budget, denied.value
+
+    budget, denied = asyncio.run(run())
+    assert (budget["used"], budget["remaining"]) == (1200, 0)
+    assert denied.headers["X-RateLimit-Scope"] == "tokens"
+
+
+def test_sqlite_store_runs_off_the_event_loop(backend):
+    if backend != "sqlite":
+        pytest.skip("only the SQLite store blocks")
+    threads = []
+    store = rate_limiter.get_store()
+    usage = store.usage
+
+    def record_thread(*args):
+        threads.append(threading.current_thread())
+        return usage(*args)
+
+    store.usage = record_thread
+    asyncio.run(rate_limiter.get_budget("user"))
+    assert threads and threads[0] is not threading.main_thread()
+    assert isinstance(store, SQLiteRateLimitStore)
+    assert not MemoryRateLimitStore.blocking
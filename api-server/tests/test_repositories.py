@@ -0,0 +1,13 @@
+from app.database import mongo_client
+from app.database.dependencies import get_user_repository
+
+
+def test_repositories_follow_a_new_client():
+    repo = get_user_repository()
+    collection = repo.collection
+    assert repo.collection is collection
+
+    mongo_client.close_client()
+    assert repo.collection is not collection
+    assert repo.collection.database.client is mongo_client.get_client()
+    mongo_client.close_client()
@@ -0,0 +1,191 @@
+import asyncio
+import time
+from collections import defaultdict
+
+import groq
+import httpx
+import pytest
+
+from app.config.settings import settings
+from app.services import vlm_resilience
+from app.services.vlm_resilience import ProviderUnavailableError, call_with_resilience
+from app.utils.adaptive_limiter import AdaptiveLimiter
+from app.utils.resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyWindow,
+    hedged,
+)
+
+
+def status_error(status_code: int, retry_after=None):
+    headers = {} if retry_after is None else {"retry-after": str(retry_after)}
+    request = httpx.Request("POST", "http://provider.test/chat/completions")
+    response = httpx.Response(status_code, headers=headers, request=request)
+    return groq.APIStatusError("provider error", response=response, body=None)
+
+
+class StubProvider:
+    """Answers with the queued errors in turn, then succeeds."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = []
+
+    async def __call__(self):
+        self.calls.append(time.monotonic())
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.fixture(autouse=True)
+def fresh_policy(monkeypatch):
+    monkeypatch.setattr(settings, "VLM_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(settings, "VLM_RETRY_BACKOFF", 0)
+    monkeypatch.setattr(settings, "VLM_RETRY_MAX_DELAY", 1.0)
+    monkeypatch.setattr(settings, "VLM_HEDGE_ENABLED", False)
+    monkeypatch.setattr(vlm_resilience, "vlm_breaker", CircuitBreaker(5, 30))
+    monkeypatch.setattr(vlm_resilience, "vlm_latency", defaultdict(LatencyWindow))
+    monkeypatch.setattr(vlm_resilience, "vlm_limiter", AdaptiveLimiter(8, 1, 64, 10))
+
+
+def test_retries_honour_retry_after():
+    provider = StubProvider(status_error(429, retry_after=0.2))
+    assert asyncio.run(call_with_resilience(provider, "model")) == "ok"
+    assert len(provider.calls) == 2
+    assert provider.calls[1] - provider.calls[0] >= 0.2
+
+
+def test_client_errors_are_not_retried():
+    provider = StubProvider(status_error(400))
+    with pytest.raises(groq.APIStatusError):
+        asyncio.run(call_with_resilience(provider, "model"))
+    assert len(provider.calls) == 1
+
+
+def test_gives_up_after_max_attempts():
+    provider = StubProvider(*(status_error(503) for _ in range(3)))
+    with pytest.raises(ProviderUnavailableError, match="after 3 attempts"):
+        asyncio.run(call_with_resilience(provider, "model"))
+    assert len(provider.calls) == 3
+
+
+def test_gives_up_when_retry_after_exceeds_the_max_delay():
+    provider = StubProvider(status_error(429, retry_after=30))
+    with pytest.raises(ProviderUnavailableError) as error:
+        asyncio.run(call_with_resilience(provider, "model"))
+    assert len(provider.calls) == 1
+    assert error.value.retry_after == pytest.approx(30)
+
+
+def test_open_circuit_fails_fast():
+    breaker = vlm_resilience.vlm_breaker
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    provider = StubProvider()
+    with pytest.raises(ProviderUnavailableError, match="circuit is open"):
+        asyncio.run(call_with_resilience(provider, "model"))
+    assert provider.calls == []
+
+
+def test_hedge_wins_and_the_slow_attempt_is_cancelled():
+    attempts = []
+
+    async def call():
+        attempt = len(attempts)
+        attempts.append("started")
+        try:
+            # The first attempt stalls; the hedge answers at once
+            await asyncio.sleep(10 if attempt == 0 else 0)
+        except asyncio.CancelledError:
+            attempts[attempt] = "cancelled"
+            raise
+        attempts[attempt] = "finished"
+        return attempt
+
+    async def run():
+        result = await hedged(call, 0.01)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == (1, True)
+    assert attempts == ["cancelled", "finished"]
+
+
+def test_hedge_fails_only_when_every_attempt_fails():
+    provider = StubProvider(ValueError("first"), ValueError("second"))
+
+    async def slow_failure():
+        await asyncio.sleep(0.02)
+        return await provider()
+
+    # The error of the first call is the one raised
+    with pytest.raises(ValueError, match="first"):
+        asyncio.run(hedged(slow_failure, 0.01))
+    assert len(provider.calls) == 2
+
+
+def test_breaker_opens_probes_and_closes():
+    states = []
+    breaker = CircuitBreaker(2, 0.05, states.append)
+
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert states == [OPEN, HALF_OPEN, CLOSED]
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker(1, 0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_hedges_take_a_concurrency_slot(monkeypatch):
+    monkeypatch.setattr(vlm_resilience, "hedge_delay", lambda model: 0.01)
+    limiter = vlm_resilience.vlm_limiter
+    in_flight = []
+
+    async def slow_call():
+        in_flight.append(limiter.in_flight)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    async def run(held):
+        # The primary attempt's slot, as taken by `admission`
+        for _ in range(held):
+            await limiter.acquire(0, 1)
+        result = await call_with_resilience(slow_call, "model")
+        for _ in range(held):
+            limiter.release()
+        return result
+
+    assert asyncio.run(run(1)) == "ok"
+    assert in_flight == [1, 2]
+    assert limiter.in_flight == 0
+
+    # No slot to spare: the hedge is not sent
+    in_flight.clear()
+    assert asyncio.run(run(limiter.limit)) == "ok"
+    assert in_flight == [limiter.limit]
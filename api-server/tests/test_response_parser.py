@@ -0,0 +1,50 @@
+import json
+
+import pytest
+from app.services.response_parser import parse_nutrition, repair_json
+from benchmarks.bench_response_parsing import RESPONSE
+
+
+def test_parses_complete_response():
+    info = parse_nutrition(json.dumps(RESPONSE))
+    assert info["total_calories"] == RESPONSE["total_calories"]
+
+
+def test_repairs_trailing_commas_and_fences():
+    text = "```json\n" + json.dumps(RESPONSE)[:-1] + ",}\n```"
+    assert parse_nutrition(text)["total_calories"] == RESPONSE["total_calories"]
+
+
+@pytest.mark.parametrize(
+    "text", ["{}", "{", '{"metadata": {"confid', '{"total_calories": 120}']
+)
+def test_rejects_responses_missing_required_fields(text):
+    with pytest.raises(ValueError):
+        parse_nutrition(text)
+
+
+def test_truncated_number_is_cut_back():
+    text, truncated = repair_json('{"metadata": {}, "total_calories": 25')
+    assert (text, truncated) == ('{"metadata": {}}', True)
+
+
+def test_truncated_object_is_cut_back_to_complete_members():
+    text, truncated = repair_json(
+        '{"nutrients": {"protein": {"amount": 5}, "sodium": {"amount": 1'
+    )
+    assert json.loads(text) == {"nutrients": {"protein": {"amount": 5}}}
+    assert truncated
+
+
+def test_chatter_after_the_object_is_not_truncation():
+    text = json.dumps(RESPONSE) + "\nHope this helps! {"
+    assert repair_json(text) == (json.dumps(RESPONSE), False)
+
+
+def test_rejects_truncated_responses():
+    # Cut inside the last nutrient: every required field is present
+    complete = json.dumps({**RESPONSE, "total_calories": 250})
+    text = complete[: complete.rindex("}", 0, -1) - 1]
+    with pytest.raises(ValueError, match="cut off"):
+        parse_nutrition(text)
+    assert parse_nutrition(text, allow_truncated=True)["total_calories"] == 250
@@ -0,0 +1,44 @@
+import asyncio
+import json
+
+from app.services import result_cache as result_cache_module
+from app.services import vlm_service
+from app.services.result_cache import ResultCache
+from pymongo.errors import ServerSelectionTimeoutError
+
+
+class UnreachableRepository:
+    async def find_cached_result(self, cache_key, since):
+        raise ServerSelectionTimeoutError("no servers")
+
+
+def test_mongo_tier_failure_is_a_miss(monkeypatch):
+    monkeypatch.setattr(
+        result_cache_module,
+        "get_image_analysis_repository",
+        lambda: UnreachableRepository(),
+    )
+    cache = ResultCache()
+    assert asyncio.run(cache.get("key")) is None
+    assert cache.misses == 1
+
+
+def test_unparseable_results_are_not_cached(monkeypatch):
+    cache = ResultCache()
+    monkeypatch.setattr(vlm_service, "result_cache", cache)
+
+    vlm_service.remember_result("bad", None, {"response": "no json here"})
+    assert cache.memory.get("bad") is None
+
+    response = json.dumps(
+        {
+            "metadata": {"confidence_score": 0.9},
+            "product_details": {},
+            "total_calories": 120,
+            "nutrients": {},
+        }
+    )
+    vlm_service.remember_result(
+        "good", None, {"response": response, "completion_time": 1.0}
+    )
+    assert cache.memory.get("good")["response"] == response
@@ -0,0 +1,142 @@
+import asyncio
+from datetime import date, datetime
+
+import pytest
+
+from app.database.rollup_repository import RollupRepository
+from app.services import rollup_service
+
+
+class FakeRollupRepository:
+    def __init__(self, rollups=(), during_rebuild=None, fail=False):
+        self.rollups = rollups
+        self.during_rebuild = during_rebuild
+        self.fail = fail
+        self.incremented = []
+        self.recomputed = []
+
+    async def increment_many(self, records):
+        self.incremented.extend(records)
+
+    async def rebuild_from(self, source, user_uuid=None):
+        if self.during_rebuild:
+            await self.during_rebuild()
+        if self.fail:
+            raise RuntimeError("rebuild failed")
+
+    async def recompute_days(self, source, days):
+        self.recomputed.append(days)
+
+    async def find_range(self, user_uuid, start, end):
+        for rollup in self.rollups:
+            yield rollup
+
+
+def test_get_stats_sums_rollups(monkeypatch):
+    rollups = [
+        {
+            "day": "2024-05-06",
+            "meal_type": "lunch",
+            "count": 2,
+            "totals": {"calories": 300.0, "protein": 10.0},
+        },
+        {
+            "day": "2024-05-06",
+            "meal_type": "dinner",
+            "count": 1,
+            "totals": {"calories": 500.0, "sodium": 200.0},
+        },
+        {
+            "day": "2024-05-07",
+            "meal_type": "lunch",
+            "count": 1,
+            "totals": {"calories": 100.0},
+        },
+    ]
+    monkeypatch.setattr(
+        rollup_service,
+        "get_rollup_repository",
+        lambda: FakeRollupRepository(rollups),
+    )
+
+    days = asyncio.run(
+        rollup_service.get_stats("user", date(2024, 5, 6), date(2024, 5, 7))
+    )
+    assert [day["period"] for day in days] == ["2024-05-06", "2024-05-07"]
+    assert days[0]["count"] == 3
+    assert days[0]["totals"]["calories"] == 800.0
+    assert days[0]["totals"]["total_fat"] == 0.0
+    assert days[0]["by_meal_type"]["dinner"]["sodium"] == 200.0
+
+    weeks = asyncio.run(
+        rollup_service.get_stats(
+            "user", date(2024, 5, 6), date(2024, 5, 7), group_by="week"
+        )
+    )
+    assert len(weeks) == 1
+    assert weeks[0]["period"] == "2024-W19"
+    assert weeks[0]["totals"]["calories"] == 900.0
+
+
+def analysis(user_uuid, day):
+    return {"user_uuid": user_uuid, "created_at": datetime.fromisoformat(day)}
+
+
+@pytest.fixture
+def backfill_repos(monkeypatch):
+    def install(rollup_repo):
+        monkeypatch.setattr(
+            rollup_service, "get_rollup_repository", lambda: rollup_repo
+        )
+        monkeypatch.setattr(
+            rollup_service,
+            "get_image_analysis_repository",
+            lambda: type("FakeAnalysisRepository", (), {"collection": None})(),
+        )
+        return rollup_repo
+
+    return install
+
+
+def test_writes_during_a_backfill_are_recomputed(backfill_repos):
+    async def write():
+        await rollup_service.record_analyses(
+            [analysis("ana", "2024-05-06T12:00"), analysis("ana", "2024-05-06T19:00")]
+        )
+
+    repo = backfill_repos(FakeRollupRepository(during_rebuild=write))
+    asyncio.run(rollup_service.backfill())
+
+    # Recomputed from the analyses rather than added on top of the rebuild
+    assert repo.incremented == []
+    assert repo.recomputed == [{("ana", "2024-05-06")}]
+
+    asyncio.run(rollup_service.record_analyses([analysis("ana", "2024-05-07")]))
+    assert len(repo.incremented) == 1
+
+
+def test_failed_backfill_applies_the_held_writes(backfill_repos):
+    async def write():
+        await rollup_service.record_analyses([analysis("ana", "2024-05-06")])
+
+    repo = backfill_repos(FakeRollupRepository(during_rebuild=write, fail=True))
+    with pytest.raises(RuntimeError, match="rebuild failed"):
+        asyncio.run(rollup_service.backfill())
+
+    # The old rollups are still in place, so they take the increment
+    assert len(repo.incremented) == 1
+    assert repo.recomputed == []
+    assert rollup_service._held is None
+
+
+def test_backfill_pipeline_targets_days_and_staging():
+    repo = RollupRepository()
+    pipeline = repo.backfill_pipeline(into="staging", days=[("ana", "2024-05-06")])
+    match = pipeline[0]["$match"]["$or"][0]
+    assert match["user_uuid"] == "ana"
+    assert match["created_at"] == {
+        "$gte": datetime(2024, 5, 6),
+        "$lt": datetime(2024, 5, 7),
+    }
+    assert pipeline[-1]["$merge"]["into"] == "staging"
+    assert repo.backfill_pipeline()[-1]["$merge"]["into"] == repo.collection_name
@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+import pytest
+
+from app.config.settings import settings
+from app.services import vlm_service
+from app.services.prompt_builder import get_prompt
+from app.services.response_parser import escalation_reason
+from benchmarks.bench_response_parsing import RESPONSE
+
+CONFIDENT = {**RESPONSE, "metadata": {**RESPONSE["metadata"], "confidence_score": 0.95}}
+
+
+def cut_off(response: dict) -> str:
+    # Cut inside the last member, after every required field
+    text = json.dumps(response)
+    return text[: text.rindex("}", 0, -1) - 1]
+
+
+def test_truncated_response_escalates_despite_confidence():
+    assert escalation_reason(json.dumps(CONFIDENT), 0.8) is None
+    assert escalation_reason(cut_off(CONFIDENT), 0.8) == "truncated"
+
+
+@pytest.fixture
+def models(monkeypatch):
+    answers = {
+        settings.VLM_FAST_MODEL: cut_off(CONFIDENT),
+        settings.VLM_STRONG_MODEL: json.dumps(CONFIDENT),
+    }
+    calls = []
+
+    async def call_model(image_source, model, prompt, priority, timeout):
+        calls.append(model)
+        if answers[model] is None:
+            raise vlm_service.ProviderUnavailableError("down", 1.0)
+        return {
+            "response": answers[model],
+            "model": model,
+            "prompt_tokens": 1,
+            "completion_tokens": 1,
+            "total_tokens": 2,
+            "completion_time": 0.1,
+            "latency": 0.1,
+        }
+
+    monkeypatch.setattr(vlm_service, "call_model", call_model)
+    return answers, calls
+
+
+def test_truncated_fast_answer_goes_to_the_strong_model(models):
+    answers, calls = models
+    result = asyncio.run(vlm_service.call_routed("data:", get_prompt(None)))
+    assert calls == [settings.VLM_FAST_MODEL, settings.VLM_STRONG_MODEL]
+    assert result["routing"] == {"tier": "strong", "escalation_reason": "truncated"}
+    assert result["response"] == answers[settings.VLM_STRONG_MODEL]
+
+
+def test_truncated_fast_answer_is_not_served_when_escalation_fails(models):
+    answers, _ = models
+    answers[settings.VLM_STRONG_MODEL] = None
+    with pytest.raises(vlm_service.ProviderUnavailableError):
+        asyncio.run(vlm_service.call_routed("data:", get_prompt(None)))
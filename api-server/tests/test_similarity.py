@@ -0,0 +1,98 @@
+import asyncio
+import io
+import random
+from itertools import combinations
+
+from PIL import Image, ImageDraw, ImageFont
+
+from app.config.settings import settings
+from app.services import vlm_service
+from app.services.image_service import PHASH_BITS, dhash
+from app.services.similarity_index import SimilarImageIndex
+
+NUTRIENTS = ["Calories", "Total Fat", "Sodium", "Total Carbohydrate", "Sugars"]
+NUTRIENTS += ["Dietary Fiber", "Protein", "Calcium", "Iron", "Potassium"]
+
+
+def nutrition_label(seed: int) -> Image.Image:
+    """A standard looking panel; only the values differ between seeds."""
+    rng = random.Random(seed)
+    font = ImageFont.load_default(size=28)
+    image = Image.new("RGB", (600, 900), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((10, 10, 590, 890), outline="black", width=6)
+    draw.text((30, 30), "Nutrition Facts", font=ImageFont.load_default(size=44))
+    draw.line((30, 100, 570, 100), fill="black", width=10)
+    for row, name in enumerate(NUTRIENTS):
+        y = 130 + row * 70
+        draw.text((30, y), name, font=font, fill="black")
+        draw.text((440, y), f"{rng.randint(0, 400)}g", font=font, fill="black")
+        draw.line((30, y + 55, 570, y + 55), fill="black", width=2)
+    return image
+
+
+def test_same_image_is_indexed_once():
+    phash = "f" * (PHASH_BITS // 4)
+    other = "e" + phash[1:]
+    index = SimilarImageIndex()
+    for _ in range(3):
+        index.add(phash, "key", (600, 900))
+    index.add(other, "other", (600, 900))
+    assert len(index.index) == 2
+    assert index.find(phash, (600, 900)) == (0, "key")
+
+
+def test_match_needs_the_same_dimensions():
+    phash = "f" * (PHASH_BITS // 4)
+    index = SimilarImageIndex()
+    index.add(phash, "key", (600, 900))
+    assert index.find(phash, (601, 900)) is None
+    # Hashes from the former 64-bit scheme are ignored
+    assert not index.add("ffff0000ffff0000", "old", (600, 900))
+
+
+def test_different_labels_do_not_match():
+    labels = [nutrition_label(seed) for seed in range(12)]
+    index = SimilarImageIndex()
+    for seed, label in enumerate(labels):
+        index.add(dhash(label), f"label-{seed}", label.size)
+    for seed, label in enumerate(labels):
+        assert index.find(dhash(label), label.size) == (0, f"label-{seed}")
+    for first, second in combinations(labels, 2):
+        distance = (int(dhash(first), 16) ^ int(dhash(second), 16)).bit_count()
+        assert distance > settings.PHASH_MAX_DISTANCE
+
+
+def test_reencoded_label_matches():
+    label = nutrition_label(0)
+    output = io.BytesIO()
+    label.save(output, format="JPEG", quality=85)
+    output.seek(0)
+    reencoded = Image.open(output).convert("RGB")
+    index = SimilarImageIndex()
+    index.add(dhash(label), "label", label.size)
+    assert index.find(dhash(reencoded), reencoded.size) is not None
+
+
+def test_allow_similar_requests_are_not_coalesced(monkeypatch):
+    monkeypatch.setattr(settings, "RESULT_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "IMAGE_PREPROCESS_ENABLED", False)
+    calls = []
+
+    async def call_vlm(image_source, prompt, priority):
+        calls.append(image_source)
+        await asyncio.sleep(0.01)
+        return {"response": "{}", "completion_time": 0, "total_tokens": 0}
+
+    monkeypatch.setattr(vlm_service, "call_vlm", call_vlm)
+
+    async def run():
+        return await asyncio.gather(
+            vlm_service.get_nutrition_info("http://example.com/a.jpg", True),
+            vlm_service.get_nutrition_info("http://example.com/a.jpg", False),
+            vlm_service.get_nutrition_info("http://example.com/a.jpg", False),
+        )
+
+    results = asyncio.run(run())
+    assert len(calls) == 2
+    assert [result.get("coalesced") for result in results] == [None, None, True]
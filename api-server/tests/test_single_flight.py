@@ -0,0 +1,52 @@
+import asyncio
+
+from app.services import vlm_service
+from app.utils.single_flight import SingleFlight
+
+RESULT = {
+    "response": "{}",
+    "prompt_tokens": 3,
+    "completion_tokens": 2,
+    "total_tokens": 5,
+}
+
+
+def test_only_the_leader_owns_the_result():
+    async def run():
+        flights = SingleFlight()
+
+        async def call():
+            await asyncio.sleep(0.01)
+            return "result"
+
+        return await asyncio.gather(*(flights.do("key", call) for _ in range(3)))
+
+    assert asyncio.run(run()) == [
+        ("result", False, True),
+        ("result", True, False),
+        ("result", True, False),
+    ]
+
+
+def test_follower_is_charged_when_the_leader_goes_away(monkeypatch):
+    monkeypatch.setattr(vlm_service, "vlm_flights", SingleFlight())
+
+    async def call():
+        await asyncio.sleep(0.02)
+        return RESULT
+
+    async def run():
+        leader = asyncio.create_task(vlm_service.call_vlm_coalesced("key", call))
+        await asyncio.sleep(0)
+        followers = [
+            asyncio.create_task(vlm_service.call_vlm_coalesced("key", call))
+            for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+        # The leader's client disconnects; the call goes on for the others
+        leader.cancel()
+        return await asyncio.gather(*followers)
+
+    first, second = asyncio.run(run())
+    assert first["total_tokens"] == 5 and first["coalesced"]
+    assert second["total_tokens"] == 0 and second["coalesced"]
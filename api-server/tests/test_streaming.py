@@ -0,0 +1,88 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.config.settings import settings
+from app.services import image_service, vlm_service
+from app.services.prompt_builder import get_prompt
+from app.services.result_cache import ResultCache, build_cache_key
+from app.services.vlm_service import MODEL
+from app.utils.json_stream import JSONSectionStream
+
+
+def test_section_with_trailing_comma_is_skipped():
+    stream = JSONSectionStream()
+    sections = stream.feed(
+        '{"metadata": {"confidence_score": 0.9,}, "total_calories": 5}'
+    )
+    assert sections == [(("total_calories",), 5)]
+
+
+def chunk(content):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(delta=SimpleNamespace(content=content))]
+    )
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def close(self):
+        self.closed = True
+
+
+def test_stream_is_closed_when_the_client_goes_away(monkeypatch):
+    monkeypatch.setattr(settings, "RESULT_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "IMAGE_PREPROCESS_ENABLED", False)
+    stream = FakeStream([chunk('"total_calories": 5'), chunk("}")])
+
+    async def call_with_resilience(call, model, hedge=True):
+        return stream, chunk("{")
+
+    monkeypatch.setattr(vlm_service, "call_with_resilience", call_with_resilience)
+
+    async def run():
+        events = vlm_service.stream_nutrition_info("http://example.com/a.jpg")
+        assert await anext(events) == ("delta", "{")
+        await events.aclose()
+
+    asyncio.run(run())
+    assert stream.closed
+
+
+def test_stream_does_not_share_the_routed_cache_entry(monkeypatch):
+    monkeypatch.setattr(settings, "RESULT_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "IMAGE_PREPROCESS_ENABLED", False)
+    monkeypatch.setattr(settings, "VLM_ROUTING_ENABLED", True)
+
+    async def fetch_image_bytes(image_url):
+        return b"image"
+
+    monkeypatch.setattr(image_service, "fetch_image_bytes", fetch_image_bytes)
+    cache = ResultCache()
+    monkeypatch.setattr(vlm_service, "result_cache", cache)
+    digest = image_service.image_digest(b"image")
+    version = get_prompt(None).version
+    for model, response in ((vlm_service.result_model(), "routed"), (MODEL, "single")):
+        cache.memory.set(
+            build_cache_key(digest, model, version),
+            {"response": response, "completion_time": 0},
+        )
+
+    async def run():
+        return [
+            event async for event in vlm_service.stream_nutrition_info("http://x/a.jpg")
+        ]
+
+    events = asyncio.run(run())
+    assert events[0] == ("delta", "single")
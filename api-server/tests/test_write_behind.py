@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+from bson import json_util
+from pymongo.errors import BulkWriteError
+
+from app.config.settings import settings
+from app.services import rollup_service
+from app.services import write_behind as write_behind_module
+from app.services.write_behind import DUPLICATE_KEY, WriteBehindBuffer
+
+
+class FakeRepository:
+    """`insert_many` answers with the queued outcomes, then succeeds."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.stored = []
+
+    async def insert_many(self, records, ordered=False):
+        outcome = self.outcomes.pop(0) if self.outcomes else None
+        if callable(outcome):
+            outcome = outcome(records)
+        if isinstance(outcome, Exception):
+            raise outcome
+        self.stored += records
+
+
+def write_errors(*codes):
+    """Fails the first records of a batch with the given error codes."""
+
+    def outcome(records):
+        errors = [{"index": index, "code": code} for index, code in enumerate(codes)]
+        return BulkWriteError({"writeErrors": errors})
+
+    return outcome
+
+
+@pytest.fixture
+def buffer(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "WRITE_BEHIND_RETRY_BACKOFF", 0)
+    monkeypatch.setattr(settings, "WRITE_BEHIND_MAX_RETRIES", 2)
+    monkeypatch.setattr(settings, "WRITE_BEHIND_FLUSH_INTERVAL", 0.01)
+    monkeypatch.setattr(settings, "WRITE_BEHIND_SPILL_FILE", str(tmp_path / "spill"))
+    rolled_up = []
+
+    async def record_analyses(records):
+        rolled_up.extend(records)
+
+    monkeypatch.setattr(rollup_service, "record_analyses", record_analyses)
+
+    def make(repo):
+        monkeypatch.setattr(
+            write_behind_module, "get_image_analysis_repository", lambda: repo
+        )
+        buffer = WriteBehindBuffer()
+        buffer.rolled_up = rolled_up
+        return buffer
+
+    return make
+
+
+def records(count):
+    return [{"request_id": str(i)} for i in range(count)]
+
+
+def test_failed_flush_is_retried(buffer):
+    repo = FakeRepository(ConnectionError("mongo unavailable"))
+    write_behind = buffer(repo)
+    asyncio.run(write_behind.flush(records(3)))
+    assert len(repo.stored) == 3
+    assert (write_behind.retries, write_behind.flushed_records) == (1, 3)
+    assert len(write_behind.rolled_up) == 3
+
+
+def test_duplicates_count_as_written(buffer):
+    # The first record was stored by an earlier attempt, the second failed
+    repo = FakeRepository(write_errors(DUPLICATE_KEY, 121))
+    write_behind = buffer(repo)
+    batch = records(3)
+    asyncio.run(write_behind.flush(batch))
+    assert repo.stored == [batch[1]]
+    assert write_behind.flushed_records == 3
+    assert write_behind.retries == 1
+
+
+def test_unwritable_records_are_spilled_and_replayed(buffer):
+    down = ConnectionError("mongo unavailable")
+    write_behind = buffer(FakeRepository(down, down, down))
+    batch = records(2)
+    asyncio.run(write_behind.flush(batch))
+    assert write_behind.spilled_records == 2
+    with open(settings.WRITE_BEHIND_SPILL_FILE) as spill_file:
+        assert [json_util.loads(line) for line in spill_file] == batch
+
+    repo = FakeRepository()
+    asyncio.run(buffer(repo).replay_spill_file())
+    assert repo.stored == batch
+
+
+def test_flusher_survives_a_failed_spill(buffer, monkeypatch):
+    down = ConnectionError("mongo unavailable")
+    repo = FakeRepository(down, down, down)
+    write_behind = buffer(repo)
+
+    def append(path, lines):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(write_behind_module, "_append", append)
+
+    async def run():
+        await write_behind.start()
+        await write_behind.submit(records(2))
+        await asyncio.sleep(0.1)
+        alive = not write_behind._flusher.done()
+        await write_behind.submit(records(1))
+        await write_behind.stop()
+        return alive
+
+    assert asyncio.run(run())
+    assert write_behind.lost_records == 2
+    assert len(repo.stored) == 1
+
+
+def test_full_buffer_writes_directly(buffer, monkeypatch):
+    monkeypatch.setattr(settings, "WRITE_BEHIND_MAX_QUEUE", 1)
+    monkeypatch.setattr(settings, "WRITE_BEHIND_SUBMIT_TIMEOUT", 0.01)
+    repo = FakeRepository()
+    write_behind = buffer(repo)
+
+    async def run():
+        # No flusher is draining the queue
+        write_behind.queue = asyncio.Queue(maxsize=settings.WRITE_BEHIND_MAX_QUEUE)
+        await asyncio.wait_for(write_behind.submit(records(3)), 1)
+
+    asyncio.run(run())
+    assert write_behind.queue.qsize() == 1
+    assert len(repo.stored) == 2
+    assert write_behind.direct_records == 2
+
+
+def test_flusher_survives_a_failed_flush(buffer, monkeypatch):
+    repo = FakeRepository()
+    write_behind = buffer(repo)
+    failures = [RuntimeError("unexpected")]
+
+    async def record_analyses(records):
+        if failures:
+            raise failures.pop()
+
+    monkeypatch.setattr(rollup_service, "record_analyses", record_analyses)
+
+    async def run():
+        await write_behind.start()
+        await write_behind.submit(records(1))
+        await asyncio.sleep(0.1)
+        await write_behind.submit(records(1))
+        await asyncio.sleep(0.1)
+        alive = not write_behind._flusher.done()
+        await write_behind.stop()
+        return alive
+
+    assert asyncio.run(run())
+    assert len(repo.stored) == 2